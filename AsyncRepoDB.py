@@ -0,0 +1,322 @@
+from __future__ import annotations
+from typing import List, Optional
+
+from async_db import AsyncDatabaseManager
+from Client import CLIENT_SORT_COLUMNS, CLIENT_SORT_TYPES, Client, client_where_clause
+from filtered_investment import investment_where_clause, parse_amount_bound, parse_date_bound, parse_id_filter
+from filtered_security import parse_income_bound, security_where_clause
+from Investment import Investment
+from InvestmentRepoDB import INVESTMENT_SORT_COLUMNS, INVESTMENT_SORT_TYPES
+from pagination import afetch_page_after
+from Security import Security
+from SecurityRepoDB import SECURITY_SORT_COLUMNS, SECURITY_SORT_TYPES
+
+
+class AsyncMyEntity_rep_DB:
+    COLUMNS = "client_id, name, type_of_property, address, phone"
+
+    def __init__(self, db: AsyncDatabaseManager, table: str = "public.clients"):
+        self.db = db
+        self.table = table
+
+    async def read_all(self) -> List[Client]:
+        rows = await self.db.fetch_all(f"SELECT {self.COLUMNS} FROM {self.table} ORDER BY client_id")
+        return [Client.from_trusted_row(r) for r in rows]
+
+    async def get_by_id(self, client_id: int) -> Client | None:
+        if client_id <= 0:
+            return None
+        row = await self.db.fetch_one(
+            f"SELECT {self.COLUMNS} FROM {self.table} WHERE client_id = %s", (client_id,)
+        )
+        return Client.from_trusted_row(row) if row else None
+
+    async def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Client], str | None]:
+        return await self.get_page(k, after, sort_by=sort_by, order=order)
+
+    async def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        type_of_property: str = "",
+        name_q: str = "",
+        phone_q: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Client], str | None]:
+        where, params = client_where_clause(
+            (type_of_property or "").strip().lower(),
+            (name_q or "").strip().lower(),
+            (phone_q or "").strip(),
+        )
+        sort_by = (sort_by or "").strip().lower()
+        sort_expr = CLIENT_SORT_COLUMNS.get(sort_by)
+        rows, next_after = await afetch_page_after(
+            self.db,
+            self.COLUMNS,
+            self.table,
+            "client_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and (order or "").strip().lower() == "desc",
+            where=where,
+            params=params,
+            sort_type=CLIENT_SORT_TYPES.get(sort_by),
+        )
+        return [Client.from_trusted_row(r) for r in rows], next_after
+
+    async def add_client(self, client: Client) -> None:
+        row = await self.db.execute_returning_one(
+            f"INSERT INTO {self.table} (name, type_of_property, address, phone) VALUES (%s, %s, %s, %s) RETURNING client_id",
+            (client.name, client.type_of_property, client.address, client.phone),
+        )
+        client.client_id = row["client_id"]
+
+    async def replace_client(self, client_id: int, new_client: Client) -> None:
+        rc = await self.db.execute(
+            f"UPDATE {self.table} SET name=%s, type_of_property=%s, address=%s, phone=%s WHERE client_id=%s",
+            (
+                new_client.name,
+                new_client.type_of_property,
+                new_client.address,
+                new_client.phone,
+                client_id,
+            ),
+        )
+        if rc == 0:
+            raise ValueError(f"Клиент с ID {client_id} не найден")
+        new_client.client_id = client_id
+
+    async def delete_client(self, client_id: int) -> None:
+        rc = await self.db.execute(f"DELETE FROM {self.table} WHERE client_id=%s", (client_id,))
+        if rc == 0:
+            raise ValueError(f"Клиент с ID {client_id} не найден")
+
+    async def get_count(self) -> int:
+        row = await self.db.fetch_one(f"SELECT COUNT(*) AS cnt FROM {self.table}")
+        return int(row["cnt"]) if row else 0
+
+
+class AsyncSecurity_rep_DB:
+    COLUMNS = "security_id, name, security_type, income"
+
+    def __init__(self, db: AsyncDatabaseManager, table: str = "public.securities"):
+        self.db = db
+        self.table = table
+
+    @staticmethod
+    def _row_to_security(row: dict) -> Security:
+        return Security.from_trusted_row(row)
+
+    async def read_all(self) -> List[Security]:
+        rows = await self.db.fetch_all(f"SELECT {self.COLUMNS} FROM {self.table} ORDER BY security_id")
+        return [self._row_to_security(r) for r in rows]
+
+    async def get_by_id(self, security_id: int) -> Optional[Security]:
+        if security_id <= 0:
+            return None
+        row = await self.db.fetch_one(
+            f"SELECT {self.COLUMNS} FROM {self.table} WHERE security_id = %s", (security_id,)
+        )
+        return self._row_to_security(row) if row else None
+
+    async def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Security], str | None]:
+        return await self.get_page(k, after, sort_by=sort_by, order=order)
+
+    async def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        name_q: str = "",
+        security_type_q: str = "",
+        income_min: str = "",
+        income_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Security], str | None]:
+        where, params = security_where_clause(
+            (name_q or "").strip().lower(),
+            (security_type_q or "").strip().lower(),
+            parse_income_bound(income_min),
+            parse_income_bound(income_max),
+        )
+        sort_by = (sort_by or "").strip().lower()
+        sort_expr = SECURITY_SORT_COLUMNS.get(sort_by)
+        rows, next_after = await afetch_page_after(
+            self.db,
+            self.COLUMNS,
+            self.table,
+            "security_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and (order or "").strip().lower() == "desc",
+            where=where,
+            params=params,
+            sort_type=SECURITY_SORT_TYPES.get(sort_by),
+        )
+        return [self._row_to_security(r) for r in rows], next_after
+
+    async def add_security(self, sec: Security) -> None:
+        row = await self.db.execute_returning_one(
+            f"INSERT INTO {self.table} (name, security_type, income) VALUES (%s, %s, %s) RETURNING security_id",
+            (sec.name, sec.security_type, sec.income),
+        )
+        if not row:
+            raise RuntimeError("INSERT не вернул security_id")
+        sec.security_id = int(row["security_id"])
+
+    async def replace_security(self, security_id: int, new_sec: Security) -> None:
+        rc = await self.db.execute(
+            f"UPDATE {self.table} SET name=%s, security_type=%s, income=%s WHERE security_id=%s",
+            (new_sec.name, new_sec.security_type, new_sec.income, security_id),
+        )
+        if rc == 0:
+            raise ValueError(f"Security с ID {security_id} не найден")
+
+    async def delete_security(self, security_id: int) -> None:
+        rc = await self.db.execute(f"DELETE FROM {self.table} WHERE security_id=%s", (security_id,))
+        if rc == 0:
+            raise ValueError(f"Security с ID {security_id} не найден")
+
+    async def get_count(self) -> int:
+        row = await self.db.fetch_one(f"SELECT COUNT(*) AS cnt FROM {self.table}")
+        return int(row["cnt"]) if row else 0
+
+
+class AsyncInvestment_rep_DB:
+    COLUMNS = "investment_id, client_id, security_id, amount, start_date, end_date, result"
+
+    def __init__(self, db: AsyncDatabaseManager, table: str = "public.investments"):
+        self.db = db
+        self.table = table
+
+    @staticmethod
+    def _row_to_investment(row: dict) -> Investment:
+        return Investment.from_trusted_row(row)
+
+    async def read_all(self) -> List[Investment]:
+        rows = await self.db.fetch_all(f"SELECT {self.COLUMNS} FROM {self.table} ORDER BY investment_id")
+        return [self._row_to_investment(r) for r in rows]
+
+    async def get_by_id(self, investment_id: int) -> Optional[Investment]:
+        if investment_id <= 0:
+            return None
+        row = await self.db.fetch_one(
+            f"SELECT {self.COLUMNS} FROM {self.table} WHERE investment_id = %s", (investment_id,)
+        )
+        return self._row_to_investment(row) if row else None
+
+    async def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Investment], str | None]:
+        sort_expr = INVESTMENT_SORT_COLUMNS.get(sort_by)
+        rows, next_after = await afetch_page_after(
+            self.db,
+            self.COLUMNS,
+            self.table,
+            "investment_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and order == "desc",
+            sort_type=INVESTMENT_SORT_TYPES.get(sort_by),
+        )
+        return [self._row_to_investment(r) for r in rows], next_after
+
+    async def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        client_id: str = "",
+        security_id: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        amount_min: str = "",
+        amount_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Investment], str | None]:
+        where, params = investment_where_clause(
+            parse_id_filter(client_id),
+            parse_id_filter(security_id),
+            parse_date_bound(date_from),
+            parse_date_bound(date_to),
+            parse_amount_bound(amount_min),
+            parse_amount_bound(amount_max),
+        )
+        sort_by = (sort_by or "").strip().lower()
+        sort_expr = INVESTMENT_SORT_COLUMNS.get(sort_by)
+        rows, next_after = await afetch_page_after(
+            self.db,
+            self.COLUMNS,
+            self.table,
+            "investment_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and (order or "").strip().lower() == "desc",
+            where=where,
+            params=params,
+            sort_type=INVESTMENT_SORT_TYPES.get(sort_by),
+        )
+        return [self._row_to_investment(r) for r in rows], next_after
+
+    async def add_investment(self, inv: Investment) -> None:
+        row = await self.db.execute_returning_one(
+            f"""
+            INSERT INTO {self.table} (client_id, security_id, amount, start_date, end_date, result)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING investment_id
+            """,
+            (inv.client_id, inv.security_id, inv.amount, inv.start_date, inv.end_date, inv.result),
+        )
+        if not row:
+            raise RuntimeError("INSERT не вернул investment_id")
+        inv.investment_id = int(row["investment_id"])
+
+    async def replace_investment(self, investment_id: int, new_inv: Investment) -> None:
+        rc = await self.db.execute(
+            f"""
+            UPDATE {self.table}
+            SET client_id=%s, security_id=%s, amount=%s, start_date=%s, end_date=%s, result=%s
+            WHERE investment_id=%s
+            """,
+            (
+                new_inv.client_id,
+                new_inv.security_id,
+                new_inv.amount,
+                new_inv.start_date,
+                new_inv.end_date,
+                new_inv.result,
+                investment_id,
+            ),
+        )
+        if rc == 0:
+            raise ValueError(f"Investment с ID {investment_id} не найден")
+
+    async def delete_investment(self, investment_id: int) -> None:
+        rc = await self.db.execute(f"DELETE FROM {self.table} WHERE investment_id=%s", (investment_id,))
+        if rc == 0:
+            raise ValueError(f"Investment с ID {investment_id} не найден")
+
+    async def get_count(self) -> int:
+        row = await self.db.fetch_one(f"SELECT COUNT(*) AS cnt FROM {self.table}")
+        return int(row["cnt"]) if row else 0
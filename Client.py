@@ -1,12 +1,38 @@
 import json
+import logging
 import re
+import threading
+import uuid
 from abc import ABC, abstractmethod
-from typing import Any, Callable, List, Optional, Protocol
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import IO, Any, Callable, Iterable, Iterator, List, Optional, Protocol
 
 
 import psycopg2
 import yaml
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_UNKNOWN,
+)
+from psycopg2.errors import InvalidSqlStatementName, UndefinedTable, UniqueViolation
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+import yaml_backend
+from bulk_io import chunked, json_default
+from db_metrics import METRICS, QueryMetrics
+from event_bus import ALL_EVENTS, EventBus
+from file_storage import JsonlJournal, WriteBehind, atomic_write, file_signature
+from http_cache import RepoVersion, file_version, table_version
+from pagination import fetch_page_after, page_after
+from profiling import span
+from record_batch import RecordBatch
+from statement_cache import (
+    PERMANENT_PREPARE_ERRORS, StatementCache, StatementCachingConnection, to_server_params,
+)
+
+log = logging.getLogger(__name__)
 
 
 class RepoObserver(Protocol):
@@ -14,6 +40,106 @@ class RepoObserver(Protocol):
         pass
 
 
+CLIENT_SORT_COLUMNS = {
+    "id": "client_id",
+    "client_id": "client_id",
+    "name": "lower(name)",
+    "type": "lower(type_of_property)",
+    "type_of_property": "lower(type_of_property)",
+    "phone": "phone",
+}
+# тип значения сортировки в курсоре; id в курсоре хранится отдельно
+CLIENT_SORT_TYPES = {
+    "name": str,
+    "type": str,
+    "type_of_property": str,
+    "phone": str,
+}
+
+
+CLIENT_INSERT_COLUMNS = "name, type_of_property, address, phone"
+CLIENT_COLUMNS = f"client_id, {CLIENT_INSERT_COLUMNS}"
+# естественный ключ клиента — все поля, кроме id (как в Client.__eq__)
+CLIENT_KEY_COLUMNS = CLIENT_INSERT_COLUMNS
+
+
+CLIENT_SORT_KEYS: dict[str, Callable[["Client"], Any]] = {
+    "id": lambda c: c.client_id,
+    "client_id": lambda c: c.client_id,
+    "name": lambda c: c.name.lower(),
+    "type": lambda c: c.type_of_property.lower(),
+    "type_of_property": lambda c: c.type_of_property.lower(),
+    "phone": lambda c: c.phone,
+}
+
+
+def like_pattern(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def client_where_clause(
+    type_of_property: str = "", name_q: str = "", phone_q: str = ""
+) -> tuple[str, list]:
+    conditions: list[str] = []
+    params: list = []
+    if type_of_property:
+        conditions.append("type_of_property ILIKE %s")
+        params.append(like_pattern(type_of_property))
+    if name_q:
+        conditions.append("name ILIKE %s")
+        params.append(like_pattern(name_q))
+    if phone_q:
+        conditions.append("phone LIKE %s")
+        params.append(like_pattern(phone_q))
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+_FIO_PART_RE = re.compile(r"[А-ЯЁ][а-яё]*(?:-[А-ЯЁ][а-яё]*)?\.?")
+_PHONE_RE = re.compile(r"[+]?[7|8]?\d{10,11}")
+
+
+@lru_cache(maxsize=65536)
+def _valid_client_name(name):
+    name = name.strip()
+    array_fio = name.split(" ")
+    if name == "":
+        raise ValueError("Строка ФИО должна быть непустой")
+    if len(array_fio) not in [2, 3]:
+        raise ValueError("ФИО должно быть разделено пробелами")
+    for fio in array_fio:
+        if not fio[0].isupper():
+            raise ValueError("Каждая часть ФИО должна начинаться с заглавной буквы")
+        if not _FIO_PART_RE.fullmatch(fio):
+            raise ValueError("ФИО должно состоять только из букв, дефисов и точек")
+
+    return name
+
+
+@lru_cache(maxsize=65536)
+def _valid_phone(phone):
+    if phone == "":
+        raise ValueError("Строка номера телефона должна быть не пустой")
+
+    if len(phone) > 12:
+        raise ValueError("Телефон должен содержать не больше 12 знаков")
+    if not _PHONE_RE.match(phone):
+        raise ValueError("Неправильный формат телефона")
+
+    if phone[0] == "+":
+        phone = phone[1:]
+
+    if phone[0] == "8" and len(phone) == 11:
+        phone = "7" + phone[1:]
+
+    if len(phone) == 10:
+        phone = "7" + phone
+
+    return phone
+
+
 class BaseClient:
     def __init__(self, name, type_of_property, phone):
         self.name = name
@@ -46,19 +172,7 @@ class BaseClient:
 
     @staticmethod
     def valid_client_name(name):
-        name = name.strip()
-        array_fio = name.split(" ")
-        if name == "":
-            raise ValueError("Строка ФИО должна быть непустой")
-        if len(array_fio) not in [2, 3]:
-            raise ValueError("ФИО должно быть разделено пробелами")
-        for fio in array_fio:
-            if not fio[0].isupper():
-                raise ValueError("Каждая часть ФИО должна начинаться с заглавной буквы")
-            if not re.fullmatch(r"[А-ЯЁ][а-яё]*(?:-[А-ЯЁ][а-яё]*)?\.?", fio):
-                raise ValueError("ФИО должно состоять только из букв, дефисов и точек")
-
-        return name
+        return _valid_client_name(name)
 
     @staticmethod
     def valid_type_of_property(type_of_property):
@@ -77,25 +191,7 @@ class BaseClient:
 
     @staticmethod
     def valid_phone(phone):
-        if phone == "":
-            raise ValueError("Строка номера телефона должна быть не пустой")
-
-        if len(phone) > 12:
-            raise ValueError("Телефон должен содержать не больше 12 знаков")
-        pattern = re.compile(r"[+]?[7|8]?\d{10,11}")
-        if not re.match(pattern, phone):
-            raise ValueError("Неправильный формат телефона")
-
-        if phone[0] == "+":
-            phone = phone[1:]
-
-        if phone[0] == "8" and len(phone) == 11:
-            phone = "7" + phone[1:]
-
-        if len(phone) == 10:
-            phone = "7" + phone
-
-        return phone
+        return _valid_phone(phone)
 
     def __str__(self):
         return f"{self.name} - {self.type_of_property}"
@@ -141,6 +237,16 @@ class Client(BaseClient):
         else:
             raise TypeError(f"Неподдерживаемый тип данных: {type(data)}")
 
+    @classmethod
+    def from_trusted_row(cls, row) -> "Client":
+        client = cls.__new__(cls)
+        client._client_id = row["client_id"]
+        client._name = row["name"]
+        client._type_of_property = row["type_of_property"]
+        client._address = row["address"]
+        client._phone = row["phone"]
+        return client
+
     @property
     def client_id(self):
         return self._client_id
@@ -185,11 +291,22 @@ class Client(BaseClient):
         return f"{self.client_id} - {self.name} - {self.type_of_property} - {self.address} - {self.phone}"
 
 
+class ClientBatch(RecordBatch["Client"]):
+    FIELDS = ("client_id", "name", "type_of_property", "address", "phone")
+    TYPECODES = {"client_id": "q"}
+
+    def materialize(self, index: int) -> Client:
+        return Client(self.row(index))
+
+
 class ClientShort(BaseClient):
     def __init__(self, client):
         self.client_id = client.client_id
         self.short_name = self.make_short_name(client.name)
-        super().__init__(self.short_name, client.type_of_property, client.phone)
+        # client уже провалидирован, сокращённое ФИО и телефон переносим без повторной проверки
+        self._name = self.short_name
+        self._type_of_property = client.type_of_property
+        self._phone = client.phone
 
     def make_short_name(self, name):
         short_name = name.strip().split()
@@ -204,23 +321,68 @@ class ClientShort(BaseClient):
 
 
 class MyEntityRep(ABC):
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, write_behind: float = 0.0, events: EventBus | None = None):
         self.filename = filename
         self.clients: List[Client] = []
-        self._observers: list["RepoObserver"] = []
+        # шину передаёт RepoRegistry; своя — только у репозитория, созданного вне реестра
+        self.events = events if events is not None else EventBus()
+        # репозиторий общий для потоков пула: мутации и выдача id идут под одной блокировкой
+        self._write_lock = threading.RLock()
+        self._write_behind = WriteBehind(self.write_all, write_behind) if write_behind > 0 else None
+        # сигнатура файла на момент последнего чтения/записи: пока она не изменилась, read_all не перечитывает файл
+        self._signature: tuple | None = None
         self.read_all()
 
-    def attach(self, observer: "RepoObserver") -> None:
-        if observer not in self._observers:
-            self._observers.append(observer)
+    def attach(self, observer: "RepoObserver", event_type: str = ALL_EVENTS) -> None:
+        self.events.subscribe(event_type, observer.update)
 
-    def detach(self, observer: "RepoObserver") -> None:
-        if observer in self._observers:
-            self._observers.remove(observer)
+    def detach(self, observer: "RepoObserver", event_type: str = ALL_EVENTS) -> None:
+        self.events.unsubscribe(event_type, observer.update)
 
     def _notify(self, event_type: str, data: Any | None = None) -> None:
-        for obs in self._observers:
-            obs.update(event_type, data)
+        self.events.publish(event_type, data)
+
+    @property
+    def clients(self) -> List[Client]:
+        return self._clients
+
+    @clients.setter
+    def clients(self, value: List[Client]) -> None:
+        self._clients = value
+        self._keys: dict[tuple, set[int]] | None = None
+
+    @staticmethod
+    def _natural_key(client: Client) -> tuple:
+        return client.name, client.type_of_property, client.address, client.phone
+
+    def _key_index(self) -> dict[tuple, set[int]]:
+        # индекс строится лениво после перечитывания изменённого файла и дальше поддерживается мутациями.
+        # Новый id — всегда максимальный существующий + 1, что в процессе, что после перезапуска:
+        # id удалённого последнего клиента может быть выдан снова
+        if self._keys is None:
+            keys: dict[tuple, set[int]] = {}
+            for c in self._clients:
+                keys.setdefault(self._natural_key(c), set()).add(c.client_id)
+            self._keys = keys
+            self._max_id = max((c.client_id for c in self._clients), default=0)
+        return self._keys
+
+    def _current_signature(self) -> tuple | None:
+        return file_signature(self.filename)
+
+    def _unchanged_on_disk(self) -> bool:
+        # после записи write-behind ещё не сброшен или файл не менялся с прошлого чтения
+        if self._write_pending():
+            return True
+        return self._signature is not None and self._current_signature() == self._signature
+
+    def _unindex(self, client: Client) -> None:
+        key = self._natural_key(client)
+        ids = self._keys.get(key)
+        if ids is not None:
+            ids.discard(client.client_id)
+            if not ids:
+                del self._keys[key]
 
     @abstractmethod
     def read_all(self) -> List[Client]:
@@ -230,6 +392,33 @@ class MyEntityRep(ABC):
     def write_all(self, file_to_write: str = None) -> None:
         pass
 
+    @staticmethod
+    def _to_row(client: Client) -> dict:
+        return {
+            "client_id": client.client_id,
+            "name": client.name,
+            "type_of_property": client.type_of_property,
+            "address": client.address,
+            "phone": client.phone,
+        }
+
+    def _persist(self, op: str, client: Client) -> None:
+        if getattr(self, "_write_behind", None) is not None:
+            self._write_behind.schedule()
+        else:
+            self.write_all()
+
+    def _write_pending(self) -> bool:
+        wb = getattr(self, "_write_behind", None)
+        return wb is not None and wb.dirty
+
+    def flush(self) -> None:
+        if getattr(self, "_write_behind", None) is not None:
+            self._write_behind.flush()
+
+    def version_token(self) -> RepoVersion:
+        return file_version(file_signature(self.filename), getattr(self, "_write_behind", None))
+
     def get_by_id(self, client_id: int) -> Client | None:
         for client in self.clients:
             if client.client_id == client_id:
@@ -244,6 +433,23 @@ class MyEntityRep(ABC):
         selected_clients = self.clients[start:end]
         return [ClientShort(client) for client in selected_clients]
 
+    def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Client], str | None]:
+        sort_key = CLIENT_SORT_KEYS.get(sort_by)
+        return page_after(
+            self.clients,
+            k,
+            id_of=lambda c: c.client_id,
+            after=after,
+            sort_key=sort_key,
+            descending=sort_key is not None and order == "desc",
+        )
+
     def sort_by_name(self, reverse: bool = False) -> None:
         self.clients.sort(key=lambda client: client.name, reverse=reverse)
 
@@ -252,48 +458,52 @@ class MyEntityRep(ABC):
         new_client: Client,
         ignore_id: int | None = None,
     ) -> bool:
-        for c in self.clients:
-            if ignore_id is not None and c.client_id == ignore_id:
-                continue
-            if c == new_client:
-                return True
-        return False
+        ids = self._key_index().get(self._natural_key(new_client))
+        if not ids:
+            return False
+        return ignore_id is None or any(i != ignore_id for i in ids)
 
     def add_client(self, client: Client) -> None:
-        if self._client_exists(client):
-            raise ValueError("Клиент с такими данными уже существует")
+        with self._write_lock:
+            if self._client_exists(client):
+                raise ValueError("Клиент с такими данными уже существует")
 
-        if not self.clients:
-            new_id = 1
-        else:
-            new_id = max(c.client_id for c in self.clients) + 1
-
-        client.client_id = new_id
-        self.clients.append(client)
-        self.write_all()
-        self._notify("added", client)
+            self._max_id += 1
+            client.client_id = self._max_id
+            self.clients.append(client)
+            self._keys.setdefault(self._natural_key(client), set()).add(client.client_id)
+            self._persist("put", client)
+            self._notify("added", client)
 
     def replace_client(self, client_id: int, new_client: Client) -> None:
-        if self._client_exists(new_client, ignore_id=client_id):
-            raise ValueError("Клиент с такими данными уже существует")
-
-        for i, c in enumerate(self.clients):
-            if c.client_id == client_id:
-                new_client.client_id = c.client_id
-                self.clients[i] = new_client
-                self.write_all()
-                self._notify("updated", new_client)
-                return
-        raise ValueError(f"Клиент с ID {client_id} не найден")
+        with self._write_lock:
+            if self._client_exists(new_client, ignore_id=client_id):
+                raise ValueError("Клиент с такими данными уже существует")
+
+            for i, c in enumerate(self.clients):
+                if c.client_id == client_id:
+                    new_client.client_id = c.client_id
+                    self.clients[i] = new_client
+                    self._unindex(c)
+                    self._keys.setdefault(self._natural_key(new_client), set()).add(client_id)
+                    self._persist("put", new_client)
+                    self._notify("updated", new_client)
+                    return
+            raise ValueError(f"Клиент с ID {client_id} не найден")
 
     def delete_client(self, client_id: int) -> None:
-        for i, c in enumerate(self.clients):
-            if c.client_id == client_id:
-                removed = self.clients.pop(i)
-                self.write_all()
-                self._notify("deleted", removed)
-                return
-        raise ValueError(f"Клиент с ID {client_id} не найден")
+        with self._write_lock:
+            for i, c in enumerate(self.clients):
+                if c.client_id == client_id:
+                    removed = self.clients.pop(i)
+                    if self._keys is not None:
+                        self._unindex(removed)
+                        if removed.client_id == self._max_id:
+                            self._max_id = max((c.client_id for c in self.clients), default=0)
+                    self._persist("delete", removed)
+                    self._notify("deleted", removed)
+                    return
+            raise ValueError(f"Клиент с ID {client_id} не найден")
 
     def get_count(self) -> int:
         return len(self.clients)
@@ -309,174 +519,367 @@ class MyEntityRep(ABC):
         other_clients = sorted(other.clients, key=lambda c: c.client_id)
         return self_clients == other_clients
 
-    def _after_read_all(self):
-        self._notify("read_all", self.clients)
-
 
 class MyEntity_rep_json(MyEntityRep):
     def read_all(self) -> List[Client]:
-        try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except FileNotFoundError as e:
-            raise FileNotFoundError(f"Файл {self.filename} не найден") from e
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Файл {self.filename} не является корректным JSON") from e
-
-        if not isinstance(data, list):
-            raise ValueError("JSON должен содержать список объектов (list)")
-
-        clients: List[Client] = []
-        for item in data:
-            if not isinstance(item, dict):
-                raise ValueError(f"Некорректный элемент в {self.filename}")
-            clients.append(Client(item))
-
-        self.clients = clients
-        self._notify("read_all", self.clients)
-        return self.clients
+        with self._write_lock:
+            if self._unchanged_on_disk():
+                return self.clients
+            signature = self._current_signature()
+            try:
+                with open(self.filename, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError as e:
+                raise FileNotFoundError(f"Файл {self.filename} не найден") from e
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Файл {self.filename} не является корректным JSON") from e
+
+            if not isinstance(data, list):
+                raise ValueError("JSON должен содержать список объектов (list)")
+
+            clients: List[Client] = []
+            with span("validate"):
+                for item in data:
+                    if not isinstance(item, dict):
+                        raise ValueError(f"Некорректный элемент в {self.filename}")
+                    clients.append(Client(item))
+
+            self.clients = clients
+            self._signature = signature
+            return self.clients
 
     def write_all(self, file_to_write: str = None) -> None:
-        data_to_write = [
-            {
-                "client_id": client.client_id,
-                "name": client.name,
-                "type_of_property": client.type_of_property,
-                "address": client.address,
-                "phone": client.phone,
-            }
-            for client in self.clients
-        ]
+        data_to_write = [self._to_row(client) for client in list(self.clients)]
         filename = file_to_write if file_to_write else self.filename
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data_to_write, f, ensure_ascii=False, indent=4)
+        atomic_write(filename, lambda f: json.dump(data_to_write, f, ensure_ascii=False, indent=4))
+        if filename == self.filename:
+            self._signature = self._current_signature()
 
 
 class MyEntity_rep_yaml(MyEntityRep):
     def read_all(self) -> List[Client]:
-        try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-        except FileNotFoundError as e:
-            raise FileNotFoundError(f"Файл {self.filename} не найден") from e
-        except yaml.YAMLError as e:
-            raise ValueError(
-                f"Файл {self.filename} не является корректным YAML-файлом"
-            ) from e
-
-        if data is None:
-            self.clients = []
+        with self._write_lock:
+            if self._unchanged_on_disk():
+                return self.clients
+            signature = self._current_signature()
+            try:
+                with open(self.filename, "r", encoding="utf-8") as f:
+                    data = yaml_backend.safe_load(f)
+            except FileNotFoundError as e:
+                raise FileNotFoundError(f"Файл {self.filename} не найден") from e
+            except yaml.YAMLError as e:
+                raise ValueError(
+                    f"Файл {self.filename} не является корректным YAML-файлом"
+                ) from e
+
+            if data is None:
+                self.clients = []
+                self._signature = signature
+                return self.clients
+
+            if not isinstance(data, list):
+                raise ValueError(
+                    f"Некорректный формат YAML в {self.filename}. Ожидается list"
+                )
+
+            clients: List[Client] = []
+            with span("validate"):
+                for item in data:
+                    if not isinstance(item, dict):
+                        raise ValueError(f"Неккоректный элемент в {self.filename}")
+
+                    clients.append(Client(item))
+
+            self.clients = clients
+            self._signature = signature
             return self.clients
 
-        if not isinstance(data, list):
-            raise ValueError(
-                f"Некорректный формат YAML в {self.filename}. Ожидается list"
-            )
+    def write_all(self, file_to_write: str = None) -> None:
+        data_to_write = [self._to_row(client) for client in list(self.clients)]
+        filename = file_to_write if file_to_write else self.filename
+        atomic_write(
+            filename,
+            lambda f: yaml_backend.safe_dump(
+                data_to_write, f, default_flow_style=False, allow_unicode=True
+            ),
+        )
+        if filename == self.filename:
+            self._signature = self._current_signature()
 
-        clients: List[Client] = []
-        for item in data:
-            if not isinstance(item, dict):
-                raise ValueError(f"Неккоректный элемент в {self.filename}")
 
-            clients.append(Client(item))
+class MyEntity_rep_jsonl(MyEntityRep):
+    def __init__(
+        self,
+        filename: str,
+        snapshot: str | None = None,
+        compact_every: int = 1000,
+        events: EventBus | None = None,
+    ):
+        self.journal = JsonlJournal(filename, snapshot, compact_every)
+        super().__init__(filename, events=events)
 
-        self.clients = clients
-        self._notify("read_all", self.clients)
-        return self.clients
+    def _current_signature(self) -> tuple:
+        return self.journal.signature()
+
+    def read_all(self) -> List[Client]:
+        with self._write_lock:
+            if self._unchanged_on_disk():
+                return self.clients
+            signature = self._current_signature()
+            rows = self.journal.replay("client_id")
+            with span("validate"):
+                self.clients = [Client(item) for item in rows]
+            self._signature = signature
+            return self.clients
 
     def write_all(self, file_to_write: str = None) -> None:
-        data_to_write = [
-            {
-                "client_id": client.client_id,
-                "name": client.name,
-                "type_of_property": client.type_of_property,
-                "address": client.address,
-                "phone": client.phone,
-            }
-            for client in self.clients
-        ]
-        filename = file_to_write if file_to_write else self.filename
-        with open(filename, "w", encoding="utf-8") as f:
-            yaml.safe_dump(
-                data_to_write, f, default_flow_style=False, allow_unicode=True
-            )
+        data_to_write = [self._to_row(client) for client in list(self.clients)]
+        if file_to_write and file_to_write != self.filename:
+            atomic_write(file_to_write, lambda f: json.dump(data_to_write, f, ensure_ascii=False, indent=4))
+            return
+        self.journal.compact(data_to_write)
+        self._signature = self._current_signature()
+
+    def version_token(self) -> RepoVersion:
+        return file_version(self.journal.signature())
+
+    def _persist(self, op: str, client: Client) -> None:
+        if op == "delete":
+            self.journal.append(op, client.client_id)
+        else:
+            self.journal.append(op, client.client_id, self._to_row(client))
+        if self.journal.needs_compaction():
+            self.write_all()
+        else:
+            self._signature = self._current_signature()
 
 
 class MyEntity_rep_DB(MyEntityRep):
-    def __init__(self, db: "DatabaseManager", table: str = "public.clients"):
+    def __init__(self, db: "DatabaseManager", table: str = "public.clients", events: EventBus | None = None):
         self.db = db
         self.table = table
         self.filename = ""
-        self.client: List[Client] = []
-        self._observers: list["RepoObserver"] = []
+        self.clients: List[Client] = []
+        self.events = events if events is not None else EventBus()
+        self._select_all = f"SELECT {CLIENT_COLUMNS} FROM {table} ORDER BY client_id"
+        self._select_by_id = f"SELECT {CLIENT_COLUMNS} FROM {table} WHERE client_id = %s"
+        self._select_page = f"SELECT {CLIENT_COLUMNS} FROM {table} ORDER BY client_id LIMIT %s OFFSET %s"
+        self._insert = (
+            f"INSERT INTO {table} ({CLIENT_INSERT_COLUMNS}) VALUES (%s, %s, %s, %s) "
+            f"ON CONFLICT ({CLIENT_KEY_COLUMNS}) DO NOTHING RETURNING client_id"
+        )
+        # DO NOTHING не переписывает существующие строки (нет мёртвых версий, WAL и смены xmin),
+        # но и не возвращает их id — их добирает _select_by_keys
+        self._upsert = (
+            f"INSERT INTO {table} ({CLIENT_INSERT_COLUMNS}) VALUES %s "
+            f"ON CONFLICT ({CLIENT_KEY_COLUMNS}) DO NOTHING RETURNING {CLIENT_COLUMNS}"
+        )
+        self._select_by_keys = f"SELECT {CLIENT_COLUMNS} FROM {table} WHERE ({CLIENT_KEY_COLUMNS}) IN (VALUES %s)"
+        # ON CONFLICT требует уникального индекса из migrate.py; пока его нет — вставка через NOT EXISTS
+        schema, _, name = table.rpartition(".")
+        self._key_index_name = f"{name}_natural_key_uq"
+        self._key_index_lookup = (schema or "public", name, self._key_index_name)
+        self._has_key_index: bool | None = None
+        self._insert_if_absent = (
+            f"INSERT INTO {table} ({CLIENT_INSERT_COLUMNS}) SELECT %s, %s, %s, %s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE ({CLIENT_KEY_COLUMNS}) = (%s, %s, %s, %s)) "
+            "RETURNING client_id"
+        )
+        self._upsert_if_absent = (
+            f"INSERT INTO {table} ({CLIENT_INSERT_COLUMNS}) "
+            f"SELECT * FROM (VALUES %s) AS v ({CLIENT_INSERT_COLUMNS}) WHERE NOT EXISTS ("
+            f"SELECT 1 FROM {table} t WHERE (t.name, t.type_of_property, t.address, t.phone) "
+            "= (v.name, v.type_of_property, v.address, v.phone)"
+            f") RETURNING {CLIENT_COLUMNS}"
+        )
+        self._update = f"UPDATE {table} SET name=%s, type_of_property=%s, address=%s, phone=%s WHERE client_id=%s"
+        self._delete = f"DELETE FROM {table} WHERE client_id=%s"
+        self._count = f"SELECT COUNT(*) AS cnt FROM {table}"
 
     def read_all(self) -> List[Client]:
-        rows = self.db.fetch_all(
-            f"SELECT client_id, name, type_of_property, address, phone FROM {self.table} ORDER BY client_id"
-        )
-        clients = [Client(dict(r)) for r in rows]
+        rows = self.db.fetch_all(self._select_all)
+        clients = [Client.from_trusted_row(r) for r in rows]
         self.clients = clients
-        self._notify("read_all", clients)
         return clients
 
+    def iter_all(self, itersize: int = 2000) -> Iterator[Client]:
+        rows = self.db.iter_rows(self._select_all, itersize=itersize)
+        for r in rows:
+            yield Client.from_trusted_row(r)
+
+    def read_batch(self, itersize: int = 2000) -> ClientBatch:
+        return ClientBatch.from_rows(self.db.iter_rows(self._select_all, itersize=itersize))
+
     def write_all(self, file_to_write: str = None) -> None:
         pass
 
     def get_by_id(self, client_id: int) -> Client | None:
         if client_id <= 0:
             return None
-        row = self.db.fetch_one(
-            f"SELECT client_id, name, type_of_property, address, phone FROM {self.table} WHERE client_id = %s",
-            (client_id,),
-        )
-        return Client(dict(row)) if row else None
+        row = self.db.fetch_one(self._select_by_id, (client_id,))
+        return Client.from_trusted_row(row) if row else None
 
     def get_k_n_short_list(self, k: int, n: int) -> List[ClientShort] | None:
         if k <= 0 or n <= 0:
             return None
         offset = k * (n - 1)
-        rows = self.db.fetch_all(
-            f"SELECT client_id, name, type_of_property, address, phone FROM {self.table} ORDER BY client_id LIMIT %s OFFSET %s",
-            (k, offset),
+        rows = self.db.fetch_all(self._select_page, (k, offset))
+        return [ClientShort(Client.from_trusted_row(r)) for r in rows]
+
+    def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Client], str | None]:
+        sort_expr = CLIENT_SORT_COLUMNS.get(sort_by)
+        rows, next_after = fetch_page_after(
+            self.db,
+            CLIENT_COLUMNS,
+            self.table,
+            "client_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and order == "desc",
+            sort_type=CLIENT_SORT_TYPES.get(sort_by),
         )
-        return [ClientShort(Client(dict(r))) for r in rows]
+        return [Client.from_trusted_row(r) for r in rows], next_after
+
+    def ensure_unique_index(self) -> None:
+        try:
+            self.db.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {self._key_index_name} ON {self.table} ({CLIENT_KEY_COLUMNS})"
+            )
+        except UniqueViolation as e:
+            raise ValueError(f"В {self.table} есть дубликаты клиентов, уникальный индекс не создан") from e
+        self._has_key_index = True
+
+    def _key_index_ready(self) -> bool:
+        # проверяется один раз за процесс: индекс, созданный migrate.py позже, подхватится после перезапуска
+        if self._has_key_index is None:
+            row = self.db.fetch_one(
+                "SELECT 1 AS found FROM pg_indexes WHERE schemaname = %s AND tablename = %s AND indexname = %s",
+                self._key_index_lookup,
+            )
+            self._has_key_index = row is not None
+            if not self._has_key_index:
+                log.warning(
+                    "нет индекса %s на %s: запустите migrate.py, пока вставка идёт без ON CONFLICT",
+                    self._key_index_name,
+                    self.table,
+                )
+        return self._has_key_index
 
     def add_client(self, client: Client) -> None:
-        row = self.db.execute_returning_one(
-            f"INSERT INTO {self.table} (name, type_of_property, address, phone) VALUES (%s, %s, %s, %s) RETURNING client_id",
-            (client.name, client.type_of_property, client.address, client.phone),
-        )
+        key = self._natural_key(client)
+        if self._key_index_ready():
+            row = self.db.execute_returning_one(self._insert, key)
+        else:
+            row = self.db.execute_returning_one(self._insert_if_absent, key + key)
+        if row is None:
+            raise ValueError("Клиент с такими данными уже существует")
         client.client_id = row["client_id"]
         self._notify("added", client)
 
+    def upsert_clients(self, clients: Iterable[Client], page_size: int = 1000) -> List[int]:
+        ids: List[int] = []
+        upsert = self._upsert if self._key_index_ready() else self._upsert_if_absent
+        with self.db.transaction():
+            for batch in chunked(clients, page_size):
+                keys = list(dict.fromkeys(self._natural_key(c) for c in batch))
+                rows = self.db.execute_many_values(upsert, keys, page_size=len(keys), fetch=True)
+                key_ids = {
+                    (r["name"], r["type_of_property"], r["address"], r["phone"]): r["client_id"] for r in rows
+                }
+                existing = [key for key in keys if key not in key_ids]
+                if existing:
+                    rows = self.db.execute_many_values(self._select_by_keys, existing, page_size=len(existing), fetch=True)
+                    key_ids.update(
+                        ((r["name"], r["type_of_property"], r["address"], r["phone"]), r["client_id"]) for r in rows
+                    )
+                for client in batch:
+                    client.client_id = key_ids[self._natural_key(client)]
+                    ids.append(client.client_id)
+        if ids:
+            self._notify("upserted", ids)
+        return ids
+
+    def bulk_export(self, f: IO[str], fmt: str = "csv", batch_size: int = 5000) -> int:
+        if fmt == "csv":
+            return self.db.copy_expert(
+                f"COPY (SELECT {CLIENT_COLUMNS} FROM {self.table} ORDER BY client_id) TO STDOUT WITH (FORMAT csv, HEADER)",
+                f,
+            )
+        count = 0
+        for row in self.db.iter_rows(self._select_all, itersize=batch_size):
+            f.write(json.dumps(dict(row), ensure_ascii=False, default=json_default) + "\n")
+            count += 1
+        return count
+
     def replace_client(self, client_id: int, new_client: Client) -> None:
-        rc = self.db.execute(
-            f"UPDATE {self.table} SET name=%s, type_of_property=%s, address=%s, phone=%s WHERE client_id=%s",
-            (
-                new_client.name,
-                new_client.type_of_property,
-                new_client.address,
-                new_client.phone,
-                client_id,
-            ),
-        )
+        try:
+            rc = self.db.execute(self._update, (*self._natural_key(new_client), client_id))
+        except UniqueViolation as e:
+            raise ValueError("Клиент с такими данными уже существует") from e
         if rc == 0:
             raise ValueError(f"Клиент с ID {client_id} не найден")
         new_client.client_id = client_id
         self._notify("updated", new_client)
 
     def delete_client(self, client_id: int) -> None:
-        rc = self.db.execute(
-            f"DELETE FROM {self.table} WHERE client_id=%s", (client_id,)
-        )
+        rc = self.db.execute(self._delete, (client_id,))
         if rc == 0:
             raise ValueError(f"Клиент с ID {client_id} не найден")
-        self._notify("deleted", self.client)
+        self._notify("deleted", client_id)
 
     def get_count(self) -> int:
-        row = self.db.fetch_one(f"SELECT COUNT(*) AS cnt FROM {self.table}")
+        row = self.db.fetch_one(self._count)
         return int(row["cnt"])
 
+    def version_token(self) -> RepoVersion:
+        return self.db.table_version(self.table)
+
+
+# счётчик изменений таблиц для ETag: одна строка на таблицу, увеличивается триггером на уровне оператора.
+# Цена — блокировка этой строки до конца транзакции: пока пишущая транзакция (импорт, upsert_clients)
+# не завершилась, остальные писатели в ту же таблицу ждут на триггере. Читателей это не задерживает.
+# Увеличивать счётчик вне транзакции нельзя: читатель увидел бы новую версию со старыми данными
+# и закэшировал бы их под ней
+TABLE_VERSIONS = "public.table_versions"
+TABLE_VERSIONS_DDL = (
+    f"""
+    CREATE TABLE IF NOT EXISTS {TABLE_VERSIONS} (
+        table_name text PRIMARY KEY,
+        version bigint NOT NULL DEFAULT 0,
+        changed_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+    # пустая таблица переходов — оператор ничего не изменил (например, ON CONFLICT DO NOTHING)
+    f"""
+    CREATE OR REPLACE FUNCTION public.bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'TRUNCATE' THEN
+            IF NOT EXISTS (SELECT 1 FROM changed_rows) THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+        INSERT INTO {TABLE_VERSIONS} AS v (table_name, version, changed_at)
+        VALUES (TG_TABLE_SCHEMA || '.' || TG_TABLE_NAME, 1, clock_timestamp())
+        ON CONFLICT (table_name) DO UPDATE SET version = v.version + 1, changed_at = EXCLUDED.changed_at;
+        RETURN NULL;
+    END
+    $$
+    """,
+)
+TABLE_VERSION_TRIGGERS = (
+    ("ins", "INSERT", "REFERENCING NEW TABLE AS changed_rows"),
+    ("upd", "UPDATE", "REFERENCING NEW TABLE AS changed_rows"),
+    ("del", "DELETE", "REFERENCING OLD TABLE AS changed_rows"),
+    ("trunc", "TRUNCATE", ""),
+)
+
 
 class DatabaseManager:
     _instance: "DatabaseManager | None" = None
@@ -487,54 +890,351 @@ class DatabaseManager:
         return cls._instance
 
     def __init__(
-        self, dsn: str, cursor_factory=RealDictCursor, autocommit: bool = True
+        self,
+        dsn: str,
+        cursor_factory=RealDictCursor,
+        autocommit: bool = True,
+        pool_min: int = 0,
+        pool_max: int = 0,
+        pool_timeout: float = 30.0,
+        health_check: bool = True,
+        statement_cache_size: int = 256,
+        metrics: QueryMetrics | None = None,
     ) -> None:
         if getattr(self, "_initialized", False):
             return
         self.dsn: str = dsn
         self.cursor_factory = cursor_factory
         self.autocommit: bool = autocommit
+        self.pool_min: int = pool_min
+        self.pool_max: int = pool_max
+        self.pool_timeout: float = pool_timeout
+        self.health_check: bool = health_check
+        self.statement_cache_size: int = statement_cache_size
+        self.statement_hits = 0
+        self.statement_misses = 0
+        self._stats_lock = threading.Lock()
+        self.metrics: QueryMetrics = metrics or METRICS
         self._conn = None
+        self._pool: ThreadedConnectionPool | None = None
+        self._pool_slots: threading.BoundedSemaphore | None = None
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._untracked_tables: set[str] = set()
         self._initialized: bool = True
-        self._ensure_connection()
+        if pool_max > 0:
+            self._pool = ThreadedConnectionPool(
+                max(pool_min, 0), pool_max, dsn, connection_factory=StatementCachingConnection
+            )
+            self._pool_slots = threading.BoundedSemaphore(pool_max)
+        else:
+            self._ensure_connection()
+
+    @property
+    def pooled(self) -> bool:
+        return self._pool is not None
 
     def _ensure_connection(self) -> None:
         if self._conn is None or self._conn.closed != 0:
-            self._conn = psycopg2.connect(self.dsn)
+            self._conn = psycopg2.connect(self.dsn, connection_factory=StatementCachingConnection)
             self._conn.autocommit = self.autocommit
 
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed != 0:
+            return False
+        status = conn.get_transaction_status()
+        if status == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status == TRANSACTION_STATUS_INERROR:
+            conn.rollback()
+        if not self.health_check:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            if not conn.autocommit:
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _checkout(self):
+        if not self._pool_slots.acquire(timeout=self.pool_timeout):
+            raise PoolError(
+                f"Нет свободных соединений в пуле за {self.pool_timeout} с"
+            )
+        try:
+            for _ in range(self.pool_max + 1):
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    conn.autocommit = self.autocommit
+                    return conn
+                self._pool.putconn(conn, close=True)
+            raise PoolError("Не удалось получить рабочее соединение из пула")
+        except BaseException:
+            self._pool_slots.release()
+            raise
+
+    def _checkin(self, conn) -> None:
+        try:
+            self._pool.putconn(conn, close=conn.closed != 0)
+        finally:
+            self._pool_slots.release()
+
+    @contextmanager
+    def connection(self):
+        if self._pool is None:
+            with self._lock:
+                self._ensure_connection()
+                yield self._conn
+            return
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._checkin(conn)
+
+    def _statements(self, conn) -> StatementCache | None:
+        if self.statement_cache_size <= 0 or not isinstance(conn, StatementCachingConnection):
+            return None
+        if conn.statements is None:
+            conn.statements = StatementCache(self.statement_cache_size)
+        return conn.statements
+
+    def _count_statement(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.statement_hits += 1
+            else:
+                self.statement_misses += 1
+        self.metrics.statement_cache(hit)
+
+    def statement_cache_info(self) -> dict[str, int]:
+        with self._stats_lock:
+            return {"hits": self.statement_hits, "misses": self.statement_misses, "maxsize": self.statement_cache_size}
+
+    def _execute(self, cur, sql: str, params: tuple | list | dict | None = None) -> None:
+        # в транзакции неудачный PREPARE оборвал бы её целиком, поэтому кэш работает только в autocommit
+        cache = self._statements(cur.connection) if cur.connection.autocommit else None
+        prepared = None
+        if cache is not None and not isinstance(params, dict) and sql not in cache.unpreparable:
+            prepared = to_server_params(sql)
+        if prepared is None or len(params or ()) != prepared[1]:
+            cur.execute(sql, params)
+            return
+
+        name = cache.get(sql)
+        self._count_statement(hit=name is not None)
+        try:
+            self._execute_prepared(cur, cache, sql, name, prepared, params)
+        except InvalidSqlStatementName:
+            # сессию сбросили (DISCARD ALL и т.п.) — подготовленных операторов на сервере больше нет
+            cache.clear()
+            self._execute_prepared(cur, cache, sql, None, prepared, params)
+
+    def _execute_prepared(
+        self, cur, cache: StatementCache, sql: str, name: str | None, prepared: tuple[str, int], params
+    ) -> None:
+        server_sql, nparams = prepared
+        if name is None:
+            name = cache.next_name()
+            try:
+                cur.execute(f"PREPARE {name} AS {server_sql}")
+            except psycopg2.Error as e:
+                if e.pgcode in PERMANENT_PREPARE_ERRORS:
+                    cache.unpreparable.add(sql)
+                cur.execute(sql, params)
+                return
+            evicted = cache.put(sql, name)
+            if evicted is not None:
+                cur.execute(f"DEALLOCATE {evicted}")
+
+        if nparams:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * nparams)})", params)
+        else:
+            cur.execute(f"EXECUTE {name}")
+
     def fetch_all(
         self, sql: str, params: tuple | list | dict | None = None
     ) -> list[dict]:
-        self._ensure_connection()
-        with self._conn.cursor(cursor_factory=self.cursor_factory) as cur:
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            return rows if rows is not None else []
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=self.cursor_factory) as cur, self.metrics.timed("fetch_all", sql) as t:
+                self._execute(cur, sql, params)
+                rows = cur.fetchall()
+                rows = rows if rows is not None else []
+                t.rows = len(rows)
+                return rows
 
     def fetch_one(
         self, sql: str, params: tuple | list | dict | None = None
     ) -> dict | None:
-        self._ensure_connection()
-        with self._conn.cursor(cursor_factory=self.cursor_factory) as cur:
-            cur.execute(sql, params)
-            return cur.fetchone()
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=self.cursor_factory) as cur, self.metrics.timed("fetch_one", sql) as t:
+                self._execute(cur, sql, params)
+                row = cur.fetchone()
+                t.rows = int(row is not None)
+                return row
+
+    def ensure_table_version(self, table: str) -> None:
+        name = table.rsplit(".", 1)[-1]
+        with self.transaction():
+            for ddl in TABLE_VERSIONS_DDL:
+                self.execute(ddl)
+            for suffix, event, referencing in TABLE_VERSION_TRIGGERS:
+                trigger = f"{name}_version_{suffix}"
+                self.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+                self.execute(
+                    f"CREATE TRIGGER {trigger} AFTER {event} ON {table} {referencing} "
+                    "FOR EACH STATEMENT EXECUTE FUNCTION public.bump_table_version()"
+                )
+        self._untracked_tables.discard(table)
+
+    def ensure_sort_indexes(self, table: str, id_column: str, sort_exprs: Iterable[str]) -> List[str]:
+        # индекс (sort_expr, id) обслуживает keyset-страницы в обе стороны: ASC, ASC и DESC, DESC
+        name = table.rsplit(".", 1)[-1]
+        created = []
+        for expr in dict.fromkeys(sort_exprs):
+            if expr == id_column:
+                continue
+            index = f"{name}_{re.sub(r'[^0-9a-z]+', '_', expr.lower()).strip('_')}_keyset_idx"
+            self.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({expr}, {id_column})")
+            created.append(index)
+        return created
+
+    def table_version(self, table: str) -> RepoVersion:
+        if table not in self._untracked_tables:
+            try:
+                row = self.fetch_one(
+                    f"SELECT version, extract(epoch FROM changed_at)::float8 AS changed_at "
+                    f"FROM {TABLE_VERSIONS} WHERE table_name = %s",
+                    (table,),
+                )
+            except UndefinedTable:
+                # migrate.py ещё не запускали — работаем медленно, но корректно
+                self._untracked_tables.add(table)
+            else:
+                if row is None:
+                    return table_version(table, "0")
+                return table_version(table, str(row["version"]), row["changed_at"])
+
+        # полный проход по таблице: xmin меняется при вставке и обновлении, удаления видны по count
+        row = self.fetch_one(f"SELECT count(*) AS cnt, max(xmin::text::bigint) AS last_xid FROM {table}")
+        return table_version(table, f"scan:{row['cnt']}:{row['last_xid']}")
 
     def execute(self, sql: str, params: tuple | list | dict | None = None) -> int:
-        self._ensure_connection()
-        with self._conn.cursor() as cur:
-            cur.execute(sql, params)
-            return cur.rowcount
+        with self.connection() as conn:
+            with conn.cursor() as cur, self.metrics.timed("execute", sql) as t:
+                self._execute(cur, sql, params)
+                t.rows = cur.rowcount
+                return cur.rowcount
 
     def execute_returning_one(
         self, sql: str, params: tuple | list | dict | None = None
     ) -> dict | None:
-        self._ensure_connection()
-        with self._conn.cursor(cursor_factory=self.cursor_factory) as cur:
-            cur.execute(sql, params)
-            return cur.fetchone()
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=self.cursor_factory) as cur, self.metrics.timed("execute", sql) as t:
+                self._execute(cur, sql, params)
+                row = cur.fetchone()
+                t.rows = cur.rowcount
+                return row
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            if not conn.autocommit:
+                yield conn
+                return
+            conn.autocommit = False
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+
+    @contextmanager
+    def _dedicated_connection(self):
+        # генератор может жить долго и быть закрыт сборщиком мусора в другом потоке,
+        # поэтому ему нельзя держать общий self._conn под RLock
+        if self._pool is None:
+            conn = psycopg2.connect(self.dsn)
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        # поток уже держит соединение пула (внутри connection() или transaction()): второе при
+        # DB_POOL_MAX=1 не дождётся никогда, поэтому читаем через него — дочитать итератор нужно внутри того же блока
+        borrowed = getattr(self._local, "conn", None)
+        if borrowed is not None:
+            yield borrowed
+            return
+
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+
+    def iter_rows(
+        self, sql: str, params: tuple | list | dict | None = None, itersize: int = 2000
+    ) -> Iterator[dict]:
+        with self._dedicated_connection() as conn:
+            # серверному курсору нужна транзакция; запрос только читает, поэтому в конце rollback.
+            # Открытую вызывающим транзакцию не трогаем — курсор живёт в ней
+            own_tx = conn.autocommit or conn is not getattr(self._local, "conn", None)
+            restore_autocommit = conn.autocommit
+            if restore_autocommit:
+                conn.autocommit = False
+            try:
+                with conn.cursor(f"iter_{uuid.uuid4().hex}", cursor_factory=self.cursor_factory) as cur:
+                    cur.itersize = itersize
+                    # время включает и обработку строк потребителем — курсор читается порциями
+                    with self.metrics.timed("iter_rows", sql) as t:
+                        cur.execute(sql, params)
+                        for row in cur:
+                            t.rows += 1
+                            yield row
+            finally:
+                if own_tx and conn.closed == 0:
+                    conn.rollback()
+                    conn.autocommit = restore_autocommit
+
+    def execute_many_values(
+        self,
+        sql: str,
+        rows: list[tuple],
+        template: str | None = None,
+        page_size: int = 1000,
+        fetch: bool = False,
+    ) -> list:
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=self.cursor_factory) as cur, self.metrics.timed("execute_values", sql) as t:
+                result = execute_values(cur, sql, rows, template=template, page_size=page_size, fetch=fetch)
+                t.rows = len(rows)
+                return result if result is not None else []
+
+    def copy_expert(self, sql: str, file, size: int = 65536) -> int:
+        with self.connection() as conn:
+            with conn.cursor() as cur, self.metrics.timed("copy", sql) as t:
+                cur.copy_expert(sql, file, size)
+                t.rows = cur.rowcount
+                return cur.rowcount
 
     def close(self) -> None:
+        if self._pool is not None and not self._pool.closed:
+            self._pool.closeall()
         if self._conn and self._conn.closed == 0:
             self._conn.close()
 
@@ -553,6 +1253,10 @@ class FilteredSortedDB(MyEntityRep):
         self.reverse = reverse
         self.filename = getattr(base_repo, "filename", "")
         self.clients: List[Client] = []
+        self.type_of_property = ""
+        self.name_q = ""
+        self.phone_q = ""
+        self.sort_by = ""
 
     def read_all(self) -> List[Client]:
         return self._base_repo.read_all()
@@ -576,7 +1280,37 @@ class FilteredSortedDB(MyEntityRep):
         if hasattr(self._base_repo, "sort_by_name"):
             return self._base_repo.sort_by_name(reverse)
 
+    def _uses_callables(self) -> bool:
+        return self.filter_func is not None or self.sort_key is not None
+
+    def _where_clause(self) -> tuple[str, list]:
+        return client_where_clause(self.type_of_property, self.name_q, self.phone_q)
+
+    def _order_clause(self) -> str:
+        column = CLIENT_SORT_COLUMNS.get(self.sort_by)
+        if column is None:
+            return " ORDER BY client_id"
+        direction = "DESC" if self.reverse else "ASC"
+        if column == "client_id":
+            return f" ORDER BY client_id {direction}"
+        return f" ORDER BY {column} {direction}, client_id {direction}"
+
+    def _select(self, limit: int | None = None, offset: int = 0) -> List[Client]:
+        where, params = self._where_clause()
+        sql = (
+            f"SELECT client_id, name, type_of_property, address, phone FROM {self._base_repo.table}"
+            f"{where}{self._order_clause()}"
+        )
+        if limit is not None:
+            sql += " LIMIT %s OFFSET %s"
+            params.extend([limit, offset])
+        rows = self._base_repo.db.fetch_all(sql, params)
+        return [Client.from_trusted_row(r) for r in rows]
+
     def _get_filtered_sorted_clients(self) -> List[Client]:
+        if not self._uses_callables():
+            return self._select()
+
         clients = self._base_repo.read_all()
 
         if self.filter_func is not None:
@@ -592,6 +1326,9 @@ class FilteredSortedDB(MyEntityRep):
         if k <= 0 or n <= 0:
             return None
 
+        if not self._uses_callables():
+            return [ClientShort(c) for c in self._select(k, k * (n - 1))]
+
         clients = self._get_filtered_sorted_clients()
 
         start = k * (n - 1)
@@ -601,15 +1338,36 @@ class FilteredSortedDB(MyEntityRep):
         return [ClientShort(c) for c in page]
 
     def get_count(self) -> int:
-        if self.filter_func is None and self.sort_key is None:
-            return self._base_repo.get_count()
+        if self._uses_callables():
+            return len(self._get_filtered_sorted_clients())
 
-        clients = self._get_filtered_sorted_clients()
-        return len(clients)
+        where, params = self._where_clause()
+        if not where:
+            return self._base_repo.get_count()
+        row = self._base_repo.db.fetch_one(
+            f"SELECT COUNT(*) AS cnt FROM {self._base_repo.table}{where}", params
+        )
+        return int(row["cnt"]) if row else 0
 
     def get_filtered_sorted_list(self) -> List[Client]:
         return self._get_filtered_sorted_clients()
 
+    def _set_criteria(
+        self,
+        type_of_property: str = "",
+        name_q: str = "",
+        phone_q: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> None:
+        self.type_of_property = (type_of_property or "").strip().lower()
+        self.name_q = (name_q or "").strip().lower()
+        self.phone_q = (phone_q or "").strip()
+        self.sort_by = (sort_by or "").strip().lower()
+        self.reverse = (order or "asc").strip().lower() == "desc"
+        self.filter_func = None
+        self.sort_key = None
+
     def get_list(
         self,
         type_of_property: str = "",
@@ -617,39 +1375,40 @@ class FilteredSortedDB(MyEntityRep):
         phone_q: str = "",
         sort_by: str = "",
         order: str = "asc",
+        limit: int | None = None,
+        offset: int = 0,
     ) -> List[Client]:
-        type_of_property = (type_of_property or "").strip().lower()
-        name_q = (name_q or "").strip().lower()
-        phone_q = (phone_q or "").strip()
-        sort_by = (sort_by or "").strip().lower()
-        order = (order or "asc").strip().lower()
-
-        reverse = order == "desc"
-
-        def filter_func(c: Client) -> bool:
-            if type_of_property and type_of_property not in c.type_of_property.lower():
-                return False
-            if name_q and name_q not in c.name.lower():
-                return False
-            if phone_q and phone_q not in c.phone:
-                return False
-            return True
-
-        sort_key = None
-        if sort_by in ("id", "client_id"):
-            def sort_key(c): return c.client_id
-        elif sort_by == "name":
-            def sort_key(c): return c.name.lower()
-        elif sort_by in ("type", "type_of_property"):
-            def sort_key(c): return c.type_of_property.lower()
-        elif sort_by == "phone":
-            def sort_key(c): return c.phone
+        self._set_criteria(type_of_property, name_q, phone_q, sort_by, order)
+        return self._select(limit, offset)
 
-        self.filter_func = filter_func if (type_of_property or name_q or phone_q) else None
-        self.sort_key = sort_key
-        self.reverse = reverse
-
-        return self.get_filtered_sorted_list()
+    def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        type_of_property: str = "",
+        name_q: str = "",
+        phone_q: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Client], str | None]:
+        self._set_criteria(type_of_property, name_q, phone_q, sort_by, order)
+        where, params = self._where_clause()
+        sort_expr = CLIENT_SORT_COLUMNS.get(self.sort_by)
+        rows, next_after = fetch_page_after(
+            self._base_repo.db,
+            "client_id, name, type_of_property, address, phone",
+            self._base_repo.table,
+            "client_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and self.reverse,
+            where=where,
+            params=params,
+            sort_type=CLIENT_SORT_TYPES.get(self.sort_by),
+        )
+        with span("build"):
+            return [Client.from_trusted_row(r) for r in rows], next_after
 
 
 class FilteredSortedFile(MyEntityRep):
@@ -703,7 +1462,8 @@ class FilteredSortedFile(MyEntityRep):
             clients = [c for c in clients if self.filter_func(c)]
 
         if self.sort_key is not None:
-            clients.sort(key=self.sort_key, reverse=self.reverse)
+            # read_all отдаёт закэшированный список репозитория — сортируем копию
+            clients = sorted(clients, key=self.sort_key, reverse=self.reverse)
 
         return clients
 
@@ -725,14 +1485,14 @@ class FilteredSortedFile(MyEntityRep):
     def get_filtered_sorted_list(self) -> List[Client]:
         return self._get_filtered_sorted_clients()
 
-    def get_list(
+    def _set_criteria(
         self,
         type_of_property: str = "",
         name_q: str = "",
         phone_q: str = "",
         sort_by: str = "",
         order: str = "asc",
-    ) -> List[Client]:
+    ) -> None:
         type_of_property = (type_of_property or "").strip().lower()
         name_q = (name_q or "").strip().lower()
         phone_q = (phone_q or "").strip()
@@ -750,18 +1510,47 @@ class FilteredSortedFile(MyEntityRep):
                 return False
             return True
 
-        sort_key = None
-        if sort_by in ("id", "client_id"):
-            def sort_key(c): return c.client_id
-        elif sort_by == "name":
-            def sort_key(c): return c.name.lower()
-        elif sort_by in ("type", "type_of_property"):
-            def sort_key(c): return c.type_of_property.lower()
-        elif sort_by == "phone":
-            def sort_key(c): return c.phone
-
         self.filter_func = filter_func if (type_of_property or name_q or phone_q) else None
-        self.sort_key = sort_key
+        self.sort_key = CLIENT_SORT_KEYS.get(sort_by)
         self.reverse = reverse
 
-        return self.get_filtered_sorted_list()
+    def get_list(
+        self,
+        type_of_property: str = "",
+        name_q: str = "",
+        phone_q: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> List[Client]:
+        self._set_criteria(type_of_property, name_q, phone_q, sort_by, order)
+
+        clients = self.get_filtered_sorted_list()
+        if limit is not None:
+            return clients[offset:offset + limit]
+        return clients
+
+    def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        type_of_property: str = "",
+        name_q: str = "",
+        phone_q: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Client], str | None]:
+        self._set_criteria(type_of_property, name_q, phone_q, sort_by, order)
+        clients = self._base_repo.read_all()
+        with span("filter"):
+            if self.filter_func is not None:
+                clients = [c for c in clients if self.filter_func(c)]
+            return page_after(
+                clients,
+                k,
+                id_of=lambda c: c.client_id,
+                after=after,
+                sort_key=self.sort_key,
+                descending=self.sort_key is not None and self.reverse,
+            )
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from datetime import date, datetime
 
+from record_batch import RecordBatch
+
 
 from datetime import date, datetime
 
@@ -166,6 +168,19 @@ class Investment(BaseInvestment):
         else:
             raise TypeError(f"Неподдерживаемый тип данных: {type(data)}")
 
+    @classmethod
+    def from_trusted_row(cls, row) -> "Investment":
+        inv = cls.__new__(cls)
+        inv._investment_id = row["investment_id"]
+        inv._client_id = row["client_id"]
+        inv._security_id = row["security_id"]
+        inv._amount = float(row["amount"])
+        inv._start_date = row["start_date"]
+        inv._end_date = row["end_date"]
+        result = row["result"]
+        inv._result = float(result) if result is not None else None
+        return inv
+
     @property
     def investment_id(self) -> int:
         return self._investment_id
@@ -189,6 +204,15 @@ class Investment(BaseInvestment):
         )
 
 
+class InvestmentBatch(RecordBatch["Investment"]):
+    FIELDS = ("investment_id", "client_id", "security_id", "amount", "start_date", "end_date", "result")
+    TYPECODES = {"investment_id": "q", "client_id": "q", "security_id": "q", "amount": "d"}
+    CONVERTERS = {"result": lambda v: float(v) if v is not None else None}
+
+    def materialize(self, index: int) -> Investment:
+        return Investment(self.row(index))
+
+
 class InvestmentShort(BaseInvestment):
     def __init__(self, inv: Investment):
         self.investment_id = inv.investment_id
@@ -1,103 +1,164 @@
-from typing import List, Optional
-from datetime import date, datetime
+import json
+from datetime import date
+from typing import IO, Iterable, Iterator, List, Optional
 
+from psycopg2.errors import ForeignKeyViolation
+
+from bulk_io import CopyStream, chunked, json_default
 from Client import DatabaseManager
-from Investment import Investment
+from http_cache import RepoVersion
+from Investment import Investment, InvestmentBatch
+from pagination import fetch_page_after
 
+INVESTMENT_SORT_COLUMNS = {
+    "id": "investment_id",
+    "investment_id": "investment_id",
+    "client_id": "client_id",
+    "security_id": "security_id",
+    "amount": "amount",
+    "start_date": "start_date",
+}
+INVESTMENT_SORT_TYPES = {
+    "client_id": int,
+    "security_id": int,
+    "amount": float,
+    "start_date": date,
+}
 
-def _to_iso(d) -> str:
-    if isinstance(d, (date, datetime)):
-        return d.date().isoformat() if isinstance(d, datetime) else d.isoformat()
-    return str(d)
+INVESTMENT_INSERT_COLUMNS = "client_id, security_id, amount, start_date, end_date, result"
+INVESTMENT_COLUMNS = f"investment_id, {INVESTMENT_INSERT_COLUMNS}"
+INVESTMENT_FK_ERROR = "Клиент или ценная бумага с указанным ID не найдены"
 
 
 class Investment_rep_DB:
     def __init__(self, db: DatabaseManager, table: str = "public.investments"):
         self.db = db
         self.table = table
+        self._select_all = f"SELECT {INVESTMENT_COLUMNS} FROM {table} ORDER BY investment_id"
+        self._select_by_id = f"SELECT {INVESTMENT_COLUMNS} FROM {table} WHERE investment_id = %s"
+        self._insert = (
+            f"INSERT INTO {table} ({INVESTMENT_INSERT_COLUMNS}) VALUES (%s, %s, %s, %s, %s, %s) RETURNING investment_id"
+        )
+        self._update = (
+            f"UPDATE {table} SET client_id=%s, security_id=%s, amount=%s, start_date=%s, end_date=%s, result=%s "
+            "WHERE investment_id=%s"
+        )
+        self._delete = f"DELETE FROM {table} WHERE investment_id=%s"
+        self._count = f"SELECT COUNT(*) AS cnt FROM {table}"
 
     def _row_to_investment(self, row: dict) -> Investment:
-        return Investment(
-            {
-                "investment_id": int(row["investment_id"]),
-                "client_id": int(row["client_id"]),
-                "security_id": int(row["security_id"]),
-                "amount": float(row["amount"]),
-                "start_date": _to_iso(row["start_date"]),
-                "end_date": _to_iso(row["end_date"]),
-                "result": float(row.get("result", 0) or 0),
-            }
-        )
+        return Investment.from_trusted_row(row)
 
     def read_all(self) -> List[Investment]:
-        rows = self.db.fetch_all(
-            f"""
-            SELECT investment_id, client_id, security_id, amount, start_date, end_date, result
-            FROM {self.table}
-            ORDER BY investment_id
-            """
-        )
+        rows = self.db.fetch_all(self._select_all)
         return [self._row_to_investment(r) for r in rows]
 
+    def iter_all(self, itersize: int = 2000) -> Iterator[Investment]:
+        rows = self.db.iter_rows(self._select_all, itersize=itersize)
+        for r in rows:
+            yield self._row_to_investment(r)
+
+    def read_batch(self, itersize: int = 2000) -> InvestmentBatch:
+        return InvestmentBatch.from_rows(
+            self.db.iter_rows(self._select_all, itersize=itersize)
+        )
+
     def get_by_id(self, investment_id: int) -> Optional[Investment]:
         if investment_id <= 0:
             return None
-        row = self.db.fetch_one(
-            f"""
-            SELECT investment_id, client_id, security_id, amount, start_date, end_date, result
-            FROM {self.table}
-            WHERE investment_id = %s
-            """,
-            (investment_id,),
-        )
+        row = self.db.fetch_one(self._select_by_id, (investment_id,))
         return self._row_to_investment(row) if row else None
 
-    def add_investment(self, inv: Investment) -> None:
-        row = self.db.execute_returning_one(
-            f"""
-            INSERT INTO {self.table} (client_id, security_id, amount, start_date, end_date, result)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING investment_id
-            """,
-            (inv.client_id, inv.security_id, inv.amount, inv.start_date, inv.end_date, inv.result),
+    def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Investment], str | None]:
+        sort_expr = INVESTMENT_SORT_COLUMNS.get(sort_by)
+        rows, next_after = fetch_page_after(
+            self.db,
+            INVESTMENT_COLUMNS,
+            self.table,
+            "investment_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and order == "desc",
+            sort_type=INVESTMENT_SORT_TYPES.get(sort_by),
         )
+        return [self._row_to_investment(r) for r in rows], next_after
+
+    def add_investment(self, inv: Investment) -> None:
+        try:
+            row = self.db.execute_returning_one(self._insert, self._insert_row(inv))
+        except ForeignKeyViolation as e:
+            raise ValueError(INVESTMENT_FK_ERROR) from e
         if not row:
             raise RuntimeError("INSERT не вернул investment_id")
         inv.investment_id = int(row["investment_id"])
 
     def replace_investment(self, investment_id: int, new_inv: Investment) -> None:
-        rc = self.db.execute(
-            f"""
-            UPDATE {self.table}
-            SET client_id=%s,
-                security_id=%s,
-                amount=%s,
-                start_date=%s,
-                end_date=%s,
-                result=%s
-            WHERE investment_id=%s
-            """,
-            (
-                new_inv.client_id,
-                new_inv.security_id,
-                new_inv.amount,
-                new_inv.start_date,
-                new_inv.end_date,
-                new_inv.result,
-                investment_id,
-            ),
-        )
+        try:
+            rc = self.db.execute(self._update, (*self._insert_row(new_inv), investment_id))
+        except ForeignKeyViolation as e:
+            raise ValueError(INVESTMENT_FK_ERROR) from e
         if rc == 0:
             raise ValueError(f"Investment с ID {investment_id} не найден")
 
     def delete_investment(self, investment_id: int) -> None:
-        rc = self.db.execute(
-            f"DELETE FROM {self.table} WHERE investment_id=%s",
-            (investment_id,),
-        )
+        rc = self.db.execute(self._delete, (investment_id,))
         if rc == 0:
             raise ValueError(f"Investment с ID {investment_id} не найден")
 
     def get_count(self) -> int:
-        row = self.db.fetch_one(f"SELECT COUNT(*) AS cnt FROM {self.table}")
+        row = self.db.fetch_one(self._count)
         return int(row["cnt"]) if row else 0
+
+    def version_token(self) -> RepoVersion:
+        return self.db.table_version(self.table)
+
+    @staticmethod
+    def _insert_row(inv: Investment) -> tuple:
+        return (inv.client_id, inv.security_id, inv.amount, inv.start_date, inv.end_date, inv.result)
+
+    def bulk_add_investments(self, investments: Iterable[Investment], page_size: int = 1000) -> List[int]:
+        ids: List[int] = []
+        with self.db.transaction():
+            for batch in chunked(investments, page_size):
+                rows = self.db.execute_many_values(
+                    f"INSERT INTO {self.table} ({INVESTMENT_INSERT_COLUMNS}) VALUES %s RETURNING investment_id",
+                    [self._insert_row(inv) for inv in batch],
+                    page_size=page_size,
+                    fetch=True,
+                )
+                if len(rows) != len(batch):
+                    raise RuntimeError("INSERT вернул не все investment_id")
+                for inv, row in zip(batch, rows):
+                    inv.investment_id = int(row["investment_id"])
+                    ids.append(inv.investment_id)
+        return ids
+
+    def copy_investments(self, investments: Iterable[Investment]) -> int:
+        return self.db.copy_expert(
+            f"COPY {self.table} ({INVESTMENT_INSERT_COLUMNS}) FROM STDIN WITH (FORMAT csv)",
+            CopyStream(self._insert_row(inv) for inv in investments),
+        )
+
+    def bulk_export(self, f: IO[str], fmt: str = "csv", batch_size: int = 5000) -> int:
+        if fmt == "csv":
+            return self.db.copy_expert(
+                f"COPY (SELECT {INVESTMENT_COLUMNS} FROM {self.table} ORDER BY investment_id) "
+                "TO STDOUT WITH (FORMAT csv, HEADER)",
+                f,
+            )
+        count = 0
+        rows = self.db.iter_rows(
+            f"SELECT {INVESTMENT_COLUMNS} FROM {self.table} ORDER BY investment_id",
+            itersize=batch_size,
+        )
+        for row in rows:
+            f.write(json.dumps(dict(row), ensure_ascii=False, default=json_default) + "\n")
+            count += 1
+        return count
@@ -1,152 +1,223 @@
 from __future__ import annotations
-from typing import List
+from abc import ABC, abstractmethod
+from typing import Any, Callable, List
 import json
+import threading
 import yaml
 
+import yaml_backend
+from file_storage import JsonlJournal, WriteBehind, atomic_write, file_signature
+from http_cache import RepoVersion, file_version
 from Investment import Investment
+from pagination import page_after
+from profiling import span
 
+INVESTMENT_SORT_KEYS: dict[str, Callable[[Investment], Any]] = {
+    "id": lambda x: x.investment_id,
+    "investment_id": lambda x: x.investment_id,
+    "client_id": lambda x: x.client_id,
+    "security_id": lambda x: x.security_id,
+    "amount": lambda x: x.amount,
+    "start_date": lambda x: x.start_date.isoformat(),
+}
 
-class Investment_rep_json:
-    def __init__(self, filename: str):
-        self.filename = filename
-        self.investments: List[Investment] = []
 
-    def read_all(self) -> List[Investment]:
+class InvestmentFileRep(ABC):
+    def __init__(self, filename: str, write_behind: float = 0.0):
+        self.filename = filename
+        self._write_behind = WriteBehind(self.write_all, write_behind) if write_behind > 0 else None
+        self._index: dict[int, Investment] = {}
+        self._max_id = 0
+        self._loaded = False
+        self._signature: tuple[int, int, int] | None = None
+        # репозиторий общий для потоков пула: перечитывание, мутации и выдача id идут под одной блокировкой
+        self._write_lock = threading.RLock()
+
+    @property
+    def investments(self) -> List[Investment]:
+        return list(self._index.values())
+
+    @abstractmethod
+    def _load(self, f) -> Any:
+        pass
+
+    @abstractmethod
+    def _dump(self, data: list[dict], f) -> None:
+        pass
+
+    def _current_signature(self):
+        return file_signature(self.filename)
+
+    def _read_data(self) -> Any:
         try:
             with open(self.filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
+                return self._load(f)
         except FileNotFoundError:
-            self.investments = []
-            return self.investments
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Файл {self.filename} не является корректным JSON") from e
+            return None
+
+    def _refresh(self) -> None:
+        with self._write_lock:
+            if self._loaded and self._write_behind is not None and self._write_behind.dirty:
+                return
+            signature = self._current_signature()
+            if self._loaded and signature == self._signature:
+                return
 
-        if not isinstance(data, list):
-            raise ValueError("JSON должен содержать список объектов (list)")
+            data = self._read_data()
 
-        self.investments = [Investment(item) for item in data]
+            if data is None:
+                data = []
+            if not isinstance(data, list):
+                raise ValueError(f"Файл {self.filename} должен содержать список объектов (list)")
+
+            self._index = {}
+            with span("validate"):
+                for item in data:
+                    inv = Investment(item)
+                    self._index[inv.investment_id] = inv
+            self._max_id = max(self._index, default=0)
+            self._signature = signature
+            self._loaded = True
+
+    def read_all(self) -> List[Investment]:
+        self._refresh()
         return self.investments
 
+    @staticmethod
+    def _to_row(inv: Investment) -> dict:
+        return {
+            "investment_id": inv.investment_id,
+            "client_id": inv.client_id,
+            "security_id": inv.security_id,
+            "amount": inv.amount,
+            "start_date": inv.start_date,
+            "end_date": inv.end_date,
+            "result": inv.result,
+        }
+
     def write_all(self, file_to_write: str | None = None) -> None:
         filename = file_to_write or self.filename
-        data_to_write = [
-            {
-                "investment_id": inv.investment_id,
-                "client_id": inv.client_id,
-                "security_id": inv.security_id,
-                "amount": inv.amount,
-                "start_date": inv.start_date,
-                "end_date": inv.end_date,
-                "result": inv.result,
-            }
-            for inv in self.investments
-        ]
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data_to_write, f, ensure_ascii=False, indent=4)
+        data_to_write = [self._to_row(inv) for inv in list(self._index.values())]
+        atomic_write(filename, lambda f: self._dump(data_to_write, f))
+        if filename == self.filename:
+            self._signature = self._current_signature()
+
+    def _persist(self, op: str, item: Investment) -> None:
+        if self._write_behind is not None:
+            self._write_behind.schedule()
+        else:
+            self.write_all()
+
+    def flush(self) -> None:
+        if self._write_behind is not None:
+            self._write_behind.flush()
+
+    def version_token(self) -> RepoVersion:
+        return file_version(self._current_signature(), self._write_behind)
 
     def get_by_id(self, investment_id: int) -> Investment | None:
-        self.read_all()
-        for inv in self.investments:
-            if inv.investment_id == investment_id:
-                return inv
-        return None
+        self._refresh()
+        return self._index.get(investment_id)
+
+    def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Investment], str | None]:
+        self._refresh()
+        sort_key = INVESTMENT_SORT_KEYS.get(sort_by)
+        return page_after(
+            self.investments,
+            k,
+            id_of=lambda x: x.investment_id,
+            after=after,
+            sort_key=sort_key,
+            descending=sort_key is not None and order == "desc",
+        )
 
     def add_investment(self, inv: Investment) -> None:
-        self.read_all()
-        new_id = max([x.investment_id for x in self.investments], default=0) + 1
-        inv.investment_id = new_id
-        self.investments.append(inv)
-        self.write_all()
+        with self._write_lock:
+            self._refresh()
+            self._max_id += 1
+            inv.investment_id = self._max_id
+            self._index[inv.investment_id] = inv
+            self._persist("put", inv)
 
     def replace_investment(self, investment_id: int, new_inv: Investment) -> None:
-        self.read_all()
-        for i, x in enumerate(self.investments):
-            if x.investment_id == investment_id:
-                new_inv.investment_id = investment_id
-                self.investments[i] = new_inv
-                self.write_all()
-                return
-        raise ValueError(f"Investment с ID {investment_id} не найден")
+        with self._write_lock:
+            self._refresh()
+            if investment_id not in self._index:
+                raise ValueError(f"Investment с ID {investment_id} не найден")
+            new_inv.investment_id = investment_id
+            self._index[investment_id] = new_inv
+            self._persist("put", new_inv)
 
     def delete_investment(self, investment_id: int) -> None:
-        self.read_all()
-        before = len(self.investments)
-        self.investments = [x for x in self.investments if x.investment_id != investment_id]
-        if len(self.investments) == before:
-            raise ValueError(f"Investment с ID {investment_id} не найден")
-        self.write_all()
+        with self._write_lock:
+            self._refresh()
+            removed = self._index.pop(investment_id, None)
+            if removed is None:
+                raise ValueError(f"Investment с ID {investment_id} не найден")
+            self._persist("delete", removed)
+
+
+class Investment_rep_json(InvestmentFileRep):
+    def _load(self, f) -> Any:
+        text = f.read()
+        if not text.strip():
+            # пустой файл — пустой список, как и у YAML
+            return None
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Файл {self.filename} не является корректным JSON") from e
 
+    def _dump(self, data: list[dict], f) -> None:
+        json.dump(data, f, ensure_ascii=False, indent=4, default=str)
 
-class Investment_rep_yaml:
-    def __init__(self, filename: str):
-        self.filename = filename
-        self.investments: List[Investment] = []
 
-    def read_all(self) -> List[Investment]:
+class Investment_rep_yaml(InvestmentFileRep):
+    def _load(self, f) -> Any:
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-        except FileNotFoundError:
-            self.investments = []
-            return self.investments
+            return yaml_backend.safe_load(f)
         except yaml.YAMLError as e:
             raise ValueError(f"Файл {self.filename} не является корректным YAML") from e
 
-        if data is None:
-            self.investments = []
-            return self.investments
+    def _dump(self, data: list[dict], f) -> None:
+        yaml_backend.safe_dump(data, f, default_flow_style=False, allow_unicode=True)
 
-        if not isinstance(data, list):
-            raise ValueError("YAML должен содержать список объектов (list)")
 
-        self.investments = [Investment(item) for item in data]
-        return self.investments
+class Investment_rep_jsonl(InvestmentFileRep):
+    def __init__(self, filename: str, snapshot: str | None = None, compact_every: int = 1000):
+        super().__init__(filename)
+        self.journal = JsonlJournal(filename, snapshot, compact_every)
 
-    def write_all(self, file_to_write: str | None = None) -> None:
-        filename = file_to_write or self.filename
-        data_to_write = [
-            {
-                "investment_id": inv.investment_id,
-                "client_id": inv.client_id,
-                "security_id": inv.security_id,
-                "amount": inv.amount,
-                "start_date": inv.start_date,
-                "end_date": inv.end_date,
-                "result": inv.result,
-            }
-            for inv in self.investments
-        ]
-        with open(filename, "w", encoding="utf-8") as f:
-            yaml.safe_dump(data_to_write, f, default_flow_style=False, allow_unicode=True)
+    def _load(self, f) -> Any:
+        return json.load(f)
 
-    def get_by_id(self, investment_id: int) -> Investment | None:
-        self.read_all()
-        for inv in self.investments:
-            if inv.investment_id == investment_id:
-                return inv
-        return None
+    def _dump(self, data: list[dict], f) -> None:
+        json.dump(data, f, ensure_ascii=False, default=str)
 
-    def add_investment(self, inv: Investment) -> None:
-        self.read_all()
-        new_id = max([x.investment_id for x in self.investments], default=0) + 1
-        inv.investment_id = new_id
-        self.investments.append(inv)
-        self.write_all()
+    def _current_signature(self):
+        return self.journal.signature()
 
-    def replace_investment(self, investment_id: int, new_inv: Investment) -> None:
-        self.read_all()
-        for i, x in enumerate(self.investments):
-            if x.investment_id == investment_id:
-                new_inv.investment_id = investment_id
-                self.investments[i] = new_inv
-                self.write_all()
-                return
-        raise ValueError(f"Investment с ID {investment_id} не найден")
+    def _read_data(self) -> Any:
+        return self.journal.replay("investment_id")
 
-    def delete_investment(self, investment_id: int) -> None:
-        self.read_all()
-        before = len(self.investments)
-        self.investments = [x for x in self.investments if x.investment_id != investment_id]
-        if len(self.investments) == before:
-            raise ValueError(f"Investment с ID {investment_id} не найден")
-        self.write_all()
+    def write_all(self, file_to_write: str | None = None) -> None:
+        if file_to_write and file_to_write != self.filename:
+            return super().write_all(file_to_write)
+        self.journal.compact([self._to_row(inv) for inv in list(self._index.values())])
+        self._signature = self._current_signature()
+
+    def _persist(self, op: str, item: Investment) -> None:
+        if op == "delete":
+            self.journal.append(op, item.investment_id)
+        else:
+            self.journal.append(op, item.investment_id, self._to_row(item))
+        if self.journal.needs_compaction():
+            self.write_all()
+        else:
+            self._signature = self._current_signature()
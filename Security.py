@@ -1,6 +1,8 @@
 from __future__ import annotations
 import re
 
+from record_batch import RecordBatch
+
 
 class BaseSecurity:
     def __init__(self, name: str, security_type: str, income):
@@ -86,6 +88,15 @@ class Security(BaseSecurity):
         else:
             raise TypeError(f"Неподдерживаемый тип данных: {type(data)}")
 
+    @classmethod
+    def from_trusted_row(cls, row) -> "Security":
+        sec = cls.__new__(cls)
+        sec._security_id = row["security_id"]
+        sec._name = row["name"]
+        sec._security_type = row["security_type"]
+        sec._income = float(row["income"])
+        return sec
+
     @property
     def security_id(self) -> int:
         return self._security_id
@@ -106,6 +117,14 @@ class Security(BaseSecurity):
         return f"{self.security_id} - {self.name} - {self.security_type} - {self.income}"
 
 
+class SecurityBatch(RecordBatch["Security"]):
+    FIELDS = ("security_id", "name", "security_type", "income")
+    TYPECODES = {"security_id": "q", "income": "d"}
+
+    def materialize(self, index: int) -> Security:
+        return Security(self.row(index))
+
+
 class SecurityShort(BaseSecurity):
 
     def __init__(self, sec: Security):
@@ -1,82 +1,149 @@
-from typing import List, Optional
+import json
+from typing import IO, Iterable, Iterator, List, Optional
 
+from bulk_io import CopyStream, chunked, json_default
 from Client import DatabaseManager
-from Security import Security
+from http_cache import RepoVersion
+from pagination import fetch_page_after
+from Security import Security, SecurityBatch
+
+SECURITY_SORT_COLUMNS = {
+    "id": "security_id",
+    "security_id": "security_id",
+    "name": "lower(name)",
+    "type": "lower(security_type)",
+    "security_type": "lower(security_type)",
+    "income": "income",
+}
+SECURITY_SORT_TYPES = {
+    "name": str,
+    "type": str,
+    "security_type": str,
+    "income": float,
+}
+
+SECURITY_INSERT_COLUMNS = "name, security_type, income"
+SECURITY_COLUMNS = f"security_id, {SECURITY_INSERT_COLUMNS}"
 
 
 class Security_rep_DB:
     def __init__(self, db: DatabaseManager, table: str = "public.securities"):
         self.db = db
         self.table = table
+        self._select_all = f"SELECT {SECURITY_COLUMNS} FROM {table} ORDER BY security_id"
+        self._select_by_id = f"SELECT {SECURITY_COLUMNS} FROM {table} WHERE security_id = %s"
+        self._insert = f"INSERT INTO {table} ({SECURITY_INSERT_COLUMNS}) VALUES (%s, %s, %s) RETURNING security_id"
+        self._update = f"UPDATE {table} SET name=%s, security_type=%s, income=%s WHERE security_id=%s"
+        self._delete = f"DELETE FROM {table} WHERE security_id=%s"
+        self._count = f"SELECT COUNT(*) AS cnt FROM {table}"
 
     def _row_to_security(self, row: dict) -> Security:
-        return Security(
-            {
-                "security_id": int(row["security_id"]),
-                "name": str(row["name"]),
-                "security_type": str(row["security_type"]),
-                "income": float(row["income"]),
-            }
-        )
+        return Security.from_trusted_row(row)
 
     def read_all(self) -> List[Security]:
-        rows = self.db.fetch_all(
-            f"""
-            SELECT security_id, name, security_type, income
-            FROM {self.table}
-            ORDER BY security_id
-            """
-        )
+        rows = self.db.fetch_all(self._select_all)
         return [self._row_to_security(r) for r in rows]
 
+    def iter_all(self, itersize: int = 2000) -> Iterator[Security]:
+        rows = self.db.iter_rows(self._select_all, itersize=itersize)
+        for r in rows:
+            yield self._row_to_security(r)
+
+    def read_batch(self, itersize: int = 2000) -> SecurityBatch:
+        return SecurityBatch.from_rows(
+            self.db.iter_rows(self._select_all, itersize=itersize)
+        )
+
     def get_by_id(self, security_id: int) -> Optional[Security]:
         if security_id <= 0:
             return None
-        row = self.db.fetch_one(
-            f"""
-            SELECT security_id, name, security_type, income
-            FROM {self.table}
-            WHERE security_id = %s
-            """,
-            (security_id,),
-        )
+        row = self.db.fetch_one(self._select_by_id, (security_id,))
         return self._row_to_security(row) if row else None
 
-    def add_security(self, sec: Security) -> None:
-        row = self.db.execute_returning_one(
-            f"""
-            INSERT INTO {self.table} (name, security_type, income)
-            VALUES (%s, %s, %s)
-            RETURNING security_id
-            """,
-            (sec.name, sec.security_type, sec.income),
+    def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Security], str | None]:
+        sort_expr = SECURITY_SORT_COLUMNS.get(sort_by)
+        rows, next_after = fetch_page_after(
+            self.db,
+            SECURITY_COLUMNS,
+            self.table,
+            "security_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and order == "desc",
+            sort_type=SECURITY_SORT_TYPES.get(sort_by),
         )
+        return [self._row_to_security(r) for r in rows], next_after
+
+    def add_security(self, sec: Security) -> None:
+        row = self.db.execute_returning_one(self._insert, self._insert_row(sec))
         if not row:
             raise RuntimeError("INSERT не вернул security_id")
         sec.security_id = int(row["security_id"])
 
     def replace_security(self, security_id: int, new_sec: Security) -> None:
-        rc = self.db.execute(
-            f"""
-            UPDATE {self.table}
-            SET name=%s,
-                security_type=%s,
-                income=%s
-            WHERE security_id=%s
-            """,
-            (new_sec.name, new_sec.security_type, new_sec.income, security_id),
-        )
+        rc = self.db.execute(self._update, (*self._insert_row(new_sec), security_id))
         if rc == 0:
             raise ValueError(f"Security с ID {security_id} не найден")
 
     def delete_security(self, security_id: int) -> None:
-        rc = self.db.execute(
-            f"DELETE FROM {self.table} WHERE security_id=%s",
-            (security_id,),
-        )
+        rc = self.db.execute(self._delete, (security_id,))
         if rc == 0:
             raise ValueError(f"Security с ID {security_id} не найден")
 
     def get_count(self) -> int:
-        row = self.db.fetch_one(f"SELECT COUNT(*) AS cnt FROM {self.table}")
+        row = self.db.fetch_one(self._count)
         return int(row["cnt"]) if row else 0
+
+    def version_token(self) -> RepoVersion:
+        return self.db.table_version(self.table)
+
+    @staticmethod
+    def _insert_row(sec: Security) -> tuple:
+        return (sec.name, sec.security_type, sec.income)
+
+    def bulk_add_securities(self, securities: Iterable[Security], page_size: int = 1000) -> List[int]:
+        ids: List[int] = []
+        with self.db.transaction():
+            for batch in chunked(securities, page_size):
+                rows = self.db.execute_many_values(
+                    f"INSERT INTO {self.table} ({SECURITY_INSERT_COLUMNS}) VALUES %s RETURNING security_id",
+                    [self._insert_row(sec) for sec in batch],
+                    page_size=page_size,
+                    fetch=True,
+                )
+                if len(rows) != len(batch):
+                    raise RuntimeError("INSERT вернул не все security_id")
+                for sec, row in zip(batch, rows):
+                    sec.security_id = int(row["security_id"])
+                    ids.append(sec.security_id)
+        return ids
+
+    def copy_securities(self, securities: Iterable[Security]) -> int:
+        return self.db.copy_expert(
+            f"COPY {self.table} ({SECURITY_INSERT_COLUMNS}) FROM STDIN WITH (FORMAT csv)",
+            CopyStream(self._insert_row(sec) for sec in securities),
+        )
+
+    def bulk_export(self, f: IO[str], fmt: str = "csv", batch_size: int = 5000) -> int:
+        if fmt == "csv":
+            return self.db.copy_expert(
+                f"COPY (SELECT {SECURITY_COLUMNS} FROM {self.table} ORDER BY security_id) "
+                "TO STDOUT WITH (FORMAT csv, HEADER)",
+                f,
+            )
+        count = 0
+        rows = self.db.iter_rows(
+            f"SELECT {SECURITY_COLUMNS} FROM {self.table} ORDER BY security_id",
+            itersize=batch_size,
+        )
+        for row in rows:
+            f.write(json.dumps(dict(row), ensure_ascii=False, default=json_default) + "\n")
+            count += 1
+        return count
@@ -1,146 +1,220 @@
 from __future__ import annotations
-from typing import List
+from abc import ABC, abstractmethod
+from typing import Any, Callable, List
 import json
+import threading
 import yaml
 
+import yaml_backend
+from file_storage import JsonlJournal, WriteBehind, atomic_write, file_signature
+from http_cache import RepoVersion, file_version
+from pagination import page_after
+from profiling import span
 from Security import Security
 
+SECURITY_SORT_KEYS: dict[str, Callable[[Security], Any]] = {
+    "id": lambda s: s.security_id,
+    "security_id": lambda s: s.security_id,
+    "name": lambda s: s.name.lower(),
+    "type": lambda s: s.security_type.lower(),
+    "security_type": lambda s: s.security_type.lower(),
+    "income": lambda s: s.income,
+}
 
-class Security_rep_json:
-    def __init__(self, filename: str):
-        self.filename = filename
-        self.securities: List[Security] = []
 
-    def read_all(self) -> List[Security]:
+class SecurityFileRep(ABC):
+    def __init__(self, filename: str, write_behind: float = 0.0):
+        self.filename = filename
+        self._write_behind = WriteBehind(self.write_all, write_behind) if write_behind > 0 else None
+        self._index: dict[int, Security] = {}
+        self._max_id = 0
+        self._loaded = False
+        self._signature: tuple[int, int, int] | None = None
+        # репозиторий общий для потоков пула: перечитывание, мутации и выдача id идут под одной блокировкой
+        self._write_lock = threading.RLock()
+
+    @property
+    def securities(self) -> List[Security]:
+        return list(self._index.values())
+
+    @abstractmethod
+    def _load(self, f) -> Any:
+        pass
+
+    @abstractmethod
+    def _dump(self, data: list[dict], f) -> None:
+        pass
+
+    def _current_signature(self):
+        return file_signature(self.filename)
+
+    def _read_data(self) -> Any:
         try:
             with open(self.filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
+                return self._load(f)
         except FileNotFoundError:
-            self.securities = []
-            return self.securities
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Файл {self.filename} не является корректным JSON") from e
+            return None
+
+    def _refresh(self) -> None:
+        with self._write_lock:
+            if self._loaded and self._write_behind is not None and self._write_behind.dirty:
+                return
+            signature = self._current_signature()
+            if self._loaded and signature == self._signature:
+                return
 
-        if not isinstance(data, list):
-            raise ValueError("JSON должен содержать список объектов (list)")
+            data = self._read_data()
 
-        self.securities = [Security(item) for item in data]
+            if data is None:
+                data = []
+            if not isinstance(data, list):
+                raise ValueError(f"Файл {self.filename} должен содержать список объектов (list)")
+
+            self._index = {}
+            with span("validate"):
+                for item in data:
+                    sec = Security(item)
+                    self._index[sec.security_id] = sec
+            self._max_id = max(self._index, default=0)
+            self._signature = signature
+            self._loaded = True
+
+    def read_all(self) -> List[Security]:
+        self._refresh()
         return self.securities
 
+    @staticmethod
+    def _to_row(s: Security) -> dict:
+        return {
+            "security_id": s.security_id,
+            "name": s.name,
+            "security_type": s.security_type,
+            "income": s.income,
+        }
+
     def write_all(self, file_to_write: str | None = None) -> None:
         filename = file_to_write or self.filename
-        data_to_write = [
-            {
-                "security_id": s.security_id,
-                "name": s.name,
-                "security_type": s.security_type,
-                "income": s.income,
-            }
-            for s in self.securities
-        ]
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data_to_write, f, ensure_ascii=False, indent=4)
+        data_to_write = [self._to_row(s) for s in list(self._index.values())]
+        atomic_write(filename, lambda f: self._dump(data_to_write, f))
+        if filename == self.filename:
+            self._signature = self._current_signature()
+
+    def _persist(self, op: str, item: Security) -> None:
+        if self._write_behind is not None:
+            self._write_behind.schedule()
+        else:
+            self.write_all()
+
+    def flush(self) -> None:
+        if self._write_behind is not None:
+            self._write_behind.flush()
+
+    def version_token(self) -> RepoVersion:
+        return file_version(self._current_signature(), self._write_behind)
 
     def get_by_id(self, security_id: int) -> Security | None:
-        self.read_all()
-        for s in self.securities:
-            if s.security_id == security_id:
-                return s
-        return None
+        self._refresh()
+        return self._index.get(security_id)
+
+    def get_k_after(
+        self,
+        k: int,
+        after: str | None = None,
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Security], str | None]:
+        self._refresh()
+        sort_key = SECURITY_SORT_KEYS.get(sort_by)
+        return page_after(
+            self.securities,
+            k,
+            id_of=lambda s: s.security_id,
+            after=after,
+            sort_key=sort_key,
+            descending=sort_key is not None and order == "desc",
+        )
 
     def add_security(self, sec: Security) -> None:
-        self.read_all()
-        new_id = max([s.security_id for s in self.securities], default=0) + 1
-        sec.security_id = new_id
-        self.securities.append(sec)
-        self.write_all()
+        with self._write_lock:
+            self._refresh()
+            self._max_id += 1
+            sec.security_id = self._max_id
+            self._index[sec.security_id] = sec
+            self._persist("put", sec)
 
     def replace_security(self, security_id: int, new_sec: Security) -> None:
-        self.read_all()
-        for i, s in enumerate(self.securities):
-            if s.security_id == security_id:
-                new_sec.security_id = security_id
-                self.securities[i] = new_sec
-                self.write_all()
-                return
-        raise ValueError(f"Security с ID {security_id} не найден")
+        with self._write_lock:
+            self._refresh()
+            if security_id not in self._index:
+                raise ValueError(f"Security с ID {security_id} не найден")
+            new_sec.security_id = security_id
+            self._index[security_id] = new_sec
+            self._persist("put", new_sec)
 
     def delete_security(self, security_id: int) -> None:
-        self.read_all()
-        before = len(self.securities)
-        self.securities = [s for s in self.securities if s.security_id != security_id]
-        if len(self.securities) == before:
-            raise ValueError(f"Security с ID {security_id} не найден")
-        self.write_all()
+        with self._write_lock:
+            self._refresh()
+            removed = self._index.pop(security_id, None)
+            if removed is None:
+                raise ValueError(f"Security с ID {security_id} не найден")
+            self._persist("delete", removed)
+
+
+class Security_rep_json(SecurityFileRep):
+    def _load(self, f) -> Any:
+        text = f.read()
+        if not text.strip():
+            # пустой файл — пустой список, как и у YAML
+            return None
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Файл {self.filename} не является корректным JSON") from e
 
+    def _dump(self, data: list[dict], f) -> None:
+        json.dump(data, f, ensure_ascii=False, indent=4)
 
-class Security_rep_yaml:
-    def __init__(self, filename: str):
-        self.filename = filename
-        self.securities: List[Security] = []
 
-    def read_all(self) -> List[Security]:
+class Security_rep_yaml(SecurityFileRep):
+    def _load(self, f) -> Any:
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-        except FileNotFoundError:
-            self.securities = []
-            return self.securities
+            return yaml_backend.safe_load(f)
         except yaml.YAMLError as e:
             raise ValueError(f"Файл {self.filename} не является корректным YAML") from e
 
-        if data is None:
-            self.securities = []
-            return self.securities
+    def _dump(self, data: list[dict], f) -> None:
+        yaml_backend.safe_dump(data, f, default_flow_style=False, allow_unicode=True)
 
-        if not isinstance(data, list):
-            raise ValueError("YAML должен содержать список объектов (list)")
 
-        self.securities = [Security(item) for item in data]
-        return self.securities
+class Security_rep_jsonl(SecurityFileRep):
+    def __init__(self, filename: str, snapshot: str | None = None, compact_every: int = 1000):
+        super().__init__(filename)
+        self.journal = JsonlJournal(filename, snapshot, compact_every)
 
-    def write_all(self, file_to_write: str | None = None) -> None:
-        filename = file_to_write or self.filename
-        data_to_write = [
-            {
-                "security_id": s.security_id,
-                "name": s.name,
-                "security_type": s.security_type,
-                "income": s.income,
-            }
-            for s in self.securities
-        ]
-        with open(filename, "w", encoding="utf-8") as f:
-            yaml.safe_dump(data_to_write, f, default_flow_style=False, allow_unicode=True)
+    def _load(self, f) -> Any:
+        return json.load(f)
 
-    def get_by_id(self, security_id: int) -> Security | None:
-        self.read_all()
-        for s in self.securities:
-            if s.security_id == security_id:
-                return s
-        return None
+    def _dump(self, data: list[dict], f) -> None:
+        json.dump(data, f, ensure_ascii=False)
 
-    def add_security(self, sec: Security) -> None:
-        self.read_all()
-        new_id = max([s.security_id for s in self.securities], default=0) + 1
-        sec.security_id = new_id
-        self.securities.append(sec)
-        self.write_all()
+    def _current_signature(self):
+        return self.journal.signature()
 
-    def replace_security(self, security_id: int, new_sec: Security) -> None:
-        self.read_all()
-        for i, s in enumerate(self.securities):
-            if s.security_id == security_id:
-                new_sec.security_id = security_id
-                self.securities[i] = new_sec
-                self.write_all()
-                return
-        raise ValueError(f"Security с ID {security_id} не найден")
+    def _read_data(self) -> Any:
+        return self.journal.replay("security_id")
 
-    def delete_security(self, security_id: int) -> None:
-        self.read_all()
-        before = len(self.securities)
-        self.securities = [s for s in self.securities if s.security_id != security_id]
-        if len(self.securities) == before:
-            raise ValueError(f"Security с ID {security_id} не найден")
-        self.write_all()
+    def write_all(self, file_to_write: str | None = None) -> None:
+        if file_to_write and file_to_write != self.filename:
+            return super().write_all(file_to_write)
+        self.journal.compact([self._to_row(s) for s in list(self._index.values())])
+        self._signature = self._current_signature()
+
+    def _persist(self, op: str, item: Security) -> None:
+        if op == "delete":
+            self.journal.append(op, item.security_id)
+        else:
+            self.journal.append(op, item.security_id, self._to_row(item))
+        if self.journal.needs_compaction():
+            self.write_all()
+        else:
+            self._signature = self._current_signature()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+import asyncio
+import re
+from functools import lru_cache
+
+import asyncpg
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+@lru_cache(maxsize=512)
+def to_dollar_params(sql: str) -> str:
+    counter = 0
+
+    def repl(match: re.Match) -> str:
+        nonlocal counter
+        if match.group(0) == "%%":
+            return "%"
+        counter += 1
+        return f"${counter}"
+
+    return _PLACEHOLDER.sub(repl, sql)
+
+
+class AsyncDatabaseManager:
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, timeout: float = 30.0) -> None:
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self._pool: asyncpg.Pool | None = None
+        self._lock = asyncio.Lock()
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn, min_size=self.min_size, max_size=self.max_size
+                    )
+        return self._pool
+
+    async def fetch_all(self, sql: str, params: tuple | list | None = None) -> list[dict]:
+        pool = await self._get_pool()
+        async with pool.acquire(timeout=self.timeout) as conn:
+            rows = await conn.fetch(to_dollar_params(sql), *(params or ()))
+        return [dict(r) for r in rows]
+
+    async def fetch_one(self, sql: str, params: tuple | list | None = None) -> dict | None:
+        pool = await self._get_pool()
+        async with pool.acquire(timeout=self.timeout) as conn:
+            row = await conn.fetchrow(to_dollar_params(sql), *(params or ()))
+        return dict(row) if row is not None else None
+
+    async def execute(self, sql: str, params: tuple | list | None = None) -> int:
+        pool = await self._get_pool()
+        async with pool.acquire(timeout=self.timeout) as conn:
+            status = await conn.execute(to_dollar_params(sql), *(params or ()))
+        tail = status.rsplit(" ", 1)[-1]
+        return int(tail) if tail.isdigit() else 0
+
+    async def execute_returning_one(self, sql: str, params: tuple | list | None = None) -> dict | None:
+        return await self.fetch_one(sql, params)
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
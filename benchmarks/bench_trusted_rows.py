@@ -0,0 +1,102 @@
+"""Стоимость построения объектов из строк БД: валидирующий конструктор против from_trusted_row.
+
+Запуск из корня проекта: python -m benchmarks.bench_trusted_rows [--records 200000]
+"""
+from __future__ import annotations
+import argparse
+import time
+from datetime import date
+from decimal import Decimal
+
+from Client import Client
+from Investment import Investment
+from Security import Security
+
+
+def make_rows(n: int) -> dict[str, list[dict]]:
+    clients = [
+        {
+            "client_id": i,
+            "name": "Иванов Сергей Николаевич",
+            "type_of_property": "ООО Ромашка",
+            "address": f"г. Москва, ул. Ленина, {i % 300}",
+            "phone": f"7999{i:07d}",
+        }
+        for i in range(1, n + 1)
+    ]
+    securities = [
+        {"security_id": i, "name": f"Облигация {i}", "security_type": "bond", "income": Decimal("7.25")}
+        for i in range(1, n + 1)
+    ]
+    investments = [
+        {
+            "investment_id": i,
+            "client_id": i % 1000 + 1,
+            "security_id": i % 50 + 1,
+            "amount": Decimal("1500.00"),
+            "start_date": date(2024, 1, i % 28 + 1),
+            "end_date": date(2025, 1, i % 28 + 1),
+            "result": Decimal("12.50"),
+        }
+        for i in range(1, n + 1)
+    ]
+    return {"clients": clients, "securities": securities, "investments": investments}
+
+
+def validated_investment(row: dict) -> Investment:
+    return Investment(
+        {
+            "investment_id": int(row["investment_id"]),
+            "client_id": int(row["client_id"]),
+            "security_id": int(row["security_id"]),
+            "amount": float(row["amount"]),
+            "start_date": row["start_date"].isoformat(),
+            "end_date": row["end_date"].isoformat(),
+            "result": float(row["result"]),
+        }
+    )
+
+
+def validated_security(row: dict) -> Security:
+    return Security(
+        {
+            "security_id": int(row["security_id"]),
+            "name": str(row["name"]),
+            "security_type": str(row["security_type"]),
+            "income": float(row["income"]),
+        }
+    )
+
+
+def timed(fn, rows: list[dict]) -> float:
+    start = time.perf_counter()
+    for row in rows:
+        fn(row)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.records)
+    cases = [
+        ("clients", lambda r: Client(dict(r)), Client.from_trusted_row),
+        ("securities", validated_security, Security.from_trusted_row),
+        ("investments", validated_investment, Investment.from_trusted_row),
+    ]
+
+    print(f"records: {args.records}")
+    for name, validated, trusted in cases:
+        slow = timed(validated, rows[name])
+        fast = timed(trusted, rows[name])
+        per_slow = slow / args.records * 1e6
+        per_fast = fast / args.records * 1e6
+        print(
+            f"{name:12} validated {per_slow:6.2f} us/row   trusted {per_fast:6.2f} us/row   x{slow / fast:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Сравнение libyaml (CSafeLoader/CSafeDumper) и чистого Python на clients.yaml.
+
+Запуск из корня проекта: python -m benchmarks.bench_yaml [--records 100000]
+"""
+from __future__ import annotations
+import argparse
+import io
+import time
+
+import yaml
+
+import yaml_backend
+
+
+def make_clients(n: int) -> list[dict]:
+    return [
+        {
+            "client_id": i,
+            "name": "Иванов Сергей Николаевич",
+            "type_of_property": "ООО Ромашка",
+            "address": f"г. Москва, ул. Ленина, {i % 300}",
+            "phone": f"7999{i:07d}",
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    data = make_clients(args.records)
+    text = yaml_backend.safe_dump(data, default_flow_style=False, allow_unicode=True)
+    print(f"records: {args.records}, yaml size: {len(text.encode('utf-8')) / 1e6:.1f} MB")
+    print(f"active backend: {yaml_backend.YAML_BACKEND}")
+
+    backends = [("python", yaml.SafeLoader, yaml.SafeDumper)]
+    if yaml_backend.YAML_BACKEND == "libyaml":
+        backends.append(("libyaml", yaml_backend.SafeLoader, yaml_backend.SafeDumper))
+
+    for name, loader, dumper in backends:
+        load = timed(lambda: yaml.load(io.StringIO(text), Loader=loader))
+        dump = timed(
+            lambda: yaml.dump(data, io.StringIO(), Dumper=dumper, default_flow_style=False, allow_unicode=True)
+        )
+        print(f"{name:8} load {load:7.2f} s   dump {dump:7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
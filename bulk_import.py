@@ -0,0 +1,120 @@
+"""Потоковая загрузка/выгрузка клиентов, инвестиций и ценных бумаг в БД.
+
+    python bulk_import.py import investments broker.csv [--mode copy|values] [--batch 1000]
+    python bulk_import.py import clients clients.jsonl      # upsert по естественному ключу
+    python bulk_import.py export securities securities.jsonl
+"""
+from __future__ import annotations
+import argparse
+import sys
+from typing import Iterator
+
+import psycopg2
+
+from bulk_io import detect_format, read_rows
+from Client import Client
+from Investment import Investment
+from repo_factory import create_client_repo, create_investment_repo, create_security_repo
+from Security import Security
+
+
+def _optional(value):
+    return None if value in (None, "") else value
+
+
+def investments_from_rows(rows: Iterator[dict]) -> Iterator[Investment]:
+    for n, row in enumerate(rows, start=1):
+        try:
+            yield Investment(
+                0,
+                int(row["client_id"]),
+                int(row["security_id"]),
+                row["amount"],
+                row["start_date"],
+                _optional(row.get("end_date")),
+                _optional(row.get("result")),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Запись {n}: {e}") from e
+
+
+def clients_from_rows(rows: Iterator[dict]) -> Iterator[Client]:
+    for n, row in enumerate(rows, start=1):
+        try:
+            yield Client(0, row["name"], row["type_of_property"], row["address"], row["phone"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Запись {n}: {e}") from e
+
+
+def securities_from_rows(rows: Iterator[dict]) -> Iterator[Security]:
+    for n, row in enumerate(rows, start=1):
+        try:
+            yield Security(0, row["name"], row["security_type"], row["income"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Запись {n}: {e}") from e
+
+
+def run_import(kind: str, path: str, fmt: str, mode: str, batch: int) -> int:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = read_rows(f, fmt)
+        if kind == "clients":
+            # COPY не умеет ON CONFLICT, клиенты всегда идут через upsert
+            return len(create_client_repo("db").upsert_clients(clients_from_rows(rows), page_size=batch))
+
+        if kind == "investments":
+            repo = create_investment_repo("db")
+            items = investments_from_rows(rows)
+            if mode == "copy":
+                return repo.copy_investments(items)
+            return len(repo.bulk_add_investments(items, page_size=batch))
+
+        repo = create_security_repo("db")
+        items = securities_from_rows(rows)
+        if mode == "copy":
+            return repo.copy_securities(items)
+        return len(repo.bulk_add_securities(items, page_size=batch))
+
+
+_REPO_FACTORIES = {
+    "clients": create_client_repo,
+    "investments": create_investment_repo,
+    "securities": create_security_repo,
+}
+
+
+def run_export(kind: str, path: str, fmt: str, batch: int) -> int:
+    repo = _REPO_FACTORIES[kind]("db")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        return repo.bulk_export(f, fmt, batch_size=batch)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("kind", choices=tuple(_REPO_FACTORIES))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default=None)
+    parser.add_argument("--mode", choices=("copy", "values"), default="copy")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    try:
+        fmt = detect_format(args.path, args.format)
+        if args.action == "import":
+            count = run_import(args.kind, args.path, fmt, args.mode, args.batch)
+        else:
+            count = run_export(args.kind, args.path, fmt, args.batch)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    except psycopg2.Error as e:
+        # плохая строка внутри COPY приходит от сервера, с номером строки в тексте ошибки
+        print(f"Ошибка БД: {str(e).strip()}", file=sys.stderr)
+        return 1
+
+    print(f"{args.kind}: {count} записей")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
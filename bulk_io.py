@@ -0,0 +1,88 @@
+from __future__ import annotations
+import csv
+import io
+import json
+import os
+from decimal import Decimal
+from itertools import islice
+from typing import IO, Any, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+BULK_FORMATS = ("csv", "jsonl")
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def detect_format(path: str, fmt: str | None = None) -> str:
+    if fmt:
+        fmt = fmt.lower()
+    else:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = "jsonl" if ext in (".jsonl", ".ndjson") else ext.lstrip(".")
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат файла: {fmt}")
+    return fmt
+
+
+def read_rows(f: IO[str], fmt: str) -> Iterator[dict]:
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+        return
+    for n, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Строка {n}: некорректный JSON") from e
+
+
+def json_default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+class CopyStream(io.TextIOBase):
+    def __init__(self, rows: Iterable[tuple]):
+        self._rows = iter(rows)
+        self._line = io.StringIO()
+        self._writer = csv.writer(self._line, lineterminator="\n")
+        self._pending = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_line(self) -> str | None:
+        row = next(self._rows, None)
+        if row is None:
+            return None
+        self._line.seek(0)
+        self._line.truncate()
+        self._writer.writerow(row)
+        return self._line.getvalue()
+
+    def read(self, size: int | None = -1) -> str:
+        size = -1 if size is None else size
+        parts = [self._pending]
+        n = len(self._pending)
+        while size < 0 or n < size:
+            line = self._next_line()
+            if line is None:
+                break
+            parts.append(line)
+            n += len(line)
+        data = "".join(parts)
+        if size < 0 or n <= size:
+            self._pending = ""
+            return data
+        self._pending = data[size:]
+        return data[:size]
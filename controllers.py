@@ -1,6 +1,8 @@
-from typing import List, Optional, Dict
+from typing import Dict, Iterator
 from filtered_repo_factory import create_filtered_repo
-from Client import Client, ClientShort, MyEntityRep, RepoObserver, FilteredSortedFile
+from Client import Client, ClientShort, MyEntityRep, FilteredSortedFile
+from pagination import DEFAULT_PAGE_SIZE
+from profiling import span
 import views
 import re
 
@@ -23,17 +25,9 @@ def validate_client_fields(values: dict[str, str]) -> tuple[dict[str, str], dict
     return errors, cleaned
 
 
-class ClientController(RepoObserver):
+class ClientController:
     def __init__(self, repo: MyEntityRep):
         self.repo = repo
-        self.repo.attach(self)
-        self._last_clients: Optional[List[Client]] = None
-        self._last_event: Optional[str] = None
-
-    def update(self, event_type: str, data):
-        self._last_event = event_type
-        if event_type == "read_all":
-            self._last_clients = data
 
     def get_index_page(
         self,
@@ -43,7 +37,8 @@ class ClientController(RepoObserver):
         sort_by: str | None = None,
         order: str | None = None,
         storage: str = "db",
-    ) -> str:
+        after: str | None = None,
+    ) -> Iterator[str]:
 
         type_of_property = (type_of_property or "").strip()
         name_q = (name_q or "").strip()
@@ -51,54 +46,79 @@ class ClientController(RepoObserver):
         sort_by = (sort_by or "").strip()
         order = (order or "asc").strip().lower()
 
-        use_filter_or_sort = any([
-            type_of_property,
-            name_q,
-            phone_q,
-            sort_by,
-        ])
-
-        if use_filter_or_sort:
-            filtered_repo = create_filtered_repo(self.repo)
-            clients = filtered_repo.get_list(
-                type_of_property=type_of_property,
-                name_q=name_q,
-                phone_q=phone_q,
-                sort_by=sort_by,
-                order=order,
-            )
-        else:
-            self._last_clients = None
-            self.repo.read_all()
-            clients = self._last_clients or []
-
-        shorts = [ClientShort(c) for c in clients]
-
-        return views.render_client_list(
-            shorts,
-            filters={
-                "type_of_property": type_of_property,
-                "name_q": name_q,
-                "phone_q": phone_q,
-                "sort_by": sort_by,
-                "order": order,
-            },
+        criteria = {
+            "type_of_property": type_of_property,
+            "name_q": name_q,
+            "phone_q": phone_q,
+            "sort_by": sort_by,
+            "order": order,
+        }
+        filtered_repo = create_filtered_repo(self.repo)
+        with span("repo"):
+            try:
+                clients, next_after = filtered_repo.get_page(DEFAULT_PAGE_SIZE, after=after, **criteria)
+            except ValueError:
+                clients, next_after = filtered_repo.get_page(DEFAULT_PAGE_SIZE, **criteria)
+
+        return views.client_list_chunks(
+            (ClientShort(c) for c in clients),
+            filters=criteria,
             storage=storage,
+            next_after=next_after,
         )
 
     def get_client_details_page(self, client_id: int, storage: str = "db") -> str:
-        client = self.repo.get_by_id(client_id)
-        return views.render_client_details(client, storage=storage)
+        with span("repo"):
+            client = self.repo.get_by_id(client_id)
+        with span("render"):
+            return views.render_client_details(client, storage=storage)
 
 
-class AddClientController(RepoObserver):
-    def __init__(self, repo: MyEntityRep):
+class AsyncClientController:
+    def __init__(self, repo):
         self.repo = repo
-        self.repo.attach(self)
-        self._last_event: Optional[str] = None
 
-    def update(self, event_type: str, data):
-        self._last_event = event_type
+    async def get_index_page(
+        self,
+        type_of_property: str | None = None,
+        name_q: str | None = None,
+        phone_q: str | None = None,
+        sort_by: str | None = None,
+        order: str | None = None,
+        after: str | None = None,
+        list_url: str = "/async/",
+    ) -> Iterator[str]:
+        criteria = {
+            "type_of_property": (type_of_property or "").strip(),
+            "name_q": (name_q or "").strip(),
+            "phone_q": (phone_q or "").strip(),
+            "sort_by": (sort_by or "").strip(),
+            "order": (order or "asc").strip().lower(),
+        }
+        with span("repo"):
+            try:
+                clients, next_after = await self.repo.get_page(DEFAULT_PAGE_SIZE, after=after, **criteria)
+            except ValueError:
+                clients, next_after = await self.repo.get_page(DEFAULT_PAGE_SIZE, **criteria)
+
+        return views.client_list_chunks(
+            (ClientShort(c) for c in clients),
+            filters=criteria,
+            storage="db",
+            next_after=next_after,
+            list_url=list_url,
+        )
+
+    async def get_client_details_page(self, client_id: int) -> str:
+        with span("repo"):
+            client = await self.repo.get_by_id(client_id)
+        with span("render"):
+            return views.render_client_details(client, storage="db")
+
+
+class AddClientController:
+    def __init__(self, repo: MyEntityRep):
+        self.repo = repo
 
     def get_form_page(self, storage: str = "db") -> str:
         return views.render_client_form(
@@ -144,26 +164,23 @@ class AddClientController(RepoObserver):
         try:
             self.repo.add_client(client)
         except ValueError as e:
-
-            return views.render_add_client_form(
+            return views.render_client_form(
+                title="Добавление клиента",
+                action_url=f"/client/new?storage={storage}",
+                submit_text="Сохранить",
                 errors={"_form": str(e)},
-                values=raw_values
+                values=raw_values,
             )
 
         return views.render_client_saved(
             title="Клиент добавлен",
-            message=f'Клиент <b>{client.name}</b> добавлен с ID <b>{client.client_id}</b>.',
+            message=f'Клиент <b>{views.esc(client.name)}</b> добавлен с ID <b>{client.client_id}</b>.',
         )
 
 
-class EditClientController(RepoObserver):
+class EditClientController:
     def __init__(self, repo: MyEntityRep):
         self.repo = repo
-        self.repo.attach(self)
-        self._last_event: Optional[str] = None
-
-    def update(self, event_type: str, data):
-        self._last_event = event_type
 
     def get_form_page(self, client_id: int, storage: str = "db") -> str:
         client = self.repo.get_by_id(client_id)
@@ -222,10 +239,13 @@ class EditClientController(RepoObserver):
         try:
             self.repo.replace_client(client_id, new_client)
         except ValueError as e:
-            return views.render_edit_client_form(
-                client_id=client_id,
+            return views.render_client_form(
+                title="Редактирование клиента",
+                action_url=f"/client/{client_id}/edit?storage={storage}",
+                submit_text="Сохранить",
                 errors={"_form": str(e)},
                 values=raw_values,
+                client_id=client_id,
             )
 
         return views.render_client_saved(
@@ -234,14 +254,9 @@ class EditClientController(RepoObserver):
         )
 
 
-class DeleteClientController(RepoObserver):
+class DeleteClientController:
     def __init__(self, repo: MyEntityRep):
         self.repo = repo
-        self.repo.attach(self)
-        self._last_event: Optional[str] = None
-
-    def update(self, event_type: str, data):
-        self._last_event = event_type
 
     def get_confirm_page(self, client_id: int, storage: str = "db") -> str:
         client = self.repo.get_by_id(client_id)
@@ -253,6 +268,6 @@ class DeleteClientController(RepoObserver):
         except ValueError as e:
             return views.render_layout(
                 "Ошибка удаления",
-                f"<h1>Ошибка</h1><p>{e}</p><p><a href='javascript:window.close()'>Закрыть</a></p>",
+                f"<h1>Ошибка</h1><p>{views.esc(e)}</p><p><a href='javascript:window.close()'>Закрыть</a></p>",
             )
         return views.render_delete_success(client_id)
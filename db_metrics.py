@@ -0,0 +1,204 @@
+from __future__ import annotations
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERIES_PER_REQUEST_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SLOW_QUERY_SECONDS = float(os.getenv("DB_SLOW_QUERY_MS", "200")) / 1000
+STATEMENT_LABEL_LENGTH = 160
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+slow_log = logging.getLogger("db.slow")
+
+_WS_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def statement_label(sql: str) -> str:
+    text = _WS_RE.sub(" ", sql).strip()
+    if len(text) <= STATEMENT_LABEL_LENGTH:
+        return text
+    # у длинных запросов общее начало: без хэша полного текста разные запросы слились бы в одну метку
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+    return f"{text[:STATEMENT_LABEL_LENGTH]}… #{digest}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: dict[str, str], **extra: str) -> str:
+    items = {**pairs, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in items.items()) + "}"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name: str, labels: dict[str, str]) -> Iterator[str]:
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f"{name}_bucket{_labels(labels, le=repr(float(bound)))} {cumulative}"
+        yield f"{name}_bucket{_labels(labels, le='+Inf')} {self.count}"
+        yield f"{name}_sum{_labels(labels)} {self.total}"
+        yield f"{name}_count{_labels(labels)} {self.count}"
+
+
+class StatementStats:
+    __slots__ = ("latency", "rows", "errors")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.rows = 0
+        self.errors = 0
+
+
+class RequestStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+class QueryTiming:
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows = 0
+
+
+_current_request: ContextVar[RequestStats | None] = ContextVar("db_request_stats", default=None)
+
+
+def current_request_stats() -> RequestStats | None:
+    return _current_request.get()
+
+
+class QueryMetrics:
+    def __init__(self, slow_threshold: float = SLOW_QUERY_SECONDS):
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self._statements: dict[tuple[str, str], StatementStats] = {}
+        self._per_request = Histogram(QUERIES_PER_REQUEST_BUCKETS)
+        self.slow_queries = 0
+        self.statement_cache_hits = 0
+        self.statement_cache_misses = 0
+
+    def observe(self, op: str, sql: str, seconds: float, rows: int, error: bool = False) -> None:
+        label = statement_label(sql)
+        with self._lock:
+            stats = self._statements.get((op, label))
+            if stats is None:
+                stats = self._statements[(op, label)] = StatementStats()
+            stats.latency.observe(seconds)
+            if rows > 0:
+                stats.rows += rows
+            if error:
+                stats.errors += 1
+            slow = seconds >= self.slow_threshold
+            if slow:
+                self.slow_queries += 1
+
+        request = _current_request.get()
+        if request is not None:
+            request.queries += 1
+            request.seconds += seconds
+        if slow:
+            slow_log.warning("медленный запрос %.1f мс (%s, строк: %d): %s", seconds * 1000, op, rows, label)
+
+    @contextmanager
+    def timed(self, op: str, sql: str) -> Iterator[QueryTiming]:
+        timing = QueryTiming()
+        started = time.perf_counter()
+        try:
+            yield timing
+        except GeneratorExit:
+            # потребитель iter_rows остановился раньше — это не ошибка запроса
+            self.observe(op, sql, time.perf_counter() - started, timing.rows)
+            raise
+        except BaseException:
+            self.observe(op, sql, time.perf_counter() - started, timing.rows, error=True)
+            raise
+        self.observe(op, sql, time.perf_counter() - started, timing.rows)
+
+    def statement_cache(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.statement_cache_hits += 1
+            else:
+                self.statement_cache_misses += 1
+
+    @contextmanager
+    def track_request(self) -> Iterator[RequestStats]:
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        try:
+            yield stats
+        finally:
+            _current_request.reset(token)
+            with self._lock:
+                self._per_request.observe(stats.queries)
+
+    def render(self) -> str:
+        with self._lock:
+            statements = sorted(self._statements.items())
+            lines = [
+                "# HELP db_query_duration_seconds Время выполнения SQL-запроса.",
+                "# TYPE db_query_duration_seconds histogram",
+            ]
+            for (op, label), stats in statements:
+                lines.extend(stats.latency.lines("db_query_duration_seconds", {"op": op, "statement": label}))
+
+            lines += ["# HELP db_query_rows_total Строк возвращено или изменено.", "# TYPE db_query_rows_total counter"]
+            for (op, label), stats in statements:
+                lines.append(f"db_query_rows_total{_labels({'op': op, 'statement': label})} {stats.rows}")
+
+            lines += ["# HELP db_query_errors_total Запросов, завершившихся ошибкой.", "# TYPE db_query_errors_total counter"]
+            for (op, label), stats in statements:
+                lines.append(f"db_query_errors_total{_labels({'op': op, 'statement': label})} {stats.errors}")
+
+            lines += [
+                "# HELP db_slow_queries_total Запросов дольше порога DB_SLOW_QUERY_MS.",
+                "# TYPE db_slow_queries_total counter",
+                f"db_slow_queries_total {self.slow_queries}",
+                "# HELP db_statement_cache_hits_total Попадания в кэш подготовленных запросов.",
+                "# TYPE db_statement_cache_hits_total counter",
+                f"db_statement_cache_hits_total {self.statement_cache_hits}",
+                "# HELP db_statement_cache_misses_total Промахи кэша подготовленных запросов.",
+                "# TYPE db_statement_cache_misses_total counter",
+                f"db_statement_cache_misses_total {self.statement_cache_misses}",
+                "# HELP db_queries_per_request Число SQL-запросов на один HTTP-запрос.",
+                "# TYPE db_queries_per_request histogram",
+            ]
+            lines.extend(self._per_request.lines("db_queries_per_request", {}))
+        return "\n".join(lines) + "\n"
+
+
+METRICS = QueryMetrics()
@@ -0,0 +1,93 @@
+from __future__ import annotations
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+ALL_EVENTS = "*"
+
+Handler = Callable[[str, Any], None]
+
+
+class _StrongRef:
+    # лямбда или функция часто нигде больше не хранится: слабая ссылка умерла бы сразу после subscribe
+    __slots__ = ("handler",)
+
+    def __init__(self, handler: Handler):
+        self.handler = handler
+
+    def __call__(self) -> Handler:
+        return self.handler
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _StrongRef) and other.handler == self.handler
+
+    def __hash__(self) -> int:
+        return hash(self.handler)
+
+
+def _make_ref(handler: Handler) -> weakref.ref | _StrongRef:
+    # связанный метод держим слабо, чтобы подписка не продлевала жизнь наблюдателю (detach не обязателен);
+    # функции и прочие вызываемые объекты держим сильно до unsubscribe
+    if hasattr(handler, "__self__") and hasattr(handler, "__func__"):
+        return weakref.WeakMethod(handler)
+    return _StrongRef(handler)
+
+
+class EventBus:
+    def __init__(self, deferred: bool = False):
+        self.deferred = deferred
+        self._subscribers: dict[str, list[weakref.ref | _StrongRef]] = {}
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def subscribe(self, event_type: str, handler: Handler) -> None:
+        ref = _make_ref(handler)
+        with self._lock:
+            refs = self._subscribers.setdefault(event_type, [])
+            if ref not in refs:
+                refs.append(ref)
+
+    def unsubscribe(self, event_type: str, handler: Handler) -> None:
+        ref = _make_ref(handler)
+        with self._lock:
+            refs = self._subscribers.get(event_type)
+            if refs and ref in refs:
+                refs.remove(ref)
+
+    def has_subscribers(self, event_type: str) -> bool:
+        return bool(self._subscribers.get(event_type) or self._subscribers.get(ALL_EVENTS))
+
+    def _handlers(self, event_type: str) -> list[Handler]:
+        handlers: list[Handler] = []
+        with self._lock:
+            for key in (event_type, ALL_EVENTS):
+                refs = self._subscribers.get(key)
+                if not refs:
+                    continue
+                alive = [(ref, ref()) for ref in refs]
+                self._subscribers[key] = [ref for ref, h in alive if h is not None]
+                handlers.extend(h for _, h in alive if h is not None)
+        return handlers
+
+    def _dispatch(self, event_type: str, data: Any) -> None:
+        for handler in self._handlers(event_type):
+            handler(event_type, data)
+
+    def publish(self, event_type: str, data: Any | None = None) -> None:
+        if not self.has_subscribers(event_type):
+            return
+        if not self.deferred:
+            self._dispatch(event_type, data)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-bus")
+            executor = self._executor
+        executor.submit(self._dispatch, event_type, data)
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,175 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from typing import IO, Callable
+
+_write_behinds: "weakref.WeakSet[WriteBehind]" = weakref.WeakSet()
+
+
+def _fsync_dir(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(filename: str, dump: Callable[[IO[str]], None]) -> None:
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(
+        prefix=f".{os.path.basename(filename)}.", suffix=".tmp", dir=directory
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            dump(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmp)
+        os.replace(tmp, filename)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_dir(directory)
+
+
+class WriteBehind:
+    def __init__(self, flush_func: Callable[[], None], window: float):
+        self._flush_func = flush_func
+        self.window = window
+        self._lock = threading.RLock()
+        self._timer: threading.Timer | None = None
+        self._dirty = False
+        self._flushing = False
+        self.generation = 0
+        self.changed_at = 0.0
+        _write_behinds.add(self)
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty or self._flushing
+
+    def schedule(self) -> None:
+        with self._lock:
+            self._dirty = True
+            self.generation += 1
+            self.changed_at = time.time()
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._flushing = True
+            try:
+                self._flush_func()
+            except BaseException:
+                self._dirty = True
+                raise
+            finally:
+                self._flushing = False
+
+
+def flush_all() -> None:
+    for wb in list(_write_behinds):
+        wb.flush()
+
+
+def file_signature(filename: str) -> tuple[int, int, int] | None:
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class JsonlJournal:
+    def __init__(self, filename: str, snapshot: str | None = None, compact_every: int = 1000):
+        self.filename = filename
+        self.snapshot = snapshot or os.path.splitext(filename)[0] + ".snapshot.json"
+        self.compact_every = compact_every
+        self.records = 0
+
+    def signature(self) -> tuple:
+        return file_signature(self.snapshot), file_signature(self.filename)
+
+    def replay(self, id_field: str) -> list[dict]:
+        rows: dict[int, dict] = {}
+        try:
+            with open(self.snapshot, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = []
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Файл {self.snapshot} не является корректным JSON") from e
+        if not isinstance(data, list):
+            raise ValueError(f"Файл {self.snapshot} должен содержать список объектов (list)")
+        for item in data:
+            rows[int(item[id_field])] = item
+
+        self.records = 0
+        try:
+            with open(self.filename, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+
+        offset = 0
+        for n, raw in enumerate(lines):
+            try:
+                record = json.loads(raw) if raw.strip() else None
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                if n != len(lines) - 1:
+                    raise ValueError(f"Журнал {self.filename} повреждён (строка {n + 1})") from e
+                # оборванная запись после сбоя: отрезаем, чтобы дописывать с новой строки
+                with open(self.filename, "r+b") as f:
+                    f.truncate(offset)
+                break
+            offset += len(raw)
+            if not raw.endswith(b"\n"):
+                with open(self.filename, "ab") as f:
+                    f.write(b"\n")
+            if record is None:
+                continue
+            self.records += 1
+            if record["op"] == "delete":
+                rows.pop(int(record["id"]), None)
+            else:
+                rows[int(record["id"])] = record["data"]
+        return list(rows.values())
+
+    def append(self, op: str, row_id: int, data: dict | None = None) -> None:
+        record = {"op": op, "id": row_id}
+        if data is not None:
+            record["data"] = data
+        with open(self.filename, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.records += 1
+
+    def needs_compaction(self) -> bool:
+        return self.compact_every > 0 and self.records >= self.compact_every
+
+    def compact(self, rows: list[dict]) -> None:
+        atomic_write(self.snapshot, lambda f: json.dump(rows, f, ensure_ascii=False, default=str))
+        open(self.filename, "w", encoding="utf-8").close()
+        self.records = 0
@@ -0,0 +1,332 @@
+from __future__ import annotations
+from datetime import date, datetime
+from typing import Optional, Callable, Any, List
+
+from Investment import Investment
+from InvestmentRepoDB import INVESTMENT_COLUMNS, INVESTMENT_SORT_COLUMNS, INVESTMENT_SORT_TYPES
+from InvestmentRepoFile import INVESTMENT_SORT_KEYS
+from pagination import fetch_page_after, page_after
+from profiling import span
+
+
+def parse_id_filter(value: str | None) -> int | None:
+    try:
+        if value is not None and value.strip() != "":
+            v = int(value)
+            return v if v > 0 else None
+    except ValueError:
+        pass
+    return None
+
+
+def parse_amount_bound(value: str | None) -> float | None:
+    try:
+        if value is not None and value.strip() != "":
+            return float(value)
+    except ValueError:
+        pass
+    return None
+
+
+def parse_date_bound(value: str | None) -> date | None:
+    try:
+        if value is not None and value.strip() != "":
+            return datetime.strptime(value.strip(), "%Y-%m-%d").date()
+    except ValueError:
+        pass
+    return None
+
+
+def investment_where_clause(
+    client_id: int | None = None,
+    security_id: int | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    amount_min: float | None = None,
+    amount_max: float | None = None,
+) -> tuple[str, list]:
+    conditions: list[str] = []
+    params: list = []
+    if client_id is not None:
+        conditions.append("client_id = %s")
+        params.append(client_id)
+    if security_id is not None:
+        conditions.append("security_id = %s")
+        params.append(security_id)
+    if date_from is not None:
+        conditions.append("start_date >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("start_date <= %s")
+        params.append(date_to)
+    if amount_min is not None:
+        conditions.append("amount >= %s")
+        params.append(amount_min)
+    if amount_max is not None:
+        conditions.append("amount <= %s")
+        params.append(amount_max)
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+class FilteredSortedInvestmentFile:
+    def __init__(
+        self,
+        base_repo,
+        filter_func: Optional[Callable[[Investment], bool]] = None,
+        sort_key: Optional[Callable[[Investment], Any]] = None,
+        reverse: bool = False,
+    ):
+        self._base_repo = base_repo
+        self.filter_func = filter_func
+        self.sort_key = sort_key
+        self.reverse = reverse
+
+    def read_all(self) -> List[Investment]:
+        return self._base_repo.read_all()
+
+    def get_by_id(self, investment_id: int) -> Investment | None:
+        return self._base_repo.get_by_id(investment_id)
+
+    def add_investment(self, inv: Investment) -> None:
+        return self._base_repo.add_investment(inv)
+
+    def replace_investment(self, investment_id: int, new_inv: Investment) -> None:
+        return self._base_repo.replace_investment(investment_id, new_inv)
+
+    def delete_investment(self, investment_id: int) -> None:
+        return self._base_repo.delete_investment(investment_id)
+
+    def _get_filtered_sorted(self) -> List[Investment]:
+        items = self._base_repo.read_all()
+
+        if self.filter_func is not None:
+            items = [inv for inv in items if self.filter_func(inv)]
+
+        if self.sort_key is not None:
+            items.sort(key=self.sort_key, reverse=self.reverse)
+
+        return items
+
+    def get_filtered_sorted_list(self) -> List[Investment]:
+        return self._get_filtered_sorted()
+
+    def _set_criteria(
+        self,
+        client_id: str = "",
+        security_id: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        amount_min: str = "",
+        amount_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> None:
+        client_id_v = parse_id_filter(client_id)
+        security_id_v = parse_id_filter(security_id)
+        date_from_v = parse_date_bound(date_from)
+        date_to_v = parse_date_bound(date_to)
+        amount_min_v = parse_amount_bound(amount_min)
+        amount_max_v = parse_amount_bound(amount_max)
+        sort_by = (sort_by or "").strip().lower()
+        order = (order or "asc").strip().lower()
+
+        def filter_func(inv: Investment) -> bool:
+            if client_id_v is not None and inv.client_id != client_id_v:
+                return False
+            if security_id_v is not None and inv.security_id != security_id_v:
+                return False
+            if date_from_v is not None and inv.start_date < date_from_v:
+                return False
+            if date_to_v is not None and inv.start_date > date_to_v:
+                return False
+            if amount_min_v is not None and inv.amount < amount_min_v:
+                return False
+            if amount_max_v is not None and inv.amount > amount_max_v:
+                return False
+            return True
+
+        active = (client_id_v, security_id_v, date_from_v, date_to_v, amount_min_v, amount_max_v)
+        self.filter_func = filter_func if any(v is not None for v in active) else None
+        self.sort_key = INVESTMENT_SORT_KEYS.get(sort_by)
+        self.reverse = order == "desc"
+
+    def get_list(
+        self,
+        client_id: str = "",
+        security_id: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        amount_min: str = "",
+        amount_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> List[Investment]:
+        self._set_criteria(client_id, security_id, date_from, date_to, amount_min, amount_max, sort_by, order)
+
+        items = self.get_filtered_sorted_list()
+        if limit is not None:
+            return items[offset:offset + limit]
+        return items
+
+    def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        client_id: str = "",
+        security_id: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        amount_min: str = "",
+        amount_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Investment], str | None]:
+        self._set_criteria(client_id, security_id, date_from, date_to, amount_min, amount_max, sort_by, order)
+        items = self._base_repo.read_all()
+        with span("filter"):
+            if self.filter_func is not None:
+                items = [inv for inv in items if self.filter_func(inv)]
+            return page_after(
+                items,
+                k,
+                id_of=lambda inv: inv.investment_id,
+                after=after,
+                sort_key=self.sort_key,
+                descending=self.sort_key is not None and self.reverse,
+            )
+
+    def get_count(self) -> int:
+        return len(self._get_filtered_sorted())
+
+
+class FilteredSortedInvestmentDB(FilteredSortedInvestmentFile):
+    def __init__(
+        self,
+        base_repo,
+        filter_func: Optional[Callable[[Investment], bool]] = None,
+        sort_key: Optional[Callable[[Investment], Any]] = None,
+        reverse: bool = False,
+    ):
+        super().__init__(base_repo, filter_func, sort_key, reverse)
+        self.client_id: int | None = None
+        self.security_id: int | None = None
+        self.date_from: date | None = None
+        self.date_to: date | None = None
+        self.amount_min: float | None = None
+        self.amount_max: float | None = None
+        self.sort_by = ""
+
+    def _uses_callables(self) -> bool:
+        return self.filter_func is not None or self.sort_key is not None
+
+    def _where_clause(self) -> tuple[str, list]:
+        return investment_where_clause(
+            self.client_id, self.security_id, self.date_from, self.date_to, self.amount_min, self.amount_max
+        )
+
+    def _order_clause(self) -> str:
+        column = INVESTMENT_SORT_COLUMNS.get(self.sort_by)
+        if column is None:
+            return " ORDER BY investment_id"
+        direction = "DESC" if self.reverse else "ASC"
+        if column == "investment_id":
+            return f" ORDER BY investment_id {direction}"
+        return f" ORDER BY {column} {direction}, investment_id {direction}"
+
+    def _select(self, limit: int | None = None, offset: int = 0) -> List[Investment]:
+        where, params = self._where_clause()
+        sql = f"SELECT {INVESTMENT_COLUMNS} FROM {self._base_repo.table}{where}{self._order_clause()}"
+        if limit is not None:
+            sql += " LIMIT %s OFFSET %s"
+            params.extend([limit, offset])
+        rows = self._base_repo.db.fetch_all(sql, params)
+        return [self._base_repo._row_to_investment(r) for r in rows]
+
+    def _get_filtered_sorted(self) -> List[Investment]:
+        if self._uses_callables():
+            return super()._get_filtered_sorted()
+        return self._select()
+
+    def _set_criteria(
+        self,
+        client_id: str = "",
+        security_id: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        amount_min: str = "",
+        amount_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> None:
+        self.client_id = parse_id_filter(client_id)
+        self.security_id = parse_id_filter(security_id)
+        self.date_from = parse_date_bound(date_from)
+        self.date_to = parse_date_bound(date_to)
+        self.amount_min = parse_amount_bound(amount_min)
+        self.amount_max = parse_amount_bound(amount_max)
+        self.sort_by = (sort_by or "").strip().lower()
+        self.reverse = (order or "asc").strip().lower() == "desc"
+        self.filter_func = None
+        self.sort_key = None
+
+    def get_list(
+        self,
+        client_id: str = "",
+        security_id: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        amount_min: str = "",
+        amount_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> List[Investment]:
+        self._set_criteria(client_id, security_id, date_from, date_to, amount_min, amount_max, sort_by, order)
+        return self._select(limit, offset)
+
+    def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        client_id: str = "",
+        security_id: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        amount_min: str = "",
+        amount_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Investment], str | None]:
+        self._set_criteria(client_id, security_id, date_from, date_to, amount_min, amount_max, sort_by, order)
+        where, params = self._where_clause()
+        sort_expr = INVESTMENT_SORT_COLUMNS.get(self.sort_by)
+        rows, next_after = fetch_page_after(
+            self._base_repo.db,
+            INVESTMENT_COLUMNS,
+            self._base_repo.table,
+            "investment_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and self.reverse,
+            where=where,
+            params=params,
+            sort_type=INVESTMENT_SORT_TYPES.get(self.sort_by),
+        )
+        with span("build"):
+            return [self._base_repo._row_to_investment(r) for r in rows], next_after
+
+    def get_count(self) -> int:
+        if self._uses_callables():
+            return super().get_count()
+
+        where, params = self._where_clause()
+        row = self._base_repo.db.fetch_one(
+            f"SELECT COUNT(*) AS cnt FROM {self._base_repo.table}{where}", params
+        )
+        return int(row["cnt"]) if row else 0
@@ -1,9 +1,52 @@
 from __future__ import annotations
 from typing import Optional, Callable, Any, List
 
+from Client import like_pattern
+from pagination import fetch_page_after, page_after
+from profiling import span
 from Security import Security, SecurityShort
+from SecurityRepoDB import SECURITY_SORT_COLUMNS, SECURITY_SORT_TYPES
+from SecurityRepoFile import SECURITY_SORT_KEYS
 
-class FilteredSortedSecurityDB:
+
+def parse_income_bound(value: str | None) -> float | None:
+    try:
+        if value is not None and value.strip() != "":
+            return float(value)
+    except ValueError:
+        pass
+    return None
+
+
+def security_where_clause(
+    name_q: str = "",
+    security_type_q: str = "",
+    income_min: float | None = None,
+    income_max: float | None = None,
+) -> tuple[str, list]:
+    conditions: list[str] = []
+    params: list = []
+    if name_q:
+        conditions.append("name ILIKE %s")
+        params.append(like_pattern(name_q))
+    if security_type_q:
+        conditions.append("security_type ILIKE %s")
+        params.append(like_pattern(security_type_q))
+    if income_min is not None and income_max is not None:
+        conditions.append("income BETWEEN %s AND %s")
+        params.extend([income_min, income_max])
+    elif income_min is not None:
+        conditions.append("income >= %s")
+        params.append(income_min)
+    elif income_max is not None:
+        conditions.append("income <= %s")
+        params.append(income_max)
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+class FilteredSortedSecurityFile:
     def __init__(
         self,
         base_repo,
@@ -46,7 +89,7 @@ class FilteredSortedSecurityDB:
     def get_filtered_sorted_list(self) -> List[Security]:
         return self._get_filtered_sorted()
 
-    def get_list(
+    def _set_criteria(
         self,
         name_q: str = "",
         security_type_q: str = "",
@@ -54,25 +97,15 @@ class FilteredSortedSecurityDB:
         income_max: str = "",
         sort_by: str = "",
         order: str = "asc",
-    ) -> List[Security]:
+    ) -> None:
         name_q = (name_q or "").strip().lower()
         security_type_q = (security_type_q or "").strip().lower()
         sort_by = (sort_by or "").strip().lower()
         order = (order or "asc").strip().lower()
         reverse = order == "desc"
 
-        income_min_v = None
-        income_max_v = None
-        try:
-            if income_min.strip() != "":
-                income_min_v = float(income_min)
-        except ValueError:
-            income_min_v = None
-        try:
-            if income_max.strip() != "":
-                income_max_v = float(income_max)
-        except ValueError:
-            income_max_v = None
+        income_min_v = parse_income_bound(income_min)
+        income_max_v = parse_income_bound(income_max)
 
         def filter_func(s: Security) -> bool:
             if name_q and name_q not in s.name.lower():
@@ -85,22 +118,172 @@ class FilteredSortedSecurityDB:
                 return False
             return True
 
-        sort_key = None
-        if sort_by in ("id", "security_id"):
-            def sort_key(s: Security): return s.security_id
-        elif sort_by == "name":
-            def sort_key(s: Security): return s.name.lower()
-        elif sort_by in ("security_type", "type"):
-            def sort_key(s: Security): return s.security_type.lower()
-        elif sort_by == "income":
-            def sort_key(s: Security): return s.income
-
         self.filter_func = filter_func if (name_q or security_type_q or income_min_v is not None or income_max_v is not None) else None
-        self.sort_key = sort_key
+        self.sort_key = SECURITY_SORT_KEYS.get(sort_by)
         self.reverse = reverse
 
-        return self.get_filtered_sorted_list()
+    def get_list(
+        self,
+        name_q: str = "",
+        security_type_q: str = "",
+        income_min: str = "",
+        income_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> List[Security]:
+        self._set_criteria(name_q, security_type_q, income_min, income_max, sort_by, order)
+
+        items = self.get_filtered_sorted_list()
+        if limit is not None:
+            return items[offset:offset + limit]
+        return items
+
+    def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        name_q: str = "",
+        security_type_q: str = "",
+        income_min: str = "",
+        income_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Security], str | None]:
+        self._set_criteria(name_q, security_type_q, income_min, income_max, sort_by, order)
+        items = self._base_repo.read_all()
+        with span("filter"):
+            if self.filter_func is not None:
+                items = [s for s in items if self.filter_func(s)]
+            return page_after(
+                items,
+                k,
+                id_of=lambda s: s.security_id,
+                after=after,
+                sort_key=self.sort_key,
+                descending=self.sort_key is not None and self.reverse,
+            )
+
+    def get_count(self) -> int:
+        return len(self._get_filtered_sorted())
+
+
+class FilteredSortedSecurityDB(FilteredSortedSecurityFile):
+    def __init__(
+        self,
+        base_repo,
+        filter_func: Optional[Callable[[Security], bool]] = None,
+        sort_key: Optional[Callable[[Security], Any]] = None,
+        reverse: bool = False,
+    ):
+        super().__init__(base_repo, filter_func, sort_key, reverse)
+        self.name_q = ""
+        self.security_type_q = ""
+        self.income_min: float | None = None
+        self.income_max: float | None = None
+        self.sort_by = ""
+
+    def _uses_callables(self) -> bool:
+        return self.filter_func is not None or self.sort_key is not None
+
+    def _where_clause(self) -> tuple[str, list]:
+        return security_where_clause(self.name_q, self.security_type_q, self.income_min, self.income_max)
+
+    def _order_clause(self) -> str:
+        column = SECURITY_SORT_COLUMNS.get(self.sort_by)
+        if column is None:
+            return " ORDER BY security_id"
+        direction = "DESC" if self.reverse else "ASC"
+        if column == "security_id":
+            return f" ORDER BY security_id {direction}"
+        return f" ORDER BY {column} {direction}, security_id {direction}"
+
+    def _select(self, limit: int | None = None, offset: int = 0) -> List[Security]:
+        where, params = self._where_clause()
+        sql = (
+            f"SELECT security_id, name, security_type, income FROM {self._base_repo.table}"
+            f"{where}{self._order_clause()}"
+        )
+        if limit is not None:
+            sql += " LIMIT %s OFFSET %s"
+            params.extend([limit, offset])
+        rows = self._base_repo.db.fetch_all(sql, params)
+        return [self._base_repo._row_to_security(r) for r in rows]
+
+    def _get_filtered_sorted(self) -> List[Security]:
+        if self._uses_callables():
+            return super()._get_filtered_sorted()
+        return self._select()
+
+    def _set_criteria(
+        self,
+        name_q: str = "",
+        security_type_q: str = "",
+        income_min: str = "",
+        income_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> None:
+        self.name_q = (name_q or "").strip().lower()
+        self.security_type_q = (security_type_q or "").strip().lower()
+        self.income_min = parse_income_bound(income_min)
+        self.income_max = parse_income_bound(income_max)
+        self.sort_by = (sort_by or "").strip().lower()
+        self.reverse = (order or "asc").strip().lower() == "desc"
+        self.filter_func = None
+        self.sort_key = None
+
+    def get_list(
+        self,
+        name_q: str = "",
+        security_type_q: str = "",
+        income_min: str = "",
+        income_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> List[Security]:
+        self._set_criteria(name_q, security_type_q, income_min, income_max, sort_by, order)
+        return self._select(limit, offset)
+
+    def get_page(
+        self,
+        k: int,
+        after: str | None = None,
+        name_q: str = "",
+        security_type_q: str = "",
+        income_min: str = "",
+        income_max: str = "",
+        sort_by: str = "",
+        order: str = "asc",
+    ) -> tuple[List[Security], str | None]:
+        self._set_criteria(name_q, security_type_q, income_min, income_max, sort_by, order)
+        where, params = self._where_clause()
+        sort_expr = SECURITY_SORT_COLUMNS.get(self.sort_by)
+        rows, next_after = fetch_page_after(
+            self._base_repo.db,
+            "security_id, name, security_type, income",
+            self._base_repo.table,
+            "security_id",
+            k,
+            after=after,
+            sort_expr=sort_expr,
+            descending=sort_expr is not None and self.reverse,
+            where=where,
+            params=params,
+            sort_type=SECURITY_SORT_TYPES.get(self.sort_by),
+        )
+        with span("build"):
+            return [self._base_repo._row_to_security(r) for r in rows], next_after
 
+    def get_count(self) -> int:
+        if self._uses_callables():
+            return super().get_count()
 
-class FilteredSortedSecurityFile(FilteredSortedSecurityDB):
-    pass
+        where, params = self._where_clause()
+        row = self._base_repo.db.fetch_one(
+            f"SELECT COUNT(*) AS cnt FROM {self._base_repo.table}{where}", params
+        )
+        return int(row["cnt"]) if row else 0
@@ -0,0 +1,91 @@
+from __future__ import annotations
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Iterable, Mapping
+
+# меняется при выкладке новой версии шаблонов, чтобы старые ETag не давали 304
+ETAG_SALT = os.getenv("APP_VERSION", "")
+
+
+class RepoVersion:
+    __slots__ = ("token", "modified")
+
+    def __init__(self, token: str, modified: float | None = None):
+        self.token = token
+        self.modified = modified
+
+    def __repr__(self) -> str:
+        return f"RepoVersion({self.token!r}, {self.modified!r})"
+
+
+def _mtimes(signature: Any) -> list[float]:
+    # file_signature() -> (mtime_ns, size, ino); у журнала — кортеж из таких сигнатур
+    if signature is None:
+        return []
+    if isinstance(signature[0], int):
+        return [signature[0] / 1e9]
+    return [m for sig in signature for m in _mtimes(sig)]
+
+
+def file_version(signature: Any, write_behind: Any = None) -> RepoVersion:
+    parts = [repr(signature)]
+    mtimes = _mtimes(signature)
+    if write_behind is not None and write_behind.generation:
+        parts.append(str(write_behind.generation))
+        mtimes.append(write_behind.changed_at)
+    return RepoVersion(_digest(parts), max(mtimes, default=None))
+
+
+def table_version(table: str, counter: str, modified: float | None = None) -> RepoVersion:
+    return RepoVersion(_digest([table, counter]), modified)
+
+
+def _digest(parts: Iterable[str]) -> str:
+    h = hashlib.blake2b(digest_size=12)
+    h.update(ETAG_SALT.encode("utf-8"))
+    for part in parts:
+        h.update(b"\0")
+        h.update(part.encode("utf-8"))
+    return h.hexdigest()
+
+
+def etag(version: RepoVersion) -> str:
+    return f'W/"{version.token}"'
+
+
+def cache_headers(version: RepoVersion) -> dict[str, str]:
+    # no-cache: браузер хранит страницу, но каждый раз перепроверяет её условным запросом
+    headers = {"ETag": etag(version), "Cache-Control": "no-cache"}
+    if version.modified is not None:
+        headers["Last-Modified"] = formatdate(version.modified, usegmt=True)
+    return headers
+
+
+def _etag_matches(header: str, tag: str) -> bool:
+    opaque = tag[2:]
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def is_not_modified(request_headers: Mapping[str, str], version: RepoVersion) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag(version))
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is None or version.modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return False
+    # Last-Modified передаётся с точностью до секунды
+    return int(version.modified) <= int(since)
@@ -0,0 +1,343 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Iterator
+
+import investment_views as views
+from Investment import Investment, InvestmentShort
+from filtered_investment import FilteredSortedInvestmentDB, FilteredSortedInvestmentFile
+from pagination import DEFAULT_PAGE_SIZE
+from profiling import span
+from repo_factory import normalize_storage
+
+INVESTMENT_FILTER_FIELDS = (
+    "client_id",
+    "security_id",
+    "date_from",
+    "date_to",
+    "amount_min",
+    "amount_max",
+    "sort_by",
+)
+
+
+def validate_investment_fields(values: dict[str, str]) -> tuple[dict[str, str], dict[str, str]]:
+    errors = {}
+    cleaned = {k: (v or "").strip() for k, v in values.items()}
+
+    for field, label in (("client_id", "ID клиента"), ("security_id", "ID бумаги")):
+        raw = cleaned.get(field, "")
+        if not raw.isdigit() or int(raw) <= 0:
+            errors[field] = f"{label} должен быть положительным целым числом"
+
+    try:
+        if float(cleaned.get("amount", "")) <= 0:
+            errors["amount"] = "Сумма инвестиции должна быть > 0"
+    except ValueError:
+        errors["amount"] = "Сумма инвестиции должна быть числом"
+
+    for field, required in (("start_date", True), ("end_date", False)):
+        raw = cleaned.get(field, "")
+        if raw == "":
+            if required:
+                errors[field] = "Дата обязательна"
+            continue
+        try:
+            datetime.strptime(raw, "%Y-%m-%d")
+        except ValueError:
+            errors[field] = "Дата должна быть в формате YYYY-MM-DD"
+
+    if "start_date" not in errors and "end_date" not in errors and cleaned.get("end_date"):
+        if cleaned["end_date"] < cleaned["start_date"]:
+            errors["end_date"] = "Дата окончания раньше даты начала"
+
+    if cleaned.get("result", ""):
+        try:
+            float(cleaned["result"])
+        except ValueError:
+            errors["result"] = "Результат должен быть числом"
+
+    return errors, cleaned
+
+
+def check_investment_refs(cleaned: dict[str, str], clients, securities) -> dict[str, str]:
+    # файловые хранилища внешних ключей не знают, поэтому клиента и бумагу проверяем до сохранения
+    errors = {}
+    if clients is not None and clients.get_by_id(int(cleaned["client_id"])) is None:
+        errors["client_id"] = "Клиент с таким ID не найден"
+    if securities is not None and securities.get_by_id(int(cleaned["security_id"])) is None:
+        errors["security_id"] = "Ценная бумага с таким ID не найдена"
+    return errors
+
+
+def investment_from_cleaned(investment_id: int, cleaned: dict[str, str]) -> Investment:
+    return Investment(
+        investment_id,
+        client_id=int(cleaned["client_id"]),
+        security_id=int(cleaned["security_id"]),
+        amount=float(cleaned["amount"]),
+        start_date=cleaned["start_date"],
+        end_date=cleaned.get("end_date") or None,
+        result=cleaned.get("result") or None,
+    )
+
+
+def investment_to_json(inv: Investment) -> dict:
+    return {
+        "investment_id": inv.investment_id,
+        "client_id": inv.client_id,
+        "security_id": inv.security_id,
+        "amount": inv.amount,
+        "start_date": inv.start_date.isoformat(),
+        "end_date": inv.end_date.isoformat() if inv.end_date is not None else None,
+        "result": inv.result,
+    }
+
+
+class InvestmentController:
+    def __init__(self, repo):
+        self.repo = repo
+
+    def _get_page(self, storage: str, after: str | None, criteria: dict[str, str]):
+        Decorator = FilteredSortedInvestmentDB if normalize_storage(storage) == "db" else FilteredSortedInvestmentFile
+        decorated = Decorator(self.repo)
+        with span("repo"):
+            try:
+                return decorated.get_page(DEFAULT_PAGE_SIZE, after=after, **criteria)
+            except ValueError:
+                return decorated.get_page(DEFAULT_PAGE_SIZE, **criteria)
+
+    @staticmethod
+    def _criteria(filters: dict[str, str | None], order: str | None) -> dict[str, str]:
+        criteria = {field: (filters.get(field) or "").strip() for field in INVESTMENT_FILTER_FIELDS}
+        criteria["order"] = (order or "asc").strip().lower()
+        return criteria
+
+    def get_index_page(
+        self,
+        client_id: str | None = None,
+        security_id: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        amount_min: str | None = None,
+        amount_max: str | None = None,
+        sort_by: str | None = None,
+        order: str | None = None,
+        storage: str = "db",
+        after: str | None = None,
+    ) -> Iterator[str]:
+        criteria = self._criteria(
+            {
+                "client_id": client_id,
+                "security_id": security_id,
+                "date_from": date_from,
+                "date_to": date_to,
+                "amount_min": amount_min,
+                "amount_max": amount_max,
+                "sort_by": sort_by,
+            },
+            order,
+        )
+        investments, next_after = self._get_page(storage, after, criteria)
+
+        return views.investment_list_chunks(
+            (InvestmentShort(inv) for inv in investments),
+            filters=criteria,
+            storage=storage,
+            next_after=next_after,
+        )
+
+    def get_page_data(
+        self,
+        client_id: str | None = None,
+        security_id: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        amount_min: str | None = None,
+        amount_max: str | None = None,
+        sort_by: str | None = None,
+        order: str | None = None,
+        storage: str = "db",
+        after: str | None = None,
+    ) -> dict:
+        criteria = self._criteria(
+            {
+                "client_id": client_id,
+                "security_id": security_id,
+                "date_from": date_from,
+                "date_to": date_to,
+                "amount_min": amount_min,
+                "amount_max": amount_max,
+                "sort_by": sort_by,
+            },
+            order,
+        )
+        investments, next_after = self._get_page(storage, after, criteria)
+        return {
+            "items": [investment_to_json(inv) for inv in investments],
+            "next_after": next_after,
+        }
+
+    def get_details_page(self, investment_id: int, storage: str = "db") -> str:
+        with span("repo"):
+            inv = self.repo.get_by_id(investment_id)
+        with span("render"):
+            return views.render_investment_details(inv, storage=storage)
+
+    def get_details_data(self, investment_id: int) -> dict | None:
+        inv = self.repo.get_by_id(investment_id)
+        return investment_to_json(inv) if inv is not None else None
+
+
+class AsyncInvestmentController:
+    def __init__(self, repo):
+        self.repo = repo
+
+    async def get_index_page(
+        self,
+        client_id: str | None = None,
+        security_id: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        amount_min: str | None = None,
+        amount_max: str | None = None,
+        sort_by: str | None = None,
+        order: str | None = None,
+        after: str | None = None,
+        list_url: str = "/async/investments",
+    ) -> Iterator[str]:
+        criteria = InvestmentController._criteria(
+            {
+                "client_id": client_id,
+                "security_id": security_id,
+                "date_from": date_from,
+                "date_to": date_to,
+                "amount_min": amount_min,
+                "amount_max": amount_max,
+                "sort_by": sort_by,
+            },
+            order,
+        )
+        with span("repo"):
+            try:
+                investments, next_after = await self.repo.get_page(DEFAULT_PAGE_SIZE, after=after, **criteria)
+            except ValueError:
+                investments, next_after = await self.repo.get_page(DEFAULT_PAGE_SIZE, **criteria)
+
+        return views.investment_list_chunks(
+            (InvestmentShort(inv) for inv in investments),
+            filters=criteria,
+            storage="db",
+            next_after=next_after,
+            list_url=list_url,
+        )
+
+    async def get_details_page(self, investment_id: int) -> str:
+        with span("repo"):
+            inv = await self.repo.get_by_id(investment_id)
+        with span("render"):
+            return views.render_investment_details(inv, storage="db")
+
+
+class AddInvestmentController:
+    def __init__(self, repo, clients=None, securities=None):
+        self.repo = repo
+        self.clients = clients
+        self.securities = securities
+
+    def get_form_page(self, storage="db"):
+        return views.render_investment_form(
+            title="Добавление инвестиции",
+            action_url=f"/investment/new?storage={storage}",
+            submit_text="Сохранить",
+            values={},
+        )
+
+    def handle_submit(self, values: dict[str, str], storage="db"):
+        errors, cleaned = validate_investment_fields(values)
+        if not errors:
+            errors = check_investment_refs(cleaned, self.clients, self.securities)
+        if not errors:
+            inv = investment_from_cleaned(0, cleaned)
+            try:
+                self.repo.add_investment(inv)
+            except ValueError as e:
+                errors = {"_form": str(e)}
+        if errors:
+            return views.render_investment_form(
+                title="Добавление инвестиции",
+                action_url=f"/investment/new?storage={storage}",
+                submit_text="Сохранить",
+                errors=errors,
+                values=values,
+            )
+        return views.render_investment_saved("Инвестиция добавлена", f"#{inv.investment_id} добавлена.")
+
+
+class EditInvestmentController:
+    def __init__(self, repo, clients=None, securities=None):
+        self.repo = repo
+        self.clients = clients
+        self.securities = securities
+
+    def get_form_page(self, investment_id: int, storage: str = "db") -> str:
+        inv = self.repo.get_by_id(investment_id)
+        if inv is None:
+            return views.render_layout("Ошибка", "<h1>Инвестиция не найдена</h1>")
+
+        values = {
+            "client_id": str(inv.client_id),
+            "security_id": str(inv.security_id),
+            "amount": str(inv.amount),
+            "start_date": inv.start_date.isoformat(),
+            "end_date": inv.end_date.isoformat() if inv.end_date is not None else "",
+            "result": "" if inv.result is None else str(inv.result),
+        }
+
+        return views.render_investment_form(
+            title="Редактирование инвестиции",
+            action_url=f"/investment/{investment_id}/edit?storage={storage}",
+            submit_text="Сохранить",
+            values=values,
+            investment_id=investment_id,
+        )
+
+    def handle_submit(self, investment_id: int, values: dict[str, str], storage: str = "db") -> str:
+        errors, cleaned = validate_investment_fields(values)
+        if not errors:
+            errors = check_investment_refs(cleaned, self.clients, self.securities)
+        if not errors:
+            try:
+                self.repo.replace_investment(investment_id, investment_from_cleaned(investment_id, cleaned))
+            except ValueError as e:
+                errors = {"_form": str(e)}
+
+        if errors:
+            return views.render_investment_form(
+                title="Редактирование инвестиции",
+                action_url=f"/investment/{investment_id}/edit?storage={storage}",
+                submit_text="Сохранить",
+                errors=errors,
+                values=values,
+                investment_id=investment_id,
+            )
+
+        return views.render_investment_saved("Изменения сохранены", f"Инвестиция #{investment_id} обновлена.")
+
+
+class DeleteInvestmentController:
+    def __init__(self, repo):
+        self.repo = repo
+
+    def get_confirm_page(self, investment_id: int, storage: str = "db") -> str:
+        inv = self.repo.get_by_id(investment_id)
+        return views.render_investment_delete_confirm(inv, storage=storage)
+
+    def handle_delete(self, investment_id: int, storage: str = "db") -> str:
+        try:
+            self.repo.delete_investment(investment_id)
+        except ValueError as e:
+            return views.render_layout(
+                "Ошибка удаления",
+                f"<h1>Ошибка</h1><p>{views.esc(e)}</p><p><a href='javascript:closeAndRefresh()'>Закрыть</a></p>",
+            )
+        return views.render_investment_delete_success(investment_id)
@@ -0,0 +1,329 @@
+from typing import Iterable, Iterator, Mapping
+from urllib.parse import urlencode
+
+from Investment import Investment, InvestmentShort
+from templates import Template, esc, layout_chunks, render_layout, render_options, row_chunks, select_options
+
+
+def _build_url(base: str, params: dict[str, str]) -> str:
+    qs = urlencode({k: v for k, v in params.items() if v is not None})
+    return f"{base}?{qs}" if qs else base
+
+
+SORT_OPTIONS = select_options(
+    [
+        ("", "Без сортировки"),
+        ("id", "ID"),
+        ("client_id", "Клиент"),
+        ("security_id", "Бумага"),
+        ("amount", "Сумма"),
+        ("start_date", "Дата начала"),
+    ]
+)
+ORDER_OPTIONS = select_options([("asc", "↑"), ("desc", "↓")])
+
+INVESTMENT_LIST_HEAD = Template(
+    """
+        <h1>Инвестиции</h1>
+
+        <p>
+            <a href="#" onclick="window.open('{new_url}','_blank'); return false;">Добавить инвестицию</a>
+        </p>
+
+        <p>
+            <a href="{clients_url}">Клиенты</a> |
+            <a href="{securities_url}">Ценные бумаги</a>
+        </p>
+
+        <form method="get" action="{list_url}" style="margin-bottom:12px;">
+            <input type="hidden" name="storage" value="{storage}">
+
+            <label>Клиент ID:
+                <input name="client_id" value="{client_id}" style="width:60px;">
+            </label>
+
+            <label style="margin-left:10px;">Бумага ID:
+                <input name="security_id" value="{security_id}" style="width:60px;">
+            </label>
+
+            <label style="margin-left:10px;">Начало с:
+                <input type="date" name="date_from" value="{date_from}">
+            </label>
+
+            <label style="margin-left:10px;">по:
+                <input type="date" name="date_to" value="{date_to}">
+            </label>
+
+            <label style="margin-left:10px;">Сумма от:
+                <input name="amount_min" value="{amount_min}" style="width:80px;">
+            </label>
+
+            <label style="margin-left:10px;">до:
+                <input name="amount_max" value="{amount_max}" style="width:80px;">
+            </label>
+
+            <label style="margin-left:10px;">Сортировать по:
+                <select name="sort_by">{sort_options!s}</select>
+            </label>
+
+            <label style="margin-left:10px;">Порядок:
+                <select name="order">{order_options!s}</select>
+            </label>
+
+            <button type="submit" style="margin-left:10px;">Применить</button>
+            <a href="{reset_url}" style="margin-left:10px;">Сброс</a>
+        </form>
+
+        <table>
+            <thead>
+                <tr>
+                    <th>ID</th>
+                    <th>Клиент</th>
+                    <th>Бумага</th>
+                    <th>Сумма</th>
+                    <th>Начало</th>
+                    <th>Окончание</th>
+                    <th>Результат</th>
+                    <th></th>
+                </tr>
+            </thead>
+            <tbody>
+"""
+)
+
+INVESTMENT_ROW = Template(
+    "<tr>"
+    "<td>{investment_id}</td>"
+    "<td>{client_id}</td>"
+    "<td>{security_id}</td>"
+    "<td>{amount}</td>"
+    "<td>{start_date}</td>"
+    "<td>{end_date}</td>"
+    "<td>{result}</td>"
+    "<td>"
+    "<a href='#' onclick=\"window.open('{details_url}','_blank'); return false;\">Подробнее</a> | "
+    "<a href='#' onclick=\"window.open('{edit_url}','_blank'); return false;\">Редактировать</a> | "
+    "<a href='#' onclick=\"window.open('{delete_url}','_blank'); return false;\" style='color:#c00'>Удалить</a>"
+    "</td>"
+    "</tr>\n"
+)
+
+EMPTY_ROW = '<tr><td colspan="8">Пусто</td></tr>'
+
+LIST_TAIL = Template(
+    """
+            </tbody>
+        </table>
+
+        {pager!s}
+"""
+)
+
+PAGER = Template('<p><a href="{next_url}">Следующая страница →</a></p>')
+
+
+def investment_list_chunks(
+    investments: Iterable[InvestmentShort],
+    filters: Mapping[str, str] | None = None,
+    storage: str = "db",
+    next_after: str | None = None,
+    list_url: str = "/investments",
+) -> Iterator[str]:
+    filters = filters or {}
+    storage_qs = urlencode({"storage": storage})
+
+    head = INVESTMENT_LIST_HEAD.render(
+        new_url=f"/investment/new?{storage_qs}",
+        clients_url=f"/?{storage_qs}",
+        securities_url=f"/securities?{storage_qs}",
+        list_url=list_url,
+        storage=storage,
+        client_id=filters.get("client_id", ""),
+        security_id=filters.get("security_id", ""),
+        date_from=filters.get("date_from", ""),
+        date_to=filters.get("date_to", ""),
+        amount_min=filters.get("amount_min", ""),
+        amount_max=filters.get("amount_max", ""),
+        sort_options=render_options(SORT_OPTIONS, filters.get("sort_by", "")),
+        order_options=render_options(ORDER_OPTIONS, filters.get("order", "asc")),
+        reset_url=f"{list_url}?{storage_qs}",
+    )
+
+    rows = (
+        {
+            "investment_id": inv.investment_id,
+            "client_id": inv.client_id,
+            "security_id": inv.security_id,
+            "amount": inv.amount,
+            "start_date": inv.start_date,
+            "end_date": inv.end_date,
+            "result": inv.result,
+            "details_url": f"/investment/{inv.investment_id}?{storage_qs}",
+            "edit_url": f"/investment/{inv.investment_id}/edit?{storage_qs}",
+            "delete_url": f"/investment/{inv.investment_id}/delete?{storage_qs}",
+        }
+        for inv in investments
+    )
+
+    pager = ""
+    if next_after:
+        pager = PAGER.render(next_url=_build_url(list_url, {"storage": storage, **filters, "after": next_after}))
+
+    def body() -> Iterator[str]:
+        yield head
+        empty = True
+        for chunk in row_chunks(INVESTMENT_ROW, rows):
+            empty = False
+            yield chunk
+        if empty:
+            yield EMPTY_ROW
+        yield LIST_TAIL.render(pager=pager)
+
+    return layout_chunks("Инвестиции", body())
+
+
+def render_investment_list(
+    investments: Iterable[InvestmentShort],
+    filters: Mapping[str, str] | None = None,
+    storage: str = "db",
+    next_after: str | None = None,
+    list_url: str = "/investments",
+) -> str:
+    return "".join(investment_list_chunks(investments, filters, storage, next_after, list_url))
+
+
+def render_investment_details(inv: Investment | None, storage: str = "db") -> str:
+    if inv is None:
+        return render_layout("Ошибка", "<h1>Инвестиция не найдена</h1>")
+
+    client_url = _build_url(f"/client/{inv.client_id}", {"storage": storage})
+    security_url = _build_url(f"/security/{inv.security_id}", {"storage": storage})
+    body = f"""
+    <h1>Инвестиция #{inv.investment_id}</h1>
+    <ul>
+      <li><b>Клиент:</b> <a href="{esc(client_url)}">#{inv.client_id}</a></li>
+      <li><b>Бумага:</b> <a href="{esc(security_url)}">#{inv.security_id}</a></li>
+      <li><b>Сумма:</b> {inv.amount}</li>
+      <li><b>Дата начала:</b> {inv.start_date}</li>
+      <li><b>Дата окончания:</b> {esc(inv.end_date)}</li>
+      <li><b>Результат:</b> {esc(inv.result)}</li>
+    </ul>
+
+    <button onclick="window.close()">Закрыть</button>
+    """
+    return render_layout(f"Investment {inv.investment_id}", body)
+
+
+def render_investment_form(
+    title: str,
+    action_url: str,
+    submit_text: str,
+    errors: dict[str, str] | None = None,
+    values: dict[str, str] | None = None,
+    investment_id: int | None = None,
+) -> str:
+    errors = errors or {}
+    values = values or {}
+
+    def val(k: str) -> str:
+        return esc(values.get(k, ""))
+
+    def err(k: str) -> str:
+        msg = errors.get(k)
+        return f"<div style='color:red;font-size:0.9em'>{esc(msg)}</div>" if msg else ""
+
+    form_error = errors.get("_form")
+    form_error_html = f"<div style='color:red;margin-bottom:10px'>{esc(form_error)}</div>" if form_error else ""
+
+    header = f"<h1>{esc(title)}</h1>" if investment_id is None else f"<h1>{esc(title)} #{investment_id}</h1>"
+
+    body = f"""
+    {header}
+    {form_error_html}
+
+    <form method="post" action="{esc(action_url)}">
+      <label>ID клиента:<br>
+        <input type="text" name="client_id" value="{val('client_id')}"/>
+        {err('client_id')}
+      </label><br><br>
+
+      <label>ID бумаги:<br>
+        <input type="text" name="security_id" value="{val('security_id')}"/>
+        {err('security_id')}
+      </label><br><br>
+
+      <label>Сумма:<br>
+        <input type="text" name="amount" value="{val('amount')}"/>
+        {err('amount')}
+      </label><br><br>
+
+      <label>Дата начала:<br>
+        <input type="date" name="start_date" value="{val('start_date')}"/>
+        {err('start_date')}
+      </label><br><br>
+
+      <label>Дата окончания:<br>
+        <input type="date" name="end_date" value="{val('end_date')}"/>
+        {err('end_date')}
+      </label><br><br>
+
+      <label>Результат:<br>
+        <input type="text" name="result" value="{val('result')}"/>
+        {err('result')}
+      </label><br><br>
+
+      <button type="submit">{esc(submit_text)}</button>
+    </form>
+
+    <p><a href="javascript:closeAndRefresh()">Закрыть окно</a></p>
+    """
+    return render_layout(title, body)
+
+
+def render_investment_delete_confirm(inv: Investment | None, storage: str = "db") -> str:
+    if inv is None:
+        return render_layout(
+            "Ошибка", "<h1>Инвестиция не найдена</h1><p><a href='javascript:closeAndRefresh()'>Закрыть</a></p>"
+        )
+
+    body = f"""
+    <h1>Удаление инвестиции #{inv.investment_id}</h1>
+    <p>Вы точно хотите удалить:</p>
+    <ul>
+      <li><b>Клиент:</b> #{inv.client_id}</li>
+      <li><b>Бумага:</b> #{inv.security_id}</li>
+      <li><b>Сумма:</b> {inv.amount}</li>
+      <li><b>Дата начала:</b> {inv.start_date}</li>
+    </ul>
+
+    <form method="post" action="/investment/{inv.investment_id}/delete?storage={esc(storage)}">
+      <button type="submit" style="background:#c00;color:#fff;padding:6px 12px;border:0;cursor:pointer;">Удалить</button>
+      <a href="javascript:window.close()" style="margin-left:12px">Отмена</a>
+    </form>
+    """
+    return render_layout("Удаление инвестиции", body)
+
+
+def render_investment_saved(title: str, message: str) -> str:
+    body = f"""
+    <h1>{esc(title)}</h1>
+    <p>{message}</p>
+
+    <script>
+    if (window.opener && !window.opener.closed) {{
+        try {{ window.opener.location.reload(); }} catch(e) {{}}
+    }}
+    </script>
+
+    <p><a href="javascript:closeAndRefresh()">Закрыть окно</a></p>
+    """
+    return render_layout(title, body)
+
+
+def render_investment_delete_success(investment_id: int) -> str:
+    body = f"""
+    <h1>Инвестиция удалена</h1>
+    <p>Инвестиция #{investment_id} удалена.</p>
+    <p><a href="javascript:closeAndRefresh()">Закрыть окно</a></p>
+    """
+    return render_layout("Удалено", body)
@@ -1,24 +1,145 @@
-from fastapi import FastAPI, Form, Query
-from fastapi.responses import HTMLResponse
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Iterator
+
+from fastapi import Depends, FastAPI, Form, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from controllers import (
+    AsyncClientController,
     ClientController,
     AddClientController,
     EditClientController,
     DeleteClientController,
 )
-from repo_factory import create_repo
-from repo_factory import create_security_repo
+from investment_controllers import (
+    AsyncInvestmentController,
+    InvestmentController,
+    AddInvestmentController,
+    EditInvestmentController,
+    DeleteInvestmentController,
+)
+from db_metrics import METRICS, PROMETHEUS_MEDIA_TYPE, current_request_stats
+from http_cache import RepoVersion, cache_headers, is_not_modified
+from profiling import (
+    PROFILE_ENABLED, PROFILE_HEADER, PROFILE_PARAM, PROFILE_TOKEN_HEADER, profile_request, profiler_mode,
+    profiling_active, run_profiled, span,
+)
+from repo_factory import RepoRegistry
 from security_controllers import (
-    SecurityController, AddSecurityController, EditSecurityController, DeleteSecurityController
+    SecurityController, AddSecurityController, EditSecurityController, DeleteSecurityController,
+    AsyncSecurityController,
 )
-app = FastAPI()
+
+HTML_MEDIA_TYPE = "text/html; charset=utf-8"
+
+log = logging.getLogger(__name__)
+
+
+def _materialize(page: str | Iterator[str]) -> str:
+    return page if isinstance(page, str) else "".join(page)
+
+
+def cached_page(request: Request, version: RepoVersion, render: Callable[[], str | Iterator[str]]) -> Response:
+    headers = cache_headers(version)
+    if is_not_modified(request.headers, version):
+        return Response(status_code=304, headers=headers)
+    if profiling_active():
+        # в профиль должен попасть и ленивый рендер списка, поэтому страница собирается целиком
+        page = run_profiled(lambda: _materialize(render()))
+    else:
+        page = render()
+    if isinstance(page, str):
+        return HTMLResponse(page, headers=headers)
+    return StreamingResponse(page, media_type=HTML_MEDIA_TYPE, headers=headers)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.repos = RepoRegistry()
+    try:
+        yield
+    finally:
+        await app.state.repos.aclose()
+        app.state.repos.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-def make_controllers(storage: str):
-    repo = create_repo(storage)
+async def profile_requests(request: Request, call_next):
+    mode = profiler_mode(
+        request.query_params.get(PROFILE_PARAM) or request.headers.get(PROFILE_HEADER),
+        request.headers.get(PROFILE_TOKEN_HEADER),
+    )
+    started = time.perf_counter()
+    with profile_request(request.url.path, mode) as profile:
+        response = await call_next(request)
+        if mode is not None:
+            # ради полного Server-Timing тело собирается целиком — только для запрошенного профиля
+            with span("render"):
+                body = [chunk async for chunk in response.body_iterator]
+            response.body_iterator = _replay(body)
+    total = time.perf_counter() - started
+
+    extra = {"total": (total, request.url.path)}
+    stats = current_request_stats()
+    if stats is not None:
+        extra["db"] = (stats.seconds, f"{stats.queries} queries")
+    response.headers["Server-Timing"] = profile.server_timing(extra)
+    if profile.dump_path is not None:
+        # только имя файла: путь на сервере наружу не отдаём
+        response.headers["X-Profile-File"] = os.path.basename(profile.dump_path)
+    if mode is None:
+        # заголовки уже уйдут без рендера: стрим не буферизуем, время рендера пишем в лог по окончании
+        response.body_iterator = _timed_render(response.body_iterator, profile, request.url.path)
+    return response
+
+
+async def _replay(chunks: list[bytes]):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _timed_render(chunks, profile, path: str):
+    # меряется только выработка чанков, не ожидание медленного клиента между ними
+    iterator = chunks.__aiter__()
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+        finally:
+            profile.add("render", time.perf_counter() - started)
+        yield chunk
+    log.info("%s: render %.2f ms", path, profile.spans.get("render", 0.0) * 1000)
+
+
+# зарегистрирован раньше count_db_queries, значит выполняется внутри него и видит счётчик запросов к БД
+if PROFILE_ENABLED:
+    app.middleware("http")(profile_requests)
+
+
+@app.middleware("http")
+async def count_db_queries(request: Request, call_next):
+    with METRICS.track_request() as stats:
+        response = await call_next(request)
+    response.headers["X-DB-Queries"] = str(stats.queries)
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(METRICS.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+def make_controllers(request: Request, storage: str = Query(default="db")):
+    repo = request.app.state.repos.clients(storage)
     return (
         ClientController(repo),
         AddClientController(repo),
@@ -27,8 +148,8 @@ def make_controllers(storage: str):
     )
 
 
-def make_security_controllers(storage: str):
-    repo = create_security_repo(storage)
+def make_security_controllers(request: Request, storage: str = Query(default="db")):
+    repo = request.app.state.repos.securities(storage)
     return (
         SecurityController(repo),
         AddSecurityController(repo),
@@ -37,41 +158,62 @@ def make_security_controllers(storage: str):
     )
 
 
+def make_investment_controllers(request: Request, storage: str = Query(default="db")):
+    repos = request.app.state.repos
+    repo = repos.investments(storage)
+    clients, securities = repos.clients(storage), repos.securities(storage)
+    return (
+        InvestmentController(repo),
+        AddInvestmentController(repo, clients, securities),
+        EditInvestmentController(repo, clients, securities),
+        DeleteInvestmentController(repo),
+    )
+
+
 @app.get("/", response_class=HTMLResponse)
 def index(
+    request: Request,
     storage: str = Query(default="db"),
+    controllers=Depends(make_controllers),
     type_of_property: str | None = None,
     name_q: str | None = None,
     phone_q: str | None = None,
     sort_by: str | None = None,
     order: str | None = None,
+    after: str | None = None,
 ):
-    list_controller, _, _, _ = make_controllers(storage)
-    return list_controller.get_index_page(
-        type_of_property=type_of_property,
-        name_q=name_q,
-        phone_q=phone_q,
-        sort_by=sort_by,
-        order=order,
-        storage=storage,
+    list_controller, _, _, _ = controllers
+    return cached_page(
+        request,
+        list_controller.repo.version_token(),
+        lambda: list_controller.get_index_page(
+            type_of_property=type_of_property,
+            name_q=name_q,
+            phone_q=phone_q,
+            sort_by=sort_by,
+            order=order,
+            storage=storage,
+            after=after,
+        ),
     )
 
 
 @app.get("/client/new", response_class=HTMLResponse)
-def new_client_form(storage: str = Query(default="db")):
-    _, add_controller, _, _ = make_controllers(storage)
+def new_client_form(storage: str = Query(default="db"), controllers=Depends(make_controllers)):
+    _, add_controller, _, _ = controllers
     return add_controller.get_form_page(storage=storage)
 
 
 @app.post("/client/new", response_class=HTMLResponse)
 def new_client_submit(
     storage: str = Query(default="db"),
+    controllers=Depends(make_controllers),
     name: str = Form(...),
     type_of_property: str = Form(...),
     address: str = Form(...),
     phone: str = Form(...),
 ):
-    _, add_controller, _, _ = make_controllers(storage)
+    _, add_controller, _, _ = controllers
     return add_controller.handle_submit(
         name=name,
         type_of_property=type_of_property,
@@ -82,8 +224,8 @@ def new_client_submit(
 
 
 @app.get("/client/{client_id}/edit", response_class=HTMLResponse)
-def edit_client_form(client_id: int, storage: str = Query(default="db")):
-    _, _, edit_controller, _ = make_controllers(storage)
+def edit_client_form(client_id: int, storage: str = Query(default="db"), controllers=Depends(make_controllers)):
+    _, _, edit_controller, _ = controllers
     return edit_controller.get_form_page(client_id, storage=storage)
 
 
@@ -91,12 +233,13 @@ def edit_client_form(client_id: int, storage: str = Query(default="db")):
 def edit_client_submit(
     client_id: int,
     storage: str = Query(default="db"),
+    controllers=Depends(make_controllers),
     name: str = Form(...),
     type_of_property: str = Form(...),
     address: str = Form(...),
     phone: str = Form(...),
 ):
-    _, _, edit_controller, _ = make_controllers(storage)
+    _, _, edit_controller, _ = controllers
     return edit_controller.handle_submit(
         client_id=client_id,
         name=name,
@@ -108,65 +251,79 @@ def edit_client_submit(
 
 
 @app.get("/client/{client_id}/delete", response_class=HTMLResponse)
-def delete_confirm(client_id: int, storage: str = Query(default="db")):
-    _, _, _, delete_controller = make_controllers(storage)
+def delete_confirm(client_id: int, storage: str = Query(default="db"), controllers=Depends(make_controllers)):
+    _, _, _, delete_controller = controllers
     return delete_controller.get_confirm_page(client_id, storage=storage)
 
 
 @app.post("/client/{client_id}/delete", response_class=HTMLResponse)
-def delete_submit(client_id: int, storage: str = Query(default="db")):
-    _, _, _, delete_controller = make_controllers(storage)
+def delete_submit(client_id: int, storage: str = Query(default="db"), controllers=Depends(make_controllers)):
+    _, _, _, delete_controller = controllers
     return delete_controller.handle_delete(client_id, storage=storage)
 
 
 @app.get("/client/{client_id}", response_class=HTMLResponse)
-def client_details(client_id: int, storage: str = Query(default="db")):
-    list_controller, _, _, _ = make_controllers(storage)
-    return list_controller.get_client_details_page(client_id, storage=storage)
+def client_details(
+    request: Request, client_id: int, storage: str = Query(default="db"), controllers=Depends(make_controllers)
+):
+    list_controller, _, _, _ = controllers
+    return cached_page(
+        request,
+        list_controller.repo.version_token(),
+        lambda: list_controller.get_client_details_page(client_id, storage=storage),
+    )
 
 @app.get("/securities", response_class=HTMLResponse)
 def securities_index(
+    request: Request,
     storage: str = Query(default="db"),
+    controllers=Depends(make_security_controllers),
     name_q: str | None = None,
     security_type_q: str | None = None,
     income_min: str | None = None,
     income_max: str | None = None,
     sort_by: str | None = None,
     order: str | None = None,
+    after: str | None = None,
 ):
-    repo = create_security_repo(storage)
-    controller = SecurityController(repo)
-    return controller.get_index_page(
-        name_q=name_q,
-        security_type_q=security_type_q,
-        income_min=income_min,
-        income_max=income_max,
-        sort_by=sort_by,
-        order=order,
-        storage=storage,
+    controller, _, _, _ = controllers
+    return cached_page(
+        request,
+        controller.repo.version_token(),
+        lambda: controller.get_index_page(
+            name_q=name_q,
+            security_type_q=security_type_q,
+            income_min=income_min,
+            income_max=income_max,
+            sort_by=sort_by,
+            order=order,
+            storage=storage,
+            after=after,
+        ),
     )
 
 
 @app.get("/security/new", response_class=HTMLResponse)
-def security_new_form(storage: str = Query(default="db")):
-    _, add_c, _, _ = make_security_controllers(storage)
+def security_new_form(storage: str = Query(default="db"), controllers=Depends(make_security_controllers)):
+    _, add_c, _, _ = controllers
     return add_c.get_form_page(storage=storage)
 
 
 @app.post("/security/new", response_class=HTMLResponse)
 def security_new_submit(
     storage: str = Query(default="db"),
+    controllers=Depends(make_security_controllers),
     name: str = Form(...),
     security_type: str = Form(...),
     income: str = Form(...),
 ):
-    _, add_c, _, _ = make_security_controllers(storage)
+    _, add_c, _, _ = controllers
     return add_c.handle_submit(name=name, security_type=security_type, income=income, storage=storage)
 
 
 @app.get("/security/{security_id}/edit", response_class=HTMLResponse)
-def security_edit_form(security_id: int, storage: str = Query(default="db")):
-    _, _, edit_c, _ = make_security_controllers(storage)
+def security_edit_form(security_id: int, storage: str = Query(default="db"), controllers=Depends(make_security_controllers)):
+    _, _, edit_c, _ = controllers
     return edit_c.get_form_page(security_id, storage=storage)
 
 
@@ -174,27 +331,284 @@ def security_edit_form(security_id: int, storage: str = Query(default="db")):
 def security_edit_submit(
     security_id: int,
     storage: str = Query(default="db"),
+    controllers=Depends(make_security_controllers),
     name: str = Form(...),
     security_type: str = Form(...),
     income: str = Form(...),
 ):
-    _, _, edit_c, _ = make_security_controllers(storage)
+    _, _, edit_c, _ = controllers
     return edit_c.handle_submit(security_id, name, security_type, income, storage=storage)
 
 
 @app.get("/security/{security_id}/delete", response_class=HTMLResponse)
-def security_delete_confirm(security_id: int, storage: str = Query(default="db")):
-    _, _, _, del_c = make_security_controllers(storage)
+def security_delete_confirm(security_id: int, storage: str = Query(default="db"), controllers=Depends(make_security_controllers)):
+    _, _, _, del_c = controllers
     return del_c.get_confirm_page(security_id, storage=storage)
 
 
 @app.post("/security/{security_id}/delete", response_class=HTMLResponse)
-def security_delete_submit(security_id: int, storage: str = Query(default="db")):
-    _, _, _, del_c = make_security_controllers(storage)
+def security_delete_submit(security_id: int, storage: str = Query(default="db"), controllers=Depends(make_security_controllers)):
+    _, _, _, del_c = controllers
     return del_c.handle_delete(security_id, storage=storage)
 
 
 @app.get("/security/{security_id}", response_class=HTMLResponse)
-def security_details(security_id: int, storage: str = Query(default="db")):
-    list_c, _, _, _ = make_security_controllers(storage)
-    return list_c.get_details_page(security_id, storage=storage)
+def security_details(
+    request: Request, security_id: int, storage: str = Query(default="db"), controllers=Depends(make_security_controllers)
+):
+    list_c, _, _, _ = controllers
+    return cached_page(
+        request,
+        list_c.repo.version_token(),
+        lambda: list_c.get_details_page(security_id, storage=storage),
+    )
+
+
+@app.get("/investments", response_class=HTMLResponse)
+def investments_index(
+    request: Request,
+    storage: str = Query(default="db"),
+    controllers=Depends(make_investment_controllers),
+    client_id: str | None = None,
+    security_id: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    amount_min: str | None = None,
+    amount_max: str | None = None,
+    sort_by: str | None = None,
+    order: str | None = None,
+    after: str | None = None,
+):
+    controller, _, _, _ = controllers
+    return cached_page(
+        request,
+        controller.repo.version_token(),
+        lambda: controller.get_index_page(
+            client_id=client_id,
+            security_id=security_id,
+            date_from=date_from,
+            date_to=date_to,
+            amount_min=amount_min,
+            amount_max=amount_max,
+            sort_by=sort_by,
+            order=order,
+            storage=storage,
+            after=after,
+        ),
+    )
+
+
+@app.get("/investment/new", response_class=HTMLResponse)
+def investment_new_form(storage: str = Query(default="db"), controllers=Depends(make_investment_controllers)):
+    _, add_c, _, _ = controllers
+    return add_c.get_form_page(storage=storage)
+
+
+@app.post("/investment/new", response_class=HTMLResponse)
+def investment_new_submit(
+    storage: str = Query(default="db"),
+    controllers=Depends(make_investment_controllers),
+    client_id: str = Form(...),
+    security_id: str = Form(...),
+    amount: str = Form(...),
+    start_date: str = Form(...),
+    end_date: str = Form(""),
+    result: str = Form(""),
+):
+    _, add_c, _, _ = controllers
+    values = {
+        "client_id": client_id,
+        "security_id": security_id,
+        "amount": amount,
+        "start_date": start_date,
+        "end_date": end_date,
+        "result": result,
+    }
+    return add_c.handle_submit(values, storage=storage)
+
+
+@app.get("/investment/{investment_id}/edit", response_class=HTMLResponse)
+def investment_edit_form(investment_id: int, storage: str = Query(default="db"), controllers=Depends(make_investment_controllers)):
+    _, _, edit_c, _ = controllers
+    return edit_c.get_form_page(investment_id, storage=storage)
+
+
+@app.post("/investment/{investment_id}/edit", response_class=HTMLResponse)
+def investment_edit_submit(
+    investment_id: int,
+    storage: str = Query(default="db"),
+    controllers=Depends(make_investment_controllers),
+    client_id: str = Form(...),
+    security_id: str = Form(...),
+    amount: str = Form(...),
+    start_date: str = Form(...),
+    end_date: str = Form(""),
+    result: str = Form(""),
+):
+    _, _, edit_c, _ = controllers
+    values = {
+        "client_id": client_id,
+        "security_id": security_id,
+        "amount": amount,
+        "start_date": start_date,
+        "end_date": end_date,
+        "result": result,
+    }
+    return edit_c.handle_submit(investment_id, values, storage=storage)
+
+
+@app.get("/investment/{investment_id}/delete", response_class=HTMLResponse)
+def investment_delete_confirm(investment_id: int, storage: str = Query(default="db"), controllers=Depends(make_investment_controllers)):
+    _, _, _, del_c = controllers
+    return del_c.get_confirm_page(investment_id, storage=storage)
+
+
+@app.post("/investment/{investment_id}/delete", response_class=HTMLResponse)
+def investment_delete_submit(investment_id: int, storage: str = Query(default="db"), controllers=Depends(make_investment_controllers)):
+    _, _, _, del_c = controllers
+    return del_c.handle_delete(investment_id, storage=storage)
+
+
+@app.get("/investment/{investment_id}", response_class=HTMLResponse)
+def investment_details(
+    request: Request,
+    investment_id: int,
+    storage: str = Query(default="db"),
+    controllers=Depends(make_investment_controllers),
+):
+    list_c, _, _, _ = controllers
+    return cached_page(
+        request,
+        list_c.repo.version_token(),
+        lambda: list_c.get_details_page(investment_id, storage=storage),
+    )
+
+
+@app.get("/api/investments")
+def api_investments(
+    storage: str = Query(default="db"),
+    controllers=Depends(make_investment_controllers),
+    client_id: str | None = None,
+    security_id: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    amount_min: str | None = None,
+    amount_max: str | None = None,
+    sort_by: str | None = None,
+    order: str | None = None,
+    after: str | None = None,
+):
+    controller, _, _, _ = controllers
+    return controller.get_page_data(
+        client_id=client_id,
+        security_id=security_id,
+        date_from=date_from,
+        date_to=date_to,
+        amount_min=amount_min,
+        amount_max=amount_max,
+        sort_by=sort_by,
+        order=order,
+        storage=storage,
+        after=after,
+    )
+
+
+@app.get("/api/investment/{investment_id}")
+def api_investment(investment_id: int, controllers=Depends(make_investment_controllers)):
+    controller, _, _, _ = controllers
+    data = controller.get_details_data(investment_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Инвестиция не найдена")
+    return data
+
+
+@app.get("/async/", response_class=HTMLResponse)
+async def async_index(
+    request: Request,
+    type_of_property: str | None = None,
+    name_q: str | None = None,
+    phone_q: str | None = None,
+    sort_by: str | None = None,
+    order: str | None = None,
+    after: str | None = None,
+):
+    controller = AsyncClientController(request.app.state.repos.async_clients())
+    chunks = await controller.get_index_page(
+        type_of_property=type_of_property,
+        name_q=name_q,
+        phone_q=phone_q,
+        sort_by=sort_by,
+        order=order,
+        after=after,
+    )
+    return StreamingResponse(chunks, media_type=HTML_MEDIA_TYPE)
+
+
+@app.get("/async/client/{client_id}", response_class=HTMLResponse)
+async def async_client_details(request: Request, client_id: int):
+    controller = AsyncClientController(request.app.state.repos.async_clients())
+    return await controller.get_client_details_page(client_id)
+
+
+@app.get("/async/securities", response_class=HTMLResponse)
+async def async_securities_index(
+    request: Request,
+    name_q: str | None = None,
+    security_type_q: str | None = None,
+    income_min: str | None = None,
+    income_max: str | None = None,
+    sort_by: str | None = None,
+    order: str | None = None,
+    after: str | None = None,
+):
+    controller = AsyncSecurityController(request.app.state.repos.async_securities())
+    chunks = await controller.get_index_page(
+        name_q=name_q,
+        security_type_q=security_type_q,
+        income_min=income_min,
+        income_max=income_max,
+        sort_by=sort_by,
+        order=order,
+        after=after,
+    )
+    return StreamingResponse(chunks, media_type=HTML_MEDIA_TYPE)
+
+
+@app.get("/async/security/{security_id}", response_class=HTMLResponse)
+async def async_security_details(request: Request, security_id: int):
+    controller = AsyncSecurityController(request.app.state.repos.async_securities())
+    return await controller.get_details_page(security_id)
+
+
+@app.get("/async/investments", response_class=HTMLResponse)
+async def async_investments_index(
+    request: Request,
+    client_id: str | None = None,
+    security_id: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    amount_min: str | None = None,
+    amount_max: str | None = None,
+    sort_by: str | None = None,
+    order: str | None = None,
+    after: str | None = None,
+):
+    controller = AsyncInvestmentController(request.app.state.repos.async_investments())
+    chunks = await controller.get_index_page(
+        client_id=client_id,
+        security_id=security_id,
+        date_from=date_from,
+        date_to=date_to,
+        amount_min=amount_min,
+        amount_max=amount_max,
+        sort_by=sort_by,
+        order=order,
+        after=after,
+    )
+    return StreamingResponse(chunks, media_type=HTML_MEDIA_TYPE)
+
+
+@app.get("/async/investment/{investment_id}", response_class=HTMLResponse)
+async def async_investment_details(request: Request, investment_id: int):
+    controller = AsyncInvestmentController(request.app.state.repos.async_investments())
+    return await controller.get_details_page(investment_id)
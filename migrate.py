@@ -0,0 +1,55 @@
+"""Подготовка схемы БД: индексы и служебные объекты, которые приложение не создаёт при старте.
+
+    python migrate.py
+
+Запускается отдельно, под ролью с правом CREATE, до первого старта приложения и после обновлений.
+"""
+from __future__ import annotations
+import argparse
+import sys
+
+import psycopg2
+
+from Client import CLIENT_SORT_COLUMNS
+from InvestmentRepoDB import INVESTMENT_SORT_COLUMNS
+from repo_factory import create_client_repo, create_investment_repo, create_security_repo
+from SecurityRepoDB import SECURITY_SORT_COLUMNS
+
+
+def run_migrations() -> list[str]:
+    done = []
+    clients = create_client_repo("db")
+    clients.ensure_unique_index()
+    done.append("уникальный индекс клиентов")
+
+    securities = create_security_repo("db")
+    investments = create_investment_repo("db")
+    for repo, id_column, sort_columns in (
+        (clients, "client_id", CLIENT_SORT_COLUMNS),
+        (securities, "security_id", SECURITY_SORT_COLUMNS),
+        (investments, "investment_id", INVESTMENT_SORT_COLUMNS),
+    ):
+        repo.db.ensure_table_version(repo.table)
+        done.append(f"счётчик изменений {repo.table}")
+        for index in repo.db.ensure_sort_indexes(repo.table, id_column, sort_columns.values()):
+            done.append(f"индекс сортировки {index}")
+    return done
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args(argv)
+
+    try:
+        done = run_migrations()
+    except (psycopg2.Error, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+    for step in done:
+        print(f"готово: {step}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
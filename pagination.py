@@ -0,0 +1,151 @@
+from __future__ import annotations
+import base64
+import heapq
+import json
+from datetime import date
+from itertools import chain
+from typing import Any, Callable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    raw = json.dumps([sort_value, row_id], ensure_ascii=False, default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def coerce_sort_value(value: Any, sort_type: type) -> Any:
+    # курсор приходит из URL: значение сортировки должно совпасть по типу с ключом, иначе сравнение упадёт
+    if isinstance(value, bool):
+        raise ValueError("Некорректный курсор страницы")
+    try:
+        if sort_type in (int, float):
+            # int и float в одном поле сравнимы между собой; Decimal из numeric кодируется строкой
+            if isinstance(value, (int, float)):
+                return value
+            if isinstance(value, str) and sort_type is float:
+                return float(value)
+        elif sort_type is date:
+            if isinstance(value, str):
+                return date.fromisoformat(value)
+        elif isinstance(value, sort_type):
+            return value
+    except ValueError as e:
+        raise ValueError("Некорректный курсор страницы") from e
+    raise ValueError("Некорректный курсор страницы")
+
+
+def decode_cursor(token: str | None, sort_type: type | None = None) -> tuple[Any, int] | None:
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError("Некорректный курсор страницы") from e
+    if not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("Некорректный курсор страницы")
+    if sort_type is not None:
+        sort_value = coerce_sort_value(sort_value, sort_type)
+    return sort_value, row_id
+
+
+def keyset_condition(
+    sort_expr: str, id_column: str, descending: bool, cursor: tuple[Any, int]
+) -> tuple[str, list]:
+    sort_value, row_id = cursor
+    op = "<" if descending else ">"
+    if sort_expr == id_column:
+        return f"{id_column} {op} %s", [row_id]
+    # сравнение строк целиком совпадает с ORDER BY и идёт по индексу (sort_expr, id_column)
+    return f"({sort_expr}, {id_column}) {op} (%s, %s)", [sort_value, row_id]
+
+
+def keyset_query(
+    columns: str,
+    table: str,
+    id_column: str,
+    k: int,
+    after: str | None = None,
+    sort_expr: str | None = None,
+    descending: bool = False,
+    where: str = "",
+    params: Iterable = (),
+    sort_type: type | None = None,
+) -> tuple[str, list]:
+    sort_expr = sort_expr or id_column
+    params = list(params)
+    cursor = decode_cursor(after, sort_type if sort_expr != id_column else None)
+    if cursor is not None:
+        condition, cursor_params = keyset_condition(sort_expr, id_column, descending, cursor)
+        where = f"{where} AND {condition}" if where else f" WHERE {condition}"
+        params.extend(cursor_params)
+
+    direction = "DESC" if descending else "ASC"
+    if sort_expr == id_column:
+        order = f" ORDER BY {id_column} {direction}"
+    else:
+        order = f" ORDER BY {sort_expr} {direction}, {id_column} {direction}"
+
+    sql = f"SELECT {columns}, {sort_expr} AS _sort_key FROM {table}{where}{order} LIMIT %s"
+    return sql, params + [k + 1]
+
+
+def keyset_result(rows: list, k: int, id_column: str) -> tuple[list, str | None]:
+    if len(rows) <= k:
+        return list(rows), None
+    rows = rows[:k]
+    last = rows[-1]
+    return rows, encode_cursor(last["_sort_key"], int(last[id_column]))
+
+
+def fetch_page_after(db, columns: str, table: str, id_column: str, k: int, **kwargs) -> tuple[list[dict], str | None]:
+    sql, params = keyset_query(columns, table, id_column, k, **kwargs)
+    return keyset_result(db.fetch_all(sql, params), k, id_column)
+
+
+async def afetch_page_after(db, columns: str, table: str, id_column: str, k: int, **kwargs) -> tuple[list[dict], str | None]:
+    sql, params = keyset_query(columns, table, id_column, k, **kwargs)
+    return keyset_result(await db.fetch_all(sql, params), k, id_column)
+
+
+def page_after(
+    items: Iterable[T],
+    k: int,
+    id_of: Callable[[T], int],
+    after: str | None = None,
+    sort_key: Callable[[T], Any] | None = None,
+    descending: bool = False,
+) -> tuple[List[T], str | None]:
+    sort_key = sort_key or id_of
+    cursor = decode_cursor(after)
+
+    if cursor is not None:
+        items = iter(items)
+        first = next(items, None)
+        if first is None:
+            return [], None
+        items = chain([first], items)
+        sort_value, row_id = cursor
+        sort_value = coerce_sort_value(sort_value, type(sort_key(first)))
+        if descending:
+            def is_after(x: T) -> bool:
+                return (sort_key(x), id_of(x)) < (sort_value, row_id)
+        else:
+            def is_after(x: T) -> bool:
+                return (sort_key(x), id_of(x)) > (sort_value, row_id)
+        items = (x for x in items if is_after(x))
+
+    # id — второй ключ в том же направлении, как ORDER BY sort DESC, id DESC в БД
+    if descending:
+        page = heapq.nlargest(k + 1, items, key=lambda x: (sort_key(x), id_of(x)))
+    else:
+        page = heapq.nsmallest(k + 1, items, key=lambda x: (sort_key(x), id_of(x)))
+
+    if len(page) <= k:
+        return page, None
+    page = page[:k]
+    last = page[-1]
+    return page, encode_cursor(sort_key(last), id_of(last))
@@ -0,0 +1,252 @@
+from __future__ import annotations
+from datetime import date
+from typing import Iterable, List
+
+from Investment import Investment
+from InvestmentRepoDB import Investment_rep_DB
+from SecurityRepoDB import Security_rep_DB
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PORTFOLIO_BACKEND = "numpy" if np is not None else "python"
+
+_FAR_FUTURE = date.max.toordinal()
+
+
+class PortfolioTotals:
+    __slots__ = ("key", "count", "invested", "realized", "open_count", "open_amount", "weighted_income")
+
+    def __init__(
+        self,
+        key: int | None,
+        count: int = 0,
+        invested: float = 0.0,
+        realized: float = 0.0,
+        open_count: int = 0,
+        open_amount: float = 0.0,
+        weighted_income: float | None = None,
+    ):
+        self.key = key
+        self.count = count
+        self.invested = invested
+        self.realized = realized
+        self.open_count = open_count
+        self.open_amount = open_amount
+        self.weighted_income = weighted_income
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.key} | "
+            f"count={self.count} | "
+            f"invested={self.invested} | "
+            f"realized={self.realized} | "
+            f"open={self.open_count}/{self.open_amount} | "
+            f"income={self.weighted_income}"
+        )
+
+
+def _is_open(inv: Investment, as_of: date) -> bool:
+    return inv.start_date <= as_of and (inv.end_date is None or inv.end_date > as_of)
+
+
+class DBPortfolio:
+    def __init__(self, investments: Investment_rep_DB, securities: Security_rep_DB):
+        self.investments = investments
+        self.securities = securities
+
+    def _totals(self, group_by: str | None, as_of: date) -> List[PortfolioTotals]:
+        key = f"i.{group_by}" if group_by else "NULL::int"
+        group = f" GROUP BY i.{group_by} ORDER BY i.{group_by}" if group_by else ""
+        rows = self.investments.db.fetch_all(
+            f"""
+            SELECT {key} AS key,
+                   COUNT(*) AS count,
+                   COALESCE(SUM(i.amount), 0) AS invested,
+                   COALESCE(SUM(i.result) FILTER (WHERE i.end_date <= %(as_of)s), 0) AS realized,
+                   COUNT(*) FILTER (WHERE i.start_date <= %(as_of)s AND (i.end_date IS NULL OR i.end_date > %(as_of)s))
+                       AS open_count,
+                   COALESCE(SUM(i.amount) FILTER (
+                       WHERE i.start_date <= %(as_of)s AND (i.end_date IS NULL OR i.end_date > %(as_of)s)
+                   ), 0) AS open_amount,
+                   SUM(i.amount * s.income) / NULLIF(SUM(i.amount) FILTER (WHERE s.income IS NOT NULL), 0)
+                       AS weighted_income
+            FROM {self.investments.table} i
+            LEFT JOIN {self.securities.table} s ON s.security_id = i.security_id
+            {group}
+            """,
+            {"as_of": as_of},
+        )
+        return [
+            PortfolioTotals(
+                int(r["key"]) if r["key"] is not None else None,
+                int(r["count"]),
+                float(r["invested"]),
+                float(r["realized"]),
+                int(r["open_count"]),
+                float(r["open_amount"]),
+                float(r["weighted_income"]) if r["weighted_income"] is not None else None,
+            )
+            for r in rows
+            if r["count"]
+        ]
+
+    def client_totals(self, as_of: date | None = None) -> dict[int, PortfolioTotals]:
+        return {t.key: t for t in self._totals("client_id", as_of or date.today())}
+
+    def security_totals(self, as_of: date | None = None) -> dict[int, PortfolioTotals]:
+        return {t.key: t for t in self._totals("security_id", as_of or date.today())}
+
+    def summary(self, as_of: date | None = None) -> PortfolioTotals:
+        totals = self._totals(None, as_of or date.today())
+        return totals[0] if totals else PortfolioTotals(None)
+
+    def open_positions(self, as_of: date | None = None, client_id: int | None = None) -> List[Investment]:
+        as_of = as_of or date.today()
+        where = "start_date <= %s AND (end_date IS NULL OR end_date > %s)"
+        params: list = [as_of, as_of]
+        if client_id is not None:
+            where += " AND client_id = %s"
+            params.append(client_id)
+        rows = self.investments.db.fetch_all(
+            f"""
+            SELECT investment_id, client_id, security_id, amount, start_date, end_date, result
+            FROM {self.investments.table}
+            WHERE {where}
+            ORDER BY investment_id
+            """,
+            params,
+        )
+        return [self.investments._row_to_investment(r) for r in rows]
+
+
+class FilePortfolio:
+    def __init__(self, investments, securities):
+        self.investments = investments
+        self.securities = securities
+
+    def _income_by_id(self) -> dict[int, float]:
+        return {s.security_id: s.income for s in self.securities.read_all()}
+
+    def _totals(self, group_by: str | None, as_of: date) -> List[PortfolioTotals]:
+        items = self.investments.read_all()
+        if not items:
+            return []
+        income = self._income_by_id()
+        if np is not None:
+            return self._totals_numpy(items, income, group_by, as_of)
+        return self._totals_python(items, income, group_by, as_of)
+
+    @staticmethod
+    def _totals_numpy(
+        items: List[Investment], income: dict[int, float], group_by: str | None, as_of: date
+    ) -> List[PortfolioTotals]:
+        n = len(items)
+        if group_by:
+            keys = np.fromiter((getattr(inv, group_by) for inv in items), dtype=np.int64, count=n)
+        else:
+            keys = np.zeros(n, dtype=np.int64)
+        amount = np.fromiter((inv.amount for inv in items), dtype=np.float64, count=n)
+        result = np.fromiter(
+            (inv.result if inv.result is not None else np.nan for inv in items), dtype=np.float64, count=n
+        )
+        start = np.fromiter((inv.start_date.toordinal() for inv in items), dtype=np.int64, count=n)
+        end = np.fromiter(
+            (inv.end_date.toordinal() if inv.end_date is not None else _FAR_FUTURE for inv in items),
+            dtype=np.int64,
+            count=n,
+        )
+        sec_income = np.fromiter(
+            (income.get(inv.security_id, np.nan) for inv in items), dtype=np.float64, count=n
+        )
+
+        day = as_of.toordinal()
+        closed = end <= day
+        is_open = (start <= day) & (end > day)
+        has_income = ~np.isnan(sec_income)
+
+        uniq, group = np.unique(keys, return_inverse=True)
+        size = len(uniq)
+        count = np.bincount(group, minlength=size)
+        invested = np.bincount(group, weights=amount, minlength=size)
+        realized = np.bincount(group, weights=np.where(closed & ~np.isnan(result), result, 0.0), minlength=size)
+        open_count = np.bincount(group, weights=is_open.astype(np.float64), minlength=size)
+        open_amount = np.bincount(group, weights=np.where(is_open, amount, 0.0), minlength=size)
+        income_num = np.bincount(group, weights=np.where(has_income, amount * sec_income, 0.0), minlength=size)
+        income_den = np.bincount(group, weights=np.where(has_income, amount, 0.0), minlength=size)
+
+        return [
+            PortfolioTotals(
+                int(uniq[i]) if group_by else None,
+                int(count[i]),
+                float(invested[i]),
+                float(realized[i]),
+                int(open_count[i]),
+                float(open_amount[i]),
+                float(income_num[i] / income_den[i]) if income_den[i] else None,
+            )
+            for i in range(size)
+        ]
+
+    @staticmethod
+    def _totals_python(
+        items: Iterable[Investment], income: dict[int, float], group_by: str | None, as_of: date
+    ) -> List[PortfolioTotals]:
+        totals: dict[int | None, PortfolioTotals] = {}
+        weights: dict[int | None, list[float]] = {}
+        for inv in items:
+            key = getattr(inv, group_by) if group_by else None
+            t = totals.get(key)
+            if t is None:
+                t = totals[key] = PortfolioTotals(key)
+                weights[key] = [0.0, 0.0]
+            t.count += 1
+            t.invested += inv.amount
+            if inv.end_date is not None and inv.end_date <= as_of and inv.result is not None:
+                t.realized += inv.result
+            if _is_open(inv, as_of):
+                t.open_count += 1
+                t.open_amount += inv.amount
+            sec_income = income.get(inv.security_id)
+            if sec_income is not None:
+                w = weights[key]
+                w[0] += inv.amount * sec_income
+                w[1] += inv.amount
+        for key, t in totals.items():
+            num, den = weights[key]
+            t.weighted_income = num / den if den else None
+        if not group_by:
+            return list(totals.values())
+        return sorted(totals.values(), key=lambda t: t.key)
+
+    def client_totals(self, as_of: date | None = None) -> dict[int, PortfolioTotals]:
+        return {t.key: t for t in self._totals("client_id", as_of or date.today())}
+
+    def security_totals(self, as_of: date | None = None) -> dict[int, PortfolioTotals]:
+        return {t.key: t for t in self._totals("security_id", as_of or date.today())}
+
+    def summary(self, as_of: date | None = None) -> PortfolioTotals:
+        totals = self._totals(None, as_of or date.today())
+        return totals[0] if totals else PortfolioTotals(None)
+
+    def open_positions(self, as_of: date | None = None, client_id: int | None = None) -> List[Investment]:
+        as_of = as_of or date.today()
+        return sorted(
+            (
+                inv
+                for inv in self.investments.read_all()
+                if _is_open(inv, as_of) and (client_id is None or inv.client_id == client_id)
+            ),
+            key=lambda inv: inv.investment_id,
+        )
+
+
+def create_portfolio(investments, securities):
+    if isinstance(investments, Investment_rep_DB):
+        return DBPortfolio(investments, securities)
+    return FilePortfolio(investments, securities)
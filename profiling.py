@@ -0,0 +1,136 @@
+from __future__ import annotations
+import cProfile
+import hmac
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, TypeVar
+
+try:
+    from pyinstrument import Profiler as _Pyinstrument
+except ImportError:  # pyinstrument — необязательная зависимость
+    _Pyinstrument = None
+
+T = TypeVar("T")
+
+PROFILE_ENABLED = os.getenv("PROFILE_REQUESTS", "") not in ("", "0")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# дамп профиля пишет файл на сервер, поэтому без токена он недоступен вовсе
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_PARAM = "_profile"
+PROFILE_HEADER = "x-profile"
+PROFILE_TOKEN_HEADER = "x-profile-token"
+PROFILER_BACKEND = "pyinstrument" if _Pyinstrument is not None else "cprofile"
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class RequestProfile:
+    __slots__ = ("label", "mode", "spans", "dump_path")
+
+    def __init__(self, label: str, mode: str | None = None):
+        self.label = label
+        self.mode = mode
+        self.spans: dict[str, float] = {}
+        self.dump_path: str | None = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def server_timing(self, extra: dict[str, tuple[float, str]] | None = None) -> str:
+        # спаны вложены (repo включает db, filter и build), поэтому сумма не равна total
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.spans.items()]
+        for name, (seconds, desc) in (extra or {}).items():
+            parts.append(f'{name};dur={seconds * 1000:.2f};desc="{desc}"')
+        return ", ".join(parts)
+
+
+_current: ContextVar[RequestProfile | None] = ContextVar("request_profile", default=None)
+
+
+def profiler_mode(flag: str | None, token: str | None = None) -> str | None:
+    if not flag or flag == "0":
+        return None
+    if not PROFILE_TOKEN or not hmac.compare_digest((token or "").encode(), PROFILE_TOKEN.encode()):
+        return None
+    return flag if flag in ("cprofile", "pyinstrument") else PROFILER_BACKEND
+
+
+def profiling_active() -> bool:
+    profile = _current.get()
+    return profile is not None and profile.mode is not None
+
+
+@contextmanager
+def profile_request(label: str, mode: str | None = None) -> Iterator[RequestProfile]:
+    profile = RequestProfile(label, mode)
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - started)
+
+
+def _dump_path(profile: RequestProfile, ext: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = _UNSAFE_RE.sub("_", profile.label).strip("_") or "root"
+    return os.path.join(PROFILE_DIR, f"{name}-{time.time_ns()}.{ext}")
+
+
+def _prune_dumps() -> None:
+    # храним только последние PROFILE_KEEP файлов
+    try:
+        entries = [e for e in os.scandir(PROFILE_DIR) if e.is_file() and e.name.endswith((".prof", ".html"))]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime_ns, reverse=True)
+    for entry in entries[max(PROFILE_KEEP, 1):]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def run_profiled(func: Callable[[], T]) -> T:
+    # профилируем в том потоке, где выполняется обработчик: cProfile видит только текущий поток
+    profile = _current.get()
+    if profile is None or profile.mode is None:
+        return func()
+
+    if profile.mode == "pyinstrument" and _Pyinstrument is not None:
+        profiler = _Pyinstrument()
+        profiler.start()
+        try:
+            return func()
+        finally:
+            profiler.stop()
+            profile.dump_path = _dump_path(profile, "html")
+            with open(profile.dump_path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            _prune_dumps()
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        profile.dump_path = _dump_path(profile, "prof")
+        profiler.dump_stats(profile.dump_path)
+        _prune_dumps()
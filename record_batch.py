@@ -0,0 +1,93 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from array import array
+from typing import Any, Callable, Generic, Iterable, Iterator, List, Mapping, TypeVar
+
+T = TypeVar("T")
+
+
+class RecordView:
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: "RecordBatch", index: int):
+        self._batch = batch
+        self._index = index
+
+    def to_entity(self):
+        return self._batch.materialize(self._index)
+
+    def __repr__(self) -> str:
+        values = " | ".join(str(getattr(self, name)) for name in self._batch.FIELDS)
+        return f"<{type(self._batch).__name__}[{self._index}] {values}>"
+
+
+def _column_getter(name: str):
+    def getter(view: RecordView):
+        return view._batch._columns[name][view._index]
+
+    return property(getter)
+
+
+class RecordBatch(ABC, Generic[T]):
+    FIELDS: tuple[str, ...] = ()
+    TYPECODES: dict[str, str] = {}
+    CONVERTERS: dict[str, Callable[[Any], Any]] = {}
+    _view_class: type[RecordView] = RecordView
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        attrs = {name: _column_getter(name) for name in cls.FIELDS}
+        attrs["__slots__"] = ()
+        cls._view_class = type(f"{cls.__name__}Row", (RecordView,), attrs)
+        converters = {name: float if code == "d" else int for name, code in cls.TYPECODES.items()}
+        converters.update(cls.CONVERTERS)
+        cls.CONVERTERS = converters
+
+    def __init__(self) -> None:
+        self._columns: dict[str, Any] = {
+            name: array(self.TYPECODES[name]) if name in self.TYPECODES else [] for name in self.FIELDS
+        }
+        self._appenders = [
+            (name, self._columns[name].append, self.CONVERTERS.get(name)) for name in self.FIELDS
+        ]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]]) -> "RecordBatch[T]":
+        batch = cls()
+        for row in rows:
+            batch.append(row)
+        return batch
+
+    def append(self, row: Mapping[str, Any]) -> None:
+        for name, append, convert in self._appenders:
+            value = row[name]
+            append(convert(value) if convert is not None else value)
+
+    def column(self, name: str):
+        return self._columns[name]
+
+    def __len__(self) -> int:
+        return len(self._columns[self.FIELDS[0]]) if self.FIELDS else 0
+
+    def __getitem__(self, index: int) -> RecordView:
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError(index)
+        return self._view_class(self, index)
+
+    def __iter__(self) -> Iterator[RecordView]:
+        view_class = self._view_class
+        for i in range(len(self)):
+            yield view_class(self, i)
+
+    def row(self, index: int) -> dict[str, Any]:
+        return {name: self._columns[name][index] for name in self.FIELDS}
+
+    @abstractmethod
+    def materialize(self, index: int) -> T:
+        pass
+
+    def to_objects(self) -> List[T]:
+        return [self.materialize(i) for i in range(len(self))]
@@ -1,80 +1,216 @@
 from __future__ import annotations
 import os
-from Client import DatabaseManager, MyEntity_rep_DB, MyEntity_rep_json, MyEntity_rep_yaml
+import threading
+from Client import (
+    DatabaseManager,
+    MyEntity_rep_DB,
+    MyEntity_rep_json,
+    MyEntity_rep_jsonl,
+    MyEntity_rep_yaml,
+)
 from dotenv import load_dotenv
 
+from async_db import AsyncDatabaseManager
+from AsyncRepoDB import AsyncInvestment_rep_DB, AsyncMyEntity_rep_DB, AsyncSecurity_rep_DB
+
+from event_bus import EventBus
+from file_storage import flush_all
+from portfolio import create_portfolio
+
 from SecurityRepoDB import Security_rep_DB
 from InvestmentRepoDB import Investment_rep_DB
 
-from SecurityRepoFile import Security_rep_json, Security_rep_yaml
-from InvestmentRepoFile import Investment_rep_json, Investment_rep_yaml
+from SecurityRepoFile import Security_rep_json, Security_rep_jsonl, Security_rep_yaml
+from InvestmentRepoFile import Investment_rep_json, Investment_rep_jsonl, Investment_rep_yaml
 
 
 load_dotenv()
 
 CLIENT_JSON = "static/resources/clients.json"
 CLIENT_YAML = "static/resources/clients.yaml"
+CLIENT_JSONL = "static/resources/clients.jsonl"
 
 SECURITY_JSON = "static/resources/securities.json"
 SECURITY_YAML = "static/resources/securities.yaml"
+SECURITY_JSONL = "static/resources/securities.jsonl"
 
 INVESTMENT_JSON = "static/resources/investments.json"
 INVESTMENT_YAML = "static/resources/investments.yaml"
+INVESTMENT_JSONL = "static/resources/investments.jsonl"
+
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "1000"))
+WRITE_BEHIND_WINDOW = float(os.getenv("WRITE_BEHIND_WINDOW", "0"))
 
 
 def _make_db() -> DatabaseManager:
     dsn = os.getenv("DB_DSN")
     if not dsn:
         raise RuntimeError("DB_DSN is not set")
-    return DatabaseManager(dsn=dsn)
+    return DatabaseManager(
+        dsn=dsn,
+        pool_min=int(os.getenv("DB_POOL_MIN", "1")),
+        pool_max=int(os.getenv("DB_POOL_MAX", "0")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # проверка SELECT 1 при каждой выдаче из пула; DB_HEALTH_CHECK=0 экономит круг до сервера
+        health_check=os.getenv("DB_HEALTH_CHECK", "1") not in ("", "0"),
+        statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE", "256")),
+    )
+
+
+def _make_async_db() -> AsyncDatabaseManager:
+    dsn = os.getenv("DB_DSN")
+    if not dsn:
+        raise RuntimeError("DB_DSN is not set")
+    return AsyncDatabaseManager(
+        dsn,
+        min_size=int(os.getenv("ASYNC_DB_POOL_MIN", "1")),
+        max_size=int(os.getenv("ASYNC_DB_POOL_MAX", "20")),
+    )
+
 
+def normalize_storage(storage: str | None) -> str:
+    return (storage or "db").strip().lower()
 
-def create_client_repo(storage: str):
-    storage = (storage or "db").lower()
+
+def create_client_repo(storage: str, events: EventBus | None = None):
+    storage = normalize_storage(storage)
 
     if storage == "db":
         db = _make_db()
-        return MyEntity_rep_DB(db, table="public.clients")
+        return MyEntity_rep_DB(db, table="public.clients", events=events)
 
     if storage == "json":
-        return MyEntity_rep_json(CLIENT_JSON)
+        return MyEntity_rep_json(CLIENT_JSON, write_behind=WRITE_BEHIND_WINDOW, events=events)
 
     if storage == "yaml":
-        return MyEntity_rep_yaml(CLIENT_YAML)
+        return MyEntity_rep_yaml(CLIENT_YAML, write_behind=WRITE_BEHIND_WINDOW, events=events)
+
+    if storage == "jsonl":
+        return MyEntity_rep_jsonl(CLIENT_JSONL, compact_every=JOURNAL_COMPACT_EVERY, events=events)
 
     raise ValueError(f"Unknown storage: {storage}")
 
 
 def create_security_repo(storage: str):
-    storage = (storage or "db").lower()
+    storage = normalize_storage(storage)
 
     if storage == "db":
         db = _make_db()
         return Security_rep_DB(db, table="public.securities")
     if storage == "json":
-        return Security_rep_json(SECURITY_JSON)
+        return Security_rep_json(SECURITY_JSON, write_behind=WRITE_BEHIND_WINDOW)
 
     if storage == "yaml":
-        return Security_rep_yaml(SECURITY_YAML)
+        return Security_rep_yaml(SECURITY_YAML, write_behind=WRITE_BEHIND_WINDOW)
+
+    if storage == "jsonl":
+        return Security_rep_jsonl(SECURITY_JSONL, compact_every=JOURNAL_COMPACT_EVERY)
 
     raise ValueError(f"Unknown storage: {storage}")
 
 
 def create_investment_repo(storage: str):
-    storage = (storage or "db").lower()
+    storage = normalize_storage(storage)
 
     if storage == "db":
         db = _make_db()
         return Investment_rep_DB(db, table="public.investments")
 
     if storage == "json":
-        return Investment_rep_json(INVESTMENT_JSON)
+        return Investment_rep_json(INVESTMENT_JSON, write_behind=WRITE_BEHIND_WINDOW)
 
     if storage == "yaml":
-        return Investment_rep_yaml(INVESTMENT_YAML)
+        return Investment_rep_yaml(INVESTMENT_YAML, write_behind=WRITE_BEHIND_WINDOW)
+
+    if storage == "jsonl":
+        return Investment_rep_jsonl(INVESTMENT_JSONL, compact_every=JOURNAL_COMPACT_EVERY)
 
     raise ValueError(f"Unknown storage: {storage}")
 
 
 def create_repo(storage: str):
     return create_client_repo(storage)
+
+
+class RepoRegistry:
+    def __init__(self):
+        self._repos: dict[tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+        self._async_db: AsyncDatabaseManager | None = None
+        # своя шина на каждую пару (вид, хранилище): подписчик видит события только своего репозитория
+        self._buses: dict[tuple[str, str], EventBus] = {}
+        self._factories = {
+            "security": create_security_repo,
+            "investment": create_investment_repo,
+        }
+
+    def get(self, kind: str, storage: str):
+        key = (kind, normalize_storage(storage))
+        repo = self._repos.get(key)
+        if repo is None:
+            with self._lock:
+                repo = self._repos.get(key)
+                if repo is None:
+                    if kind == "client":
+                        # события публикуют только репозитории клиентов
+                        repo = create_client_repo(key[1], events=self._bus(key))
+                    else:
+                        repo = self._factories[kind](key[1])
+                    self._repos[key] = repo
+        return repo
+
+    def _bus(self, key: tuple[str, str]) -> EventBus:
+        bus = self._buses.get(key)
+        if bus is None:
+            bus = self._buses[key] = EventBus(deferred=True)
+        return bus
+
+    def events(self, kind: str, storage: str) -> EventBus:
+        with self._lock:
+            return self._bus((kind, normalize_storage(storage)))
+
+    def clients(self, storage: str):
+        return self.get("client", storage)
+
+    def securities(self, storage: str):
+        return self.get("security", storage)
+
+    def investments(self, storage: str):
+        return self.get("investment", storage)
+
+    def portfolio(self, storage: str):
+        return create_portfolio(self.investments(storage), self.securities(storage))
+
+    def _get_async_db(self) -> AsyncDatabaseManager:
+        if self._async_db is None:
+            self._async_db = _make_async_db()
+        return self._async_db
+
+    def async_clients(self) -> AsyncMyEntity_rep_DB:
+        return AsyncMyEntity_rep_DB(self._get_async_db(), table="public.clients")
+
+    def async_securities(self) -> AsyncSecurity_rep_DB:
+        return AsyncSecurity_rep_DB(self._get_async_db(), table="public.securities")
+
+    def async_investments(self) -> AsyncInvestment_rep_DB:
+        return AsyncInvestment_rep_DB(self._get_async_db(), table="public.investments")
+
+    async def aclose(self) -> None:
+        if self._async_db is not None:
+            await self._async_db.close()
+            self._async_db = None
+
+    def close(self) -> None:
+        with self._lock:
+            repos = list(self._repos.values())
+            self._repos.clear()
+            buses = list(self._buses.values())
+            self._buses.clear()
+        for repo in repos:
+            if hasattr(repo, "flush"):
+                repo.flush()
+        flush_all()
+        for bus in buses:
+            bus.close()
+        if DatabaseManager._instance is not None:
+            DatabaseManager._instance.close()
@@ -1,8 +1,11 @@
-from typing import Optional, List
+from typing import Iterator, List, Optional
 
 import security_views as views
 from Security import Security, SecurityShort
 from filtered_security import FilteredSortedSecurityDB, FilteredSortedSecurityFile
+from pagination import DEFAULT_PAGE_SIZE
+from profiling import span
+from repo_factory import normalize_storage
 
 
 def validate_security_fields(values: dict[str, str]) -> tuple[dict[str, str], dict[str, str]]:
@@ -47,7 +50,8 @@ class SecurityController:
         sort_by: str | None = None,
         order: str | None = None,
         storage: str = "db",
-    ) -> str:
+        after: str | None = None,
+    ) -> Iterator[str]:
         name_q = (name_q or "").strip()
         security_type_q = (security_type_q or "").strip()
         income_min = (income_min or "").strip()
@@ -55,21 +59,25 @@ class SecurityController:
         sort_by = (sort_by or "").strip()
         order = (order or "asc").strip().lower()
 
-        Decorator = FilteredSortedSecurityDB if storage == "db" else FilteredSortedSecurityFile
+        Decorator = FilteredSortedSecurityDB if normalize_storage(storage) == "db" else FilteredSortedSecurityFile
         decorated = Decorator(self.repo)
 
-        securities = decorated.get_list(
-            name_q=name_q,
-            security_type_q=security_type_q,
-            income_min=income_min,
-            income_max=income_max,
-            sort_by=sort_by,
-            order=order,
-        )
-
-        shorts = [SecurityShort(s) for s in securities]
-        return views.render_security_list(
-            shorts,
+        criteria = {
+            "name_q": name_q,
+            "security_type_q": security_type_q,
+            "income_min": income_min,
+            "income_max": income_max,
+            "sort_by": sort_by,
+            "order": order,
+        }
+        with span("repo"):
+            try:
+                securities, next_after = decorated.get_page(DEFAULT_PAGE_SIZE, after=after, **criteria)
+            except ValueError:
+                securities, next_after = decorated.get_page(DEFAULT_PAGE_SIZE, **criteria)
+
+        return views.security_list_chunks(
+            (SecurityShort(s) for s in securities),
             filters={
                 "name_q": name_q,
                 "security_type_q": security_type_q,
@@ -79,12 +87,59 @@ class SecurityController:
                 "order": order,
             },
             storage=storage,
+            next_after=next_after,
         )
 
 
     def get_details_page(self, security_id: int, storage: str = "db") -> str:
-        sec = self.repo.get_by_id(security_id)
-        return views.render_security_details(sec, storage=storage)
+        with span("repo"):
+            sec = self.repo.get_by_id(security_id)
+        with span("render"):
+            return views.render_security_details(sec, storage=storage)
+
+
+class AsyncSecurityController:
+    def __init__(self, repo):
+        self.repo = repo
+
+    async def get_index_page(
+        self,
+        name_q: str | None = None,
+        security_type_q: str | None = None,
+        income_min: str | None = None,
+        income_max: str | None = None,
+        sort_by: str | None = None,
+        order: str | None = None,
+        after: str | None = None,
+        list_url: str = "/async/securities",
+    ) -> Iterator[str]:
+        criteria = {
+            "name_q": (name_q or "").strip(),
+            "security_type_q": (security_type_q or "").strip(),
+            "income_min": (income_min or "").strip(),
+            "income_max": (income_max or "").strip(),
+            "sort_by": (sort_by or "").strip(),
+            "order": (order or "asc").strip().lower(),
+        }
+        with span("repo"):
+            try:
+                securities, next_after = await self.repo.get_page(DEFAULT_PAGE_SIZE, after=after, **criteria)
+            except ValueError:
+                securities, next_after = await self.repo.get_page(DEFAULT_PAGE_SIZE, **criteria)
+
+        return views.security_list_chunks(
+            (SecurityShort(s) for s in securities),
+            filters=criteria,
+            storage="db",
+            next_after=next_after,
+            list_url=list_url,
+        )
+
+    async def get_details_page(self, security_id: int) -> str:
+        with span("repo"):
+            sec = await self.repo.get_by_id(security_id)
+        with span("render"):
+            return views.render_security_details(sec, storage="db")
 
 
 class AddSecurityController:
@@ -196,6 +251,6 @@ class DeleteSecurityController:
         except ValueError as e:
             return views.render_layout(
                 "Ошибка удаления",
-                f"<h1>Ошибка</h1><p>{e}</p><p><a href='javascript:closeAndRefresh()'>Закрыть</a></p>",
+                f"<h1>Ошибка</h1><p>{views.esc(e)}</p><p><a href='javascript:closeAndRefresh()'>Закрыть</a></p>",
             )
         return views.render_security_delete_success(security_id)
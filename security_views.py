@@ -1,46 +1,8 @@
-from typing import Iterable, Mapping
+from typing import Iterable, Iterator, Mapping
 from urllib.parse import urlencode
 
 from Security import Security, SecurityShort
-
-
-def render_layout(title: str, body: str) -> str:
-    return f"""<!DOCTYPE html>
-    <html lang="ru">
-    <head>
-        <meta charset="utf-8" />
-        <title>{title}</title>
-
-        <script>
-            function refreshOpener() {{
-              if (window.opener && !window.opener.closed) {{
-                try {{
-                  window.opener.location.reload();
-                  return true;
-                }} catch (e) {{
-                  return false;
-                }}
-              }}
-              return false;
-            }}
-
-            function closeAndRefresh() {{
-              refreshOpener();
-              window.close();
-            }}
-
-            window.addEventListener("beforeunload", function () {{
-              refreshOpener();
-            }});
-        </script>
-
-        <link rel="stylesheet" href="/static/css/style.css">
-    </head>
-    <body>
-        {body}
-    </body>
-    </html>
-    """
+from templates import Template, esc, layout_chunks, render_layout, render_options, row_chunks, select_options
 
 
 def _build_url(base: str, params: dict[str, str]) -> str:
@@ -48,35 +10,25 @@ def _build_url(base: str, params: dict[str, str]) -> str:
     return f"{base}?{qs}" if qs else base
 
 
-def render_security_list(
-    securities: Iterable[SecurityShort],
-    filters: Mapping[str, str] | None = None,
-    storage: str = "db",
-) -> str:
-    filters = filters or {}
-    rows: list[str] = []
-
-    def build_url(base: str, params: dict[str, str]) -> str:
-        qs = urlencode({k: v for k, v in params.items() if v is not None})
-        return f"{base}?{qs}" if qs else base
-
+SORT_OPTIONS = select_options(
+    [("", "Без сортировки"), ("id", "ID"), ("name", "Название"), ("security_type", "Тип"), ("income", "Доходность")]
+)
+ORDER_OPTIONS = select_options([("asc", "↑"), ("desc", "↓")])
 
-    back_clients_url = build_url("/", {"storage": storage})
-    new_url = build_url("/security/new", {"storage": storage})
-    name_q = filters.get("name_q", "")
-    security_type_q = filters.get("security_type_q", "")
-    income_min = filters.get("income_min", "")
-    income_max = filters.get("income_max", "")
-    sort_by = filters.get("sort_by", "")
-    order = filters.get("order", "asc")
+SECURITY_LIST_HEAD = Template(
+    """
+        <h1>Ценные бумаги</h1>
 
+        <p>
+            <a href="#" onclick="window.open('{new_url}','_blank'); return false;">Добавить бумагу</a>
+        </p>
 
-    filter_form = f"""
         <p>
-            <a href="{back_clients_url}">Клиенты</a>
+            <a href="{clients_url}">Клиенты</a> |
+            <a href="{investments_url}">Инвестиции</a>
         </p>
 
-        <form method="get" action="/securities" style="margin-bottom:12px;">
+        <form method="get" action="{list_url}" style="margin-bottom:12px;">
             <input type="hidden" name="storage" value="{storage}">
 
             <label>Название содержит:
@@ -96,54 +48,16 @@ def render_security_list(
             </label>
 
             <label style="margin-left:10px;">Сортировать по:
-                <select name="sort_by">
-                    <option value="" {"selected" if sort_by == "" else ""}>Без сортировки</option>
-                    <option value="id" {"selected" if sort_by == "id" else ""}>ID</option>
-                    <option value="name" {"selected" if sort_by == "name" else ""}>Название</option>
-                    <option value="security_type" {"selected" if sort_by == "security_type" else ""}>Тип</option>
-                    <option value="income" {"selected" if sort_by == "income" else ""}>Доходность</option>
-                </select>
+                <select name="sort_by">{sort_options!s}</select>
             </label>
 
             <label style="margin-left:10px;">Порядок:
-                <select name="order">
-                    <option value="asc" {"selected" if order == "asc" else ""}>↑</option>
-                    <option value="desc" {"selected" if order == "desc" else ""}>↓</option>
-                </select>
+                <select name="order">{order_options!s}</select>
             </label>
 
             <button type="submit" style="margin-left:10px;">Применить</button>
-            <a href="/securities?storage={storage}" style="margin-left:10px;">Сброс</a>
+            <a href="{reset_url}" style="margin-left:10px;">Сброс</a>
         </form>
-    """
-
-    for s in securities:
-        details_url = build_url(f"/security/{s.security_id}", {"storage": storage})
-        edit_url = build_url(f"/security/{s.security_id}/edit", {"storage": storage})
-        delete_url = build_url(f"/security/{s.security_id}/delete", {"storage": storage})
-
-        rows.append(
-            f"<tr>"
-            f"<td>{s.security_id}</td>"
-            f"<td>{s.name}</td>"
-            f"<td>{s.security_type}</td>"
-            f"<td>{s.income}</td>"
-            f"<td>"
-            f"<a href='#' onclick=\"window.open('{details_url}','_blank'); return false;\">Подробнее</a> | "
-            f"<a href='#' onclick=\"window.open('{edit_url}','_blank'); return false;\">Редактировать</a> | "
-            f"<a href='#' onclick=\"window.open('{delete_url}','_blank'); return false;\" style='color:#c00'>Удалить</a>"
-            f"</td>"
-            f"</tr>"
-        )
-
-    table = f"""
-        <h1>Ценные бумаги</h1>
-
-        <p>
-            <a href="#" onclick="window.open('{new_url}','_blank'); return false;">Добавить бумагу</a>
-        </p>
-
-        {filter_form}
 
         <table>
             <thead>
@@ -156,11 +70,100 @@ def render_security_list(
                 </tr>
             </thead>
             <tbody>
-                {' '.join(rows) if rows else '<tr><td colspan="5">Пусто</td></tr>'}
+"""
+)
+
+SECURITY_ROW = Template(
+    "<tr>"
+    "<td>{security_id}</td>"
+    "<td>{name}</td>"
+    "<td>{security_type}</td>"
+    "<td>{income}</td>"
+    "<td>"
+    "<a href='#' onclick=\"window.open('{details_url}','_blank'); return false;\">Подробнее</a> | "
+    "<a href='#' onclick=\"window.open('{edit_url}','_blank'); return false;\">Редактировать</a> | "
+    "<a href='#' onclick=\"window.open('{delete_url}','_blank'); return false;\" style='color:#c00'>Удалить</a>"
+    "</td>"
+    "</tr>\n"
+)
+
+EMPTY_ROW = '<tr><td colspan="5">Пусто</td></tr>'
+
+LIST_TAIL = Template(
+    """
             </tbody>
         </table>
-    """
-    return render_layout("Ценные бумаги", table)
+
+        {pager!s}
+"""
+)
+
+PAGER = Template('<p><a href="{next_url}">Следующая страница →</a></p>')
+
+
+def security_list_chunks(
+    securities: Iterable[SecurityShort],
+    filters: Mapping[str, str] | None = None,
+    storage: str = "db",
+    next_after: str | None = None,
+    list_url: str = "/securities",
+) -> Iterator[str]:
+    filters = filters or {}
+    storage_qs = urlencode({"storage": storage})
+
+    head = SECURITY_LIST_HEAD.render(
+        new_url=f"/security/new?{storage_qs}",
+        clients_url=f"/?{storage_qs}",
+        investments_url=f"/investments?{storage_qs}",
+        list_url=list_url,
+        storage=storage,
+        name_q=filters.get("name_q", ""),
+        security_type_q=filters.get("security_type_q", ""),
+        income_min=filters.get("income_min", ""),
+        income_max=filters.get("income_max", ""),
+        sort_options=render_options(SORT_OPTIONS, filters.get("sort_by", "")),
+        order_options=render_options(ORDER_OPTIONS, filters.get("order", "asc")),
+        reset_url=f"{list_url}?{storage_qs}",
+    )
+
+    rows = (
+        {
+            "security_id": s.security_id,
+            "name": s.name,
+            "security_type": s.security_type,
+            "income": s.income,
+            "details_url": f"/security/{s.security_id}?{storage_qs}",
+            "edit_url": f"/security/{s.security_id}/edit?{storage_qs}",
+            "delete_url": f"/security/{s.security_id}/delete?{storage_qs}",
+        }
+        for s in securities
+    )
+
+    pager = ""
+    if next_after:
+        pager = PAGER.render(next_url=_build_url(list_url, {"storage": storage, **filters, "after": next_after}))
+
+    def body() -> Iterator[str]:
+        yield head
+        empty = True
+        for chunk in row_chunks(SECURITY_ROW, rows):
+            empty = False
+            yield chunk
+        if empty:
+            yield EMPTY_ROW
+        yield LIST_TAIL.render(pager=pager)
+
+    return layout_chunks("Ценные бумаги", body())
+
+
+def render_security_list(
+    securities: Iterable[SecurityShort],
+    filters: Mapping[str, str] | None = None,
+    storage: str = "db",
+    next_after: str | None = None,
+    list_url: str = "/securities",
+) -> str:
+    return "".join(security_list_chunks(securities, filters, storage, next_after, list_url))
 
 
 def render_security_details(sec: Security | None, storage: str = "db") -> str:
@@ -170,9 +173,9 @@ def render_security_details(sec: Security | None, storage: str = "db") -> str:
     body = f"""
     <h1>Ценная бумага #{sec.security_id}</h1>
     <ul>
-      <li><b>Название:</b> {sec.name}</li>
-      <li><b>Тип:</b> {sec.security_type}</li>
-      <li><b>Доходность:</b> {sec.income}</li>
+      <li><b>Название:</b> {esc(sec.name)}</li>
+      <li><b>Тип:</b> {esc(sec.security_type)}</li>
+      <li><b>Доходность:</b> {esc(sec.income)}</li>
     </ul>
 
     <button onclick="window.close()">Закрыть</button>
@@ -192,22 +195,22 @@ def render_security_form(
     values = values or {}
 
     def val(k: str) -> str:
-        return values.get(k, "")
+        return esc(values.get(k, ""))
 
     def err(k: str) -> str:
         msg = errors.get(k)
-        return f"<div style='color:red;font-size:0.9em'>{msg}</div>" if msg else ""
+        return f"<div style='color:red;font-size:0.9em'>{esc(msg)}</div>" if msg else ""
 
     form_error = errors.get("_form")
-    form_error_html = f"<div style='color:red;margin-bottom:10px'>{form_error}</div>" if form_error else ""
+    form_error_html = f"<div style='color:red;margin-bottom:10px'>{esc(form_error)}</div>" if form_error else ""
 
-    header = f"<h1>{title}</h1>" if security_id is None else f"<h1>{title} #{security_id}</h1>"
+    header = f"<h1>{esc(title)}</h1>" if security_id is None else f"<h1>{esc(title)} #{security_id}</h1>"
 
     body = f"""
     {header}
     {form_error_html}
 
-    <form method="post" action="{action_url}">
+    <form method="post" action="{esc(action_url)}">
       <label>Название:<br>
         <input type="text" name="name" value="{val('name')}"/>
         {err('name')}
@@ -223,7 +226,7 @@ def render_security_form(
         {err('income')}
       </label><br><br>
 
-      <button type="submit">{submit_text}</button>
+      <button type="submit">{esc(submit_text)}</button>
     </form>
 
     <p><a href="javascript:closeAndRefresh()">Закрыть окно</a></p>
@@ -239,12 +242,12 @@ def render_security_delete_confirm(sec: Security | None, storage: str = "db") ->
     <h1>Удаление бумаги #{sec.security_id}</h1>
     <p>Вы точно хотите удалить:</p>
     <ul>
-      <li><b>Название:</b> {sec.name}</li>
-      <li><b>Тип:</b> {sec.security_type}</li>
-      <li><b>Доходность:</b> {sec.income}</li>
+      <li><b>Название:</b> {esc(sec.name)}</li>
+      <li><b>Тип:</b> {esc(sec.security_type)}</li>
+      <li><b>Доходность:</b> {esc(sec.income)}</li>
     </ul>
 
-    <form method="post" action="/security/{sec.security_id}/delete?storage={storage}">
+    <form method="post" action="/security/{sec.security_id}/delete?storage={esc(storage)}">
       <button type="submit" style="background:#c00;color:#fff;padding:6px 12px;border:0;cursor:pointer;">Удалить</button>
       <a href="javascript:window.close()" style="margin-left:12px">Отмена</a>
     </form>
@@ -254,7 +257,7 @@ def render_security_delete_confirm(sec: Security | None, storage: str = "db") ->
 
 def render_security_saved(title: str, message: str) -> str:
     body = f"""
-    <h1>{title}</h1>
+    <h1>{esc(title)}</h1>
     <p>{message}</p>
 
     <script>
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import re
+from collections import OrderedDict
+from functools import lru_cache
+
+from psycopg2.extensions import connection
+
+_PLACEHOLDER_RE = re.compile(r"%[s%]")
+_PREPARABLE = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES"))
+# SQLSTATE ошибок PREPARE, которые не исправятся повтором: синтаксис, невыводимый или
+# неоднозначный тип параметра, несовпадение типов, неподдерживаемая конструкция.
+# Нет таблицы, нет прав, оборванное соединение — временное, такой запрос подготовим позже
+PERMANENT_PREPARE_ERRORS = frozenset(("42601", "42P18", "42P08", "42804", "0A000"))
+
+
+@lru_cache(maxsize=1024)
+def to_server_params(sql: str) -> tuple[str, int] | None:
+    # "%s" -> "$n" для PREPARE; всё, что так не переводится, выполняется обычным запросом
+    words = sql.split(None, 1)
+    if not words or words[0].upper() not in _PREPARABLE:
+        return None
+    if "$" in sql or "%" in _PLACEHOLDER_RE.sub("", sql):
+        return None
+
+    count = 0
+
+    def repl(m: re.Match) -> str:
+        nonlocal count
+        if m.group() == "%%":
+            return "%"
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER_RE.sub(repl, sql), count
+
+
+class StatementCache:
+    def __init__(self, size: int):
+        self.size = size
+        self._names: OrderedDict[str, str] = OrderedDict()
+        self._seq = 0
+        self.unpreparable: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def get(self, sql: str) -> str | None:
+        name = self._names.get(sql)
+        if name is not None:
+            self._names.move_to_end(sql)
+        return name
+
+    def next_name(self) -> str:
+        self._seq += 1
+        return f"ps_{self._seq}"
+
+    def put(self, sql: str, name: str) -> str | None:
+        self._names[sql] = name
+        if len(self._names) > self.size:
+            _, evicted = self._names.popitem(last=False)
+            return evicted
+        return None
+
+    def clear(self) -> None:
+        self._names.clear()
+
+
+class StatementCachingConnection(connection):
+    # у стандартного connection нет __dict__, поэтому кэш живёт на подклассе
+    statements: StatementCache | None = None
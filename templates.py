@@ -0,0 +1,108 @@
+from __future__ import annotations
+import html
+from string import Formatter
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+ROWS_PER_CHUNK = 200
+
+
+def esc(value: Any) -> str:
+    if value is None:
+        return ""
+    return html.escape(str(value), quote=True)
+
+
+class Template:
+    # {field} экранируется, {field!s} вставляется как есть (уже готовый HTML)
+    def __init__(self, source: str):
+        pieces: list[str] = []
+        for literal, field, _spec, conversion in Formatter().parse(source):
+            if literal:
+                pieces.append(repr(literal))
+            if field is not None:
+                getter = f"v[{field!r}]"
+                pieces.append(f"str({getter})" if conversion == "s" else f"_esc({getter})")
+        code = f"lambda v: ''.join(({', '.join(pieces)},))" if pieces else "lambda v: ''"
+        self._render: Callable[[Mapping[str, Any]], str] = eval(code, {"_esc": esc})
+
+    def render(self, values: Mapping[str, Any] | None = None, **kwargs: Any) -> str:
+        if kwargs:
+            values = {**(values or {}), **kwargs}
+        return self._render(values or {})
+
+
+def select_options(choices: Iterable[tuple[str, str]]) -> dict[str, tuple[str, str]]:
+    return {
+        value: (
+            f'<option value="{esc(value)}">{esc(label)}</option>',
+            f'<option value="{esc(value)}" selected>{esc(label)}</option>',
+        )
+        for value, label in choices
+    }
+
+
+def render_options(options: dict[str, tuple[str, str]], selected: str) -> str:
+    return "".join(pair[value == selected] for value, pair in options.items())
+
+
+_LAYOUT_HEAD = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <meta charset="utf-8" />
+    <title>"""
+
+_LAYOUT_BODY = """</title>
+    <script>
+        function refreshOpener() {
+          if (window.opener && !window.opener.closed) {
+            try {
+              window.opener.location.reload();
+              return true;
+            } catch (e) {
+              return false;
+            }
+          }
+          return false;
+        }
+
+        function closeAndRefresh() {
+          refreshOpener();
+          window.close();
+        }
+
+        // (крестик, Alt+F4) — попробуем обновить opener.
+        window.addEventListener("beforeunload", function () {
+          refreshOpener();
+        });
+    </script>
+    <link rel="stylesheet" href="/static/css/style.css">
+</head>
+<body>
+"""
+
+_LAYOUT_TAIL = """
+</body>
+</html>
+"""
+
+
+def render_layout(title: str, body: str) -> str:
+    return "".join((_LAYOUT_HEAD, esc(title), _LAYOUT_BODY, body, _LAYOUT_TAIL))
+
+
+def layout_chunks(title: str, body: Iterable[str]) -> Iterator[str]:
+    yield _LAYOUT_HEAD + esc(title) + _LAYOUT_BODY
+    yield from body
+    yield _LAYOUT_TAIL
+
+
+def row_chunks(row: Template, items: Iterable[Mapping[str, Any]], size: int = ROWS_PER_CHUNK) -> Iterator[str]:
+    buf: list[str] = []
+    render = row._render
+    for values in items:
+        buf.append(render(values))
+        if len(buf) >= size:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
@@ -1,84 +1,40 @@
-from typing import Iterable, Mapping
+from typing import Iterable, Iterator, Mapping
 from Client import Client, ClientShort
 from urllib.parse import urlencode
 
+from templates import Template, esc, layout_chunks, render_layout, render_options, row_chunks, select_options
 
-def render_layout(title: str, body: str) -> str:
-    return f"""<!DOCTYPE html>
-    <html lang="ru">
-    <head>
-        <meta charset="utf-8" />
-        <title>{title}</title>
-        
-         <script>
-            function refreshOpener() {{
-            if (window.opener && !window.opener.closed) {{
-                try {{
-                window.opener.location.reload();
-                return true;
-                }} catch (e) {{
-                return false;
-                }}
-            }}
-            return false;
-            }}
-
-            function closeAndRefresh() {{
-            refreshOpener();
-            window.close();
-            }}
-
-            // (крестик, Alt+F4) — попробуем обновить opener.
-            window.addEventListener("beforeunload", function () {{
-            refreshOpener();
-            }});
-        </script>
-        <link rel="stylesheet" href="/static/css/style.css">
-    </head>
-    <body>
-        {body}
-    </body>
-    </html>
-    """
 
+def build_url(base: str, params: dict[str, str]) -> str:
+    qs = urlencode({k: v for k, v in params.items() if v is not None})
+    return f"{base}?{qs}" if qs else base
 
-def render_client_list(
-    clients: Iterable[ClientShort],
-    filters: Mapping[str, str] | None = None,
-    storage: str = "db",
-) -> str:
-    rows = []
-    filters = filters or {}
 
-    def build_url(base: str, params: dict[str, str]) -> str:
-        qs = urlencode({k: v for k, v in params.items() if v is not None})
-        return f"{base}?{qs}" if qs else base
+TYPE_OPTIONS = select_options([("", "Все"), ("ООО", "ООО"), ("ЗАО", "ЗАО"), ("ОАО", "ОАО"), ("ИП", "ИП")])
+SORT_OPTIONS = select_options(
+    [("", "Без сортировки"), ("id", "ID"), ("name", "ФИО"), ("type", "Форма"), ("phone", "Телефон")]
+)
+ORDER_OPTIONS = select_options([("asc", "↑"), ("desc", "↓")])
 
-    type_val = filters.get("type_of_property", "")
-    name_q = filters.get("name_q", "")
-    phone_q = filters.get("phone_q", "")
-    sort_by = filters.get("sort_by", "")
-    order = filters.get("order", "asc")
+CLIENT_LIST_HEAD = Template(
+    """
+        <h1>Список клиентов</h1>
 
-    form_action = build_url("/", {"storage": storage})
+        <p>
+            <a href="#" onclick="window.open('{new_url}','_blank'); return false;">Добавить клиента</a>
+        </p>
 
-    filter_form = f"""
         <p>
-            <a href="/securities?storage={storage}">Ценные бумаги</a>
+            <a href="{securities_url}">Ценные бумаги</a> |
+            <a href="{investments_url}">Инвестиции</a>
         </p>
 
-        <form method="get" action="/" style="margin-bottom:12px;">
+        <form method="get" action="{list_url}" style="margin-bottom:12px;">
 
         <input type="hidden" name="storage" value="{storage}">
 
         <label>Форма собственности:
-            <select name="type_of_property">
-            <option value="" {"selected" if type_val == "" else ""}>Все</option>
-            <option value="ООО" {"selected" if type_val == "ООО" else ""}>ООО</option>
-            <option value="ЗАО" {"selected" if type_val == "ЗАО" else ""}>ЗАО</option>
-            <option value="ОАО" {"selected" if type_val == "ОАО" else ""}>ОАО</option>
-            <option value="ИП"  {"selected" if type_val == "ИП" else ""}>ИП</option>
-            </select>
+            <select name="type_of_property">{type_options!s}</select>
         </label>
 
         <label style="margin-left:10px;">ФИО содержит:
@@ -90,56 +46,17 @@ def render_client_list(
         </label>
 
         <label style="margin-left:10px;">Сортировать по:
-        <select name="sort_by">
-            <option value="" {"selected" if sort_by == "" else ""}>Без сортировки</option>
-            <option value="id" {"selected" if sort_by == "id" else ""}>ID</option>
-            <option value="name" {"selected" if sort_by == "name" else ""}>ФИО</option>
-            <option value="type" {"selected" if sort_by == "type" else ""}>Форма</option>
-            <option value="phone" {"selected" if sort_by == "phone" else ""}>Телефон</option>
-        </select>
+            <select name="sort_by">{sort_options!s}</select>
         </label>
 
         <label style="margin-left:10px;">Порядок:
-        <select name="order">
-            <option value="asc" {"selected" if order == "asc" else ""}>↑</option>
-            <option value="desc" {"selected" if order == "desc" else ""}>↓</option>
-        </select>
+            <select name="order">{order_options!s}</select>
         </label>
 
         <button type="submit" style="margin-left:10px;">Фильтровать</button>
-        <a href="/?storage={storage}" style="margin-left:10px;">Сброс</a>
+        <a href="{reset_url}" style="margin-left:10px;">Сброс</a>
 
         </form>
-        """
-
-    for c in clients:
-        details_url = build_url(f"/client/{c.client_id}", {"storage": storage})
-        edit_url = build_url(f"/client/{c.client_id}/edit", {"storage": storage})
-        delete_url = build_url(f"/client/{c.client_id}/delete", {"storage": storage})
-
-        rows.append(
-            f"<tr>"
-            f"<td>{c.client_id}</td>"
-            f"<td>{c.short_name}</td>"
-            f"<td>{c.type_of_property}</td>"
-            f"<td>{c.phone}</td>"
-            f"<td>"
-            f"<a href='#' onclick=\"window.open('{details_url}','_blank'); return false;\">Подробнее</a> | "
-            f"<a href='#' onclick=\"window.open('{edit_url}','_blank'); return false;\">Редактировать</a> | "
-            f"<a href='#' onclick=\"window.open('{delete_url}','_blank'); return false;\" style='color:#c00'>Удалить</a>"
-            f"</td>"
-        )
-
-    new_url = build_url("/client/new", {"storage": storage})
-
-    table = f"""
-        <h1>Список клиентов</h1>
-
-        <p>
-            <a href="#" onclick="window.open('{new_url}','_blank'); return false;">Добавить клиента</a>
-        </p>
-
-        {filter_form}
 
         <table>
             <thead>
@@ -152,25 +69,106 @@ def render_client_list(
                 </tr>
             </thead>
             <tbody>
-                {' '.join(rows)}
+"""
+)
+
+CLIENT_ROW = Template(
+    "<tr>"
+    "<td>{client_id}</td>"
+    "<td>{short_name}</td>"
+    "<td>{type_of_property}</td>"
+    "<td>{phone}</td>"
+    "<td>"
+    "<a href='#' onclick=\"window.open('{details_url}','_blank'); return false;\">Подробнее</a> | "
+    "<a href='#' onclick=\"window.open('{edit_url}','_blank'); return false;\">Редактировать</a> | "
+    "<a href='#' onclick=\"window.open('{delete_url}','_blank'); return false;\" style='color:#c00'>Удалить</a>"
+    "</td>"
+    "</tr>\n"
+)
+
+LIST_TAIL = Template(
+    """
             </tbody>
         </table>
-    """
-    return render_layout("Клиенты", table)
+
+        {pager!s}
+"""
+)
+
+PAGER = Template('<p><a href="{next_url}">Следующая страница →</a></p>')
+
+
+def client_list_chunks(
+    clients: Iterable[ClientShort],
+    filters: Mapping[str, str] | None = None,
+    storage: str = "db",
+    next_after: str | None = None,
+    list_url: str = "/",
+) -> Iterator[str]:
+    filters = filters or {}
+    storage_qs = urlencode({"storage": storage})
+
+    head = CLIENT_LIST_HEAD.render(
+        new_url=f"/client/new?{storage_qs}",
+        securities_url=f"/securities?{storage_qs}",
+        investments_url=f"/investments?{storage_qs}",
+        list_url=list_url,
+        storage=storage,
+        type_options=render_options(TYPE_OPTIONS, filters.get("type_of_property", "")),
+        name_q=filters.get("name_q", ""),
+        phone_q=filters.get("phone_q", ""),
+        sort_options=render_options(SORT_OPTIONS, filters.get("sort_by", "")),
+        order_options=render_options(ORDER_OPTIONS, filters.get("order", "asc")),
+        reset_url=f"{list_url}?{storage_qs}",
+    )
+
+    rows = (
+        {
+            "client_id": c.client_id,
+            "short_name": c.short_name,
+            "type_of_property": c.type_of_property,
+            "phone": c.phone,
+            "details_url": f"/client/{c.client_id}?{storage_qs}",
+            "edit_url": f"/client/{c.client_id}/edit?{storage_qs}",
+            "delete_url": f"/client/{c.client_id}/delete?{storage_qs}",
+        }
+        for c in clients
+    )
+
+    pager = ""
+    if next_after:
+        pager = PAGER.render(next_url=build_url(list_url, {"storage": storage, **filters, "after": next_after}))
+
+    def body() -> Iterator[str]:
+        yield head
+        yield from row_chunks(CLIENT_ROW, rows)
+        yield LIST_TAIL.render(pager=pager)
+
+    return layout_chunks("Клиенты", body())
+
+
+def render_client_list(
+    clients: Iterable[ClientShort],
+    filters: Mapping[str, str] | None = None,
+    storage: str = "db",
+    next_after: str | None = None,
+    list_url: str = "/",
+) -> str:
+    return "".join(client_list_chunks(clients, filters, storage, next_after, list_url))
 
 
 def render_client_details(client: Client | None, storage: str = "db") -> str:
     if client is None:
-        body = f"<h1>Клиент не найден</h1><p><a href='/?storage={storage}'>Назад</a></p>"
+        body = f"<h1>Клиент не найден</h1><p><a href='/?storage={esc(storage)}'>Назад</a></p>"
         return render_layout("Ошибка", body)
 
     body = f"""
     <h1>Клиент {client.client_id}</h1>
     <ul>
-        <li><b>ФИО:</b> {client.name}</li>
-        <li><b>Форма собственности:</b> {client.type_of_property}</li>
-        <li><b>Адрес:</b> {client.address}</li>
-        <li><b>Телефон:</b> {client.phone}</li>
+        <li><b>ФИО:</b> {esc(client.name)}</li>
+        <li><b>Форма собственности:</b> {esc(client.type_of_property)}</li>
+        <li><b>Адрес:</b> {esc(client.address)}</li>
+        <li><b>Телефон:</b> {esc(client.phone)}</li>
     </ul>
 
     <button onclick="window.close()">Закрыть</button>
@@ -190,26 +188,26 @@ def render_client_form(
     values = values or {}
 
     def val(field: str) -> str:
-        return values.get(field, "")
+        return esc(values.get(field, ""))
 
     def err(field: str) -> str:
         msg = errors.get(field)
-        return f'<div style="color:red;font-size:0.9em">{msg}</div>' if msg else ""
+        return f'<div style="color:red;font-size:0.9em">{esc(msg)}</div>' if msg else ""
 
     form_error = errors.get("_form")
     form_error_html = (
-        f'<div style="color:red;margin-bottom:10px">{form_error}</div>' if form_error else ""
+        f'<div style="color:red;margin-bottom:10px">{esc(form_error)}</div>' if form_error else ""
     )
 
-    header = f"<h1>{title}</h1>"
+    header = f"<h1>{esc(title)}</h1>"
     if client_id is not None:
-        header = f"<h1>{title} #{client_id}</h1>"
+        header = f"<h1>{esc(title)} #{client_id}</h1>"
 
     body = f"""
     {header}
     {form_error_html}
 
-    <form method="post" action="{action_url}">
+    <form method="post" action="{esc(action_url)}">
     <label>ФИО:<br>
         <input type="text" name="name" value="{val('name')}" />
         {err('name')}
@@ -234,7 +232,7 @@ def render_client_form(
     </label>
     <br><br>
 
-    <button type="submit">{submit_text}</button>
+    <button type="submit">{esc(submit_text)}</button>
     </form>
 
     <p><a href="javascript:closeAndRefresh()">Закрыть окно</a></p>
@@ -244,7 +242,7 @@ def render_client_form(
 
 def render_client_saved(title: str, message: str) -> str:
     body = f"""
-    <h1>{title}</h1>
+    <h1>{esc(title)}</h1>
     <p>{message}</p>
 
     <script>
@@ -270,13 +268,13 @@ def render_delete_confirm(client: Client | None, storage: str = "db") -> str:
 
     <p>Вы точно хотите удалить клиента:</p>
     <ul>
-    <li><b>ФИО:</b> {client.name}</li>
-    <li><b>Форма:</b> {client.type_of_property}</li>
-    <li><b>Адрес:</b> {client.address}</li>
-    <li><b>Телефон:</b> {client.phone}</li>
+    <li><b>ФИО:</b> {esc(client.name)}</li>
+    <li><b>Форма:</b> {esc(client.type_of_property)}</li>
+    <li><b>Адрес:</b> {esc(client.address)}</li>
+    <li><b>Телефон:</b> {esc(client.phone)}</li>
     </ul>
 
-    <form method="post" action="/client/{client.client_id}/delete?storage={storage}">
+    <form method="post" action="/client/{client.client_id}/delete?storage={esc(storage)}">
     <button type="submit" style="background:#c00;color:#fff;padding:6px 12px;border:0;cursor:pointer;">
         Удалить
     </button>
@@ -0,0 +1,24 @@
+from __future__ import annotations
+import logging
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+
+    YAML_BACKEND = "libyaml"
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
+
+    YAML_BACKEND = "python"
+
+logging.getLogger(__name__).info("YAML backend: %s", YAML_BACKEND)
+
+
+def safe_load(stream):
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def safe_dump(data, stream=None, **kwargs):
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)